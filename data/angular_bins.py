@@ -0,0 +1,73 @@
+"""
+Single-pass angular sector binning for radial slices around the base station
+
+Instead of rescanning every sample once per sector, every sample is assigned to all
+the sectors whose centre lies within `half_width` degrees of its bearing in one
+vectorized pass, then all (sector, sample) pairs are sorted by sector and distance
+with a single lexsort. Windows may overlap (half_width > step / 2).
+
+    centers, order, bounds = sector_slices(bearing_deg, distance_m, step=5)
+    for k, a in enumerate(centers):
+        idx = order[bounds[k]:bounds[k + 1]]   # sample indices of sector k, nearest first
+
+Membership uses exactly the test the scripts used per sector,
+angle_diff(bearing, centre) <= half_width, so slices are identical; samples at equal
+distance keep their original order (bench_angular_bins.py checks this against the
+per-sector scan, wide overlapping windows included).
+"""
+
+import numpy as np
+
+from geodesy import angle_diff
+
+
+def sector_centers(step, start=0.0):
+    """
+    Sector centres start, start + step, ... once round the circle (start taken mod 360).
+    Counted as round(360 / step), not np.arange(start, start + 360, step), which can add
+    a centre one full turn past the first when start is a float.
+    """
+    start = float(start) % 360
+    return start + step * np.arange(max(int(round(360 / step)), 1))
+
+
+def sector_slices(bearing_deg, distance_m, step, half_width=None, start=0.0):
+    """
+    Group samples into angular sectors centred on sector_centers(step, start).
+
+    Returns (centers, order, bounds): the samples of sector k, sorted by distance, are
+    order[bounds[k]:bounds[k + 1]]. half_width defaults to step / 2 (non-overlapping).
+    """
+    bearing_deg = np.asarray(bearing_deg, dtype=np.float64)
+    distance_m = np.asarray(distance_m, dtype=np.float64)
+    if half_width is None:
+        half_width = step / 2
+    centers = sector_centers(step, start)
+    start = centers[0]
+    n_bins = len(centers)
+    samples = np.arange(len(bearing_deg))
+
+    # every sector within half_width of a bearing is at most `reach` steps from its nearest one
+    reach = int(np.ceil(half_width / step + 0.5))
+    bins_parts, sample_parts = [], []
+    # bearings relative to the first centre, in [0, 360): centre j sits at j * step
+    rel = (bearing_deg - start) % 360
+    for shift in (-360.0, 0.0, 360.0):
+        nearest = np.rint((rel + shift) / step).astype(np.int64)
+        for k in range(-reach, reach + 1):
+            j = nearest + k
+            ok = (j >= 0) & (j < n_bins)
+            ok[ok] = angle_diff(bearing_deg[ok], centers[j[ok]]) <= half_width
+            bins_parts.append(j[ok])
+            sample_parts.append(samples[ok])
+
+    bins = np.concatenate(bins_parts)
+    members = np.concatenate(sample_parts)
+    if 2 * reach * step >= 360:
+        # the +-reach shifts span a full turn, so one sector can be reached via two wraps
+        pairs = np.unique(bins * len(bearing_deg) + members)
+        bins, members = pairs // len(bearing_deg), pairs % len(bearing_deg)
+
+    order = np.lexsort((members, distance_m[members], bins))
+    bounds = np.searchsorted(bins[order], np.arange(n_bins + 1))
+    return centers, members[order], bounds
@@ -0,0 +1,85 @@
+# Benchmark (and equality check) of angular_bins.sector_slices against the per-sector
+# scan the compass scripts used: one angle_diff mask and one sort per sector
+#
+# Every (step, half_width) case must give exactly the slices of the scan, including
+# wide windows that overlap several neighbours and wrap past north in both directions,
+# for float and out-of-range starts too, plus random (step, half_width, start) draws.
+#
+# Usage:
+#   python bench_angular_bins.py                # 10k, 100k, 1M samples
+#   python bench_angular_bins.py --sizes 10000  # quick run
+
+import argparse
+import time
+
+import numpy as np
+
+from angular_bins import sector_slices
+from geodesy import angle_diff
+
+# (step, half_width); None = step / 2
+CASES = [(5, None), (5, 10), (7, 3), (30, 45), (40, 150), (50, 150), (100, 120), (90, 179), (120, 180), (360, 180)]
+STARTS = [0.0, 2.5, 348.1259366005003, 359.9, 450.0, 720.0, -400.0, -0.25]
+FUZZ_CASES = 500
+
+
+def scan(bearing, distance, step, half_width, start=0.0):
+    if half_width is None:
+        half_width = step / 2
+    # one centre per step round the circle, whatever turn start is given in
+    centers = start % 360 + step * np.arange(int(round(360 / step)))
+    slices = []
+    for c in centers:
+        idx = np.flatnonzero(angle_diff(bearing, c) <= half_width)
+        slices.append(idx[np.argsort(distance[idx], kind="stable")])
+    return centers, slices
+
+
+def check(n, seed):
+    rng = np.random.default_rng(seed)
+    bearing = rng.uniform(0, 360, n)
+    # repeated distances exercise the tie order
+    distance = rng.integers(0, 50, n).astype(np.float64)
+    cases = [(step, half_width, start) for step, half_width in CASES for start in STARTS]
+    for _ in range(FUZZ_CASES if n >= 100 else 0):
+        step = float(rng.choice([1, 2.5, 5, 7, 10, 15, 30, 45, 60, 90, 120]))
+        cases.append((step, float(rng.uniform(0.1, 180)), float(rng.uniform(-1080, 1080))))
+    for step, half_width, start in cases:
+        centers, order, bounds = sector_slices(bearing, distance, step, half_width, start)
+        ref_centers, ref = scan(bearing, distance, step, half_width, start)
+        assert np.allclose(centers, ref_centers), (step, half_width, start)
+        assert bounds[-1] == sum(len(r) for r in ref), (step, half_width, start, bounds[-1])
+        for k, r in enumerate(ref):
+            assert np.array_equal(order[bounds[k]:bounds[k + 1]], r), (step, half_width, start, k)
+
+
+def bench(n, seed):
+    rng = np.random.default_rng(seed)
+    bearing = rng.uniform(0, 360, n)
+    distance = rng.uniform(0, 500, n)
+    t0 = time.perf_counter()
+    scan(bearing, distance, 5, None)
+    t_scan = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    sector_slices(bearing, distance, 5)
+    return t_scan, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="sector_slices vs per-sector scan")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for n in (1, 2, 100, 1000):
+        check(n, args.seed)
+    print(f"slices identical to the per-sector scan for {len(CASES)} step / half-width cases x {len(STARTS)} starts "
+          f"and {FUZZ_CASES} random draws")
+    print(f"{'samples':>9} {'scan s':>8} {'single s':>8} {'speedup':>7}")
+    for n in args.sizes:
+        t_scan, t_single = bench(n, args.seed)
+        print(f"{n:>9} {t_scan:>8.3f} {t_single:>8.3f} {t_scan / t_single:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Benchmark (and accuracy check) of geodesy.py against the scalar math versions
+# the signal-over-* scripts used to apply with df.apply(..., axis=1)
+#
+# Usage:
+#   python bench_geodesy.py                # 10k, 100k, 1M points
+#   python bench_geodesy.py --sizes 10000  # quick run
+
+import argparse
+import time
+from math import radians, sin, cos, sqrt, atan2, degrees
+
+import numpy as np
+import pandas as pd
+
+import geodesy
+
+BASE_LAT = 53.268339893585555
+BASE_LON = -0.5298533178776605
+
+# ---------------------------------------------------------
+# Scalar reference versions (as previously defined in the scripts)
+# ---------------------------------------------------------
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371000
+    phi1, phi2 = radians(lat1), radians(lat2)
+    dphi = radians(lat2 - lat1)
+    dlambda = radians(lon2 - lon1)
+    a = sin(dphi/2)**2 + cos(phi1)*cos(phi2)*sin(dlambda/2)**2
+    return 2 * R * atan2(sqrt(a), sqrt(1-a))
+
+def bearing(lat1, lon1, lat2, lon2):
+    phi1, phi2 = radians(lat1), radians(lat2)
+    dlon = radians(lon2 - lon1)
+    x = sin(dlon) * cos(phi2)
+    y = cos(phi1)*sin(phi2) - sin(phi1)*cos(phi2)*cos(dlon)
+    return (degrees(atan2(x, y)) + 360) % 360
+
+def angle_diff(a, b):
+    d = abs(a - b) % 360
+    return min(d, 360 - d)
+
+
+def synthetic(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "lat": BASE_LAT + rng.uniform(-0.01, 0.01, n),
+        "lon": BASE_LON + rng.uniform(-0.01, 0.01, n),
+    })
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="geodesy.py vs scalar df.apply benchmark")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'points':>9} {'apply dist+brg (s)':>19} {'numpy dist+brg (s)':>19} {'speedup':>8} {'max |dd| m':>11} {'max |db| deg':>13}")
+    for n in args.sizes:
+        df = synthetic(n)
+
+        def scalar():
+            d = df.apply(lambda r: haversine(BASE_LAT, BASE_LON, r["lat"], r["lon"]), axis=1)
+            b = df.apply(lambda r: bearing(BASE_LAT, BASE_LON, r["lat"], r["lon"]), axis=1)
+            return d.values, b.values
+
+        def vector():
+            d = geodesy.haversine(BASE_LAT, BASE_LON, df["lat"].values, df["lon"].values)
+            b = geodesy.bearing(BASE_LAT, BASE_LON, df["lat"].values, df["lon"].values)
+            return d, b
+
+        (d0, b0), t_scalar = timed(scalar)
+        (d1, b1), t_vec = timed(vector)
+        db = geodesy.angle_diff(b0, b1)
+        print(f"{n:>9} {t_scalar:>19.3f} {t_vec:>19.4f} {t_scalar / t_vec:>7.0f}x {np.abs(d0 - d1).max():>11.2e} {db.max():>13.2e}")
+
+        # angle_diff on its own, elementwise against the scalar version
+        a = b0[:1000]
+        ref = np.array([angle_diff(x, 180.0) for x in a])
+        assert np.allclose(geodesy.angle_diff(a, 180.0), ref, rtol=0, atol=1e-9)
+        assert np.allclose(d0, d1, rtol=0, atol=1e-6) and db.max() < 1e-9
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Benchmark of heatmap_payload.ArrayHeatMap against the list-based folium HeatMap path
+# the heatmap scripts used (.values.tolist() / append loops -> HeatMap -> JSON)
+#
+# Measures wall time and peak Python memory (tracemalloc) from NumPy arrays to the
+# rendered HTML, plus the HTML size, and checks the points decoded back out of the
+# rendered HTML against the input: lat / lon within half a unit in the last coordinate
+# decimal, weights equal to their float32 rounding.
+#
+# Usage:
+#   python bench_heatmap_payload.py                  # 10k, 100k, 1M points
+#   python bench_heatmap_payload.py --sizes 10000    # quick run
+
+import argparse
+import base64
+import json
+import re
+import time
+import tracemalloc
+
+import folium
+import numpy as np
+from folium.plugins import HeatMap
+
+from heatmap_payload import ArrayHeatMap, COORD_DECIMALS
+
+BASE_LAT = 53.268339893585555
+BASE_LON = -0.5298533178776605
+
+
+def synthetic(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = BASE_LAT + rng.uniform(-0.01, 0.01, n)
+    lon = BASE_LON + rng.uniform(-0.01, 0.01, n)
+    weight = rng.uniform(0.0, 70.0, n)
+    return lat, lon, weight
+
+
+def render_list(lat, lon, weight):
+    m = folium.Map(location=[BASE_LAT, BASE_LON], zoom_start=15)
+    data = np.column_stack((lat, lon, weight)).tolist()
+    HeatMap(data, radius=15, blur=15, max_zoom=20, min_opacity=0.3).add_to(m)
+    return m.get_root().render()
+
+
+def render_arrays(lat, lon, weight):
+    m = folium.Map(location=[BASE_LAT, BASE_LON], zoom_start=15)
+    ArrayHeatMap(lat, lon, weight, radius=15, blur=15, max_zoom=20, min_opacity=0.3).add_to(m)
+    return m.get_root().render()
+
+
+def decode_payload(html):
+    """(lat, lon, weight) decoded from the base64 typed arrays of the (only) ArrayHeatMap in the HTML."""
+    arrays = {typed: re.findall(r'decode\(("[^"]*"), %s\)' % typed, html) for typed in ("Int32Array", "Float32Array")}
+    (lat_b64, lon_b64), (w_b64,) = arrays["Int32Array"], arrays["Float32Array"]
+    scale = float(re.search(r"scale = ([^,\s]+),", html).group(1))
+
+    def decode(b64, dtype):
+        return np.frombuffer(base64.b64decode(json.loads(b64)), dtype=dtype)
+
+    return decode(lat_b64, "<i4") * scale, decode(lon_b64, "<i4") * scale, decode(w_b64, "<f4")
+
+
+def check_payload(html, lat, lon, weight):
+    dlat, dlon, dweight = decode_payload(html)
+    assert len(dlat) == len(dlon) == len(dweight) == len(lat), (len(dlat), len(lat))
+    # half a unit in the last coordinate decimal (plus the float error of int * scale)
+    tol = 0.5 * 10.0 ** -COORD_DECIMALS + 1e-9
+    assert np.abs(dlat - lat).max() <= tol, np.abs(dlat - lat).max()
+    assert np.abs(dlon - lon).max() <= tol, np.abs(dlon - lon).max()
+    assert np.array_equal(dweight, weight.astype(np.float32))
+
+
+def measured(fn, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn(*args)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ArrayHeatMap vs list-based HeatMap payload benchmark")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'points':>9} {'list (s)':>9} {'arrays (s)':>11} {'speedup':>8} {'list peak MB':>13} "
+          f"{'arrays peak MB':>15} {'list HTML MB':>13} {'arrays HTML MB':>15}")
+    for n in args.sizes:
+        lat, lon, weight = synthetic(n)
+        html0, t0, m0 = measured(render_list, lat, lon, weight)
+        html1, t1, m1 = measured(render_arrays, lat, lon, weight)
+        check_payload(html1, lat, lon, weight)
+        print(f"{n:>9} {t0:>9.3f} {t1:>11.4f} {t0 / t1:>7.0f}x {m0:>13.1f} {m1:>15.1f} "
+              f"{len(html0) / 2 ** 20:>13.2f} {len(html1) / 2 ** 20:>15.2f}")
+    print("decoded payloads match the input points")
+
+
+if __name__ == "__main__":
+    main()
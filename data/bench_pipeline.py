@@ -0,0 +1,220 @@
+# Benchmark of the analysis pipeline, stage by stage, on synthetic surveys
+#
+# A synthetic random-walk survey (synthetic_survey.py) is written as a corrected CSV for
+# each size, then every stage the scripts run is timed on it:
+#
+#   convert    CSV -> binary .survey sidecar (first load_survey)
+#   load       reopening the sidecar as a DataFrame
+#   project    lat/lon -> Web Mercator
+#   bin        per-cell mean / variance at 2, 5 and 10 m (grid_bins.bin_levels)
+#   slice      5 degree radial sectors (angular_bins.sector_slices)
+#   variogram  heatmap_gstools.estimate_variogram (no cache; subsampled above --max-variogram-n);
+#              the run fails if estimation fell back to the default model, so a baseline
+#              is never recorded against a no-op
+#   krige      local kriging on a 5 m grid (local_kriging.krige_tiled, 32 neighbours)
+#   render     folium heatmap HTML of the kriged grid
+#
+# One-off setup (pyproj Transformer construction, first-call imports) is paid before the
+# timed runs, so --repeat 1 times the same work as later runs. Times are the best of --repeat runs; peak memory per stage comes from a separate
+# tracemalloc run (it slows allocation-heavy stages down), and the process's peak RSS
+# is recorded after each size. Results are saved as JSON; --compare flags stages that
+# got slower (or hungrier) than a previous results file by more than --tolerance.
+#
+# Usage:
+#   python bench_pipeline.py                                   # 1k, 10k, 100k, 1M points
+#   python bench_pipeline.py --sizes 1000 10000 --save before.json
+#   python bench_pipeline.py --sizes 1000 10000 --compare before.json   # exit status 1 on regressions
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from angular_bins import sector_slices
+from geodesy import bearing, haversine
+from grid_bins import bin_levels
+from heatmap_gstools import build_grid, create_folium_map, estimate_variogram, grid_to_heatmap_data
+from local_kriging import krige_tiled
+from projection import BASE_LAT, BASE_LON, from_mercator, to_mercator
+from survey_store import load_survey
+from synthetic_survey import random_walks, write_survey
+
+STAGES = ["convert", "load", "project", "bin", "slice", "variogram", "krige", "render"]
+BIN_SIZES = [2, 5, 10]
+GRID_M = 5.0
+NEIGHBOURS = 32
+# timing differences below this are noise, never a regression
+NOISE_FLOOR_S = 0.005
+
+
+def run_pipeline(csv_path, work_dir, max_variogram_n):
+    """{stage: callable} in pipeline order; the callables share state, so run them in order."""
+    state = {}
+
+    def convert():
+        state["df"] = load_survey(csv_path)
+
+    def load():
+        state["df"] = load_survey(csv_path)
+
+    def project():
+        df = state["df"]
+        state["x"], state["y"] = to_mercator(df["lat"].values, df["lon"].values)
+        state["vals"] = df["rssi"].values
+
+    def bin_():
+        bin_levels(state["x"], state["y"], state["vals"], BIN_SIZES)
+
+    def slice_():
+        df = state["df"]
+        lat, lon = df["lat"].values, df["lon"].values
+        sector_slices(bearing(BASE_LAT, BASE_LON, lat, lon), haversine(BASE_LAT, BASE_LON, lat, lon), 5)
+
+    def variogram():
+        x, y, vals = state["x"], state["y"], state["vals"]
+        if len(vals) > max_variogram_n:
+            # the empirical variogram is O(N^2) in pairs: fit on an even subsample
+            step = -(-len(vals) // max_variogram_n)
+            x, y, vals = x[::step], y[::step], vals[::step]
+        bins, _, state["model"] = estimate_variogram(x, y, vals, bin_num=20)
+        if bins is None:
+            raise RuntimeError("variogram estimation failed and fell back to the default model; "
+                               "the variogram stage would time a no-op")
+
+    def krige():
+        state["gx"], state["gy"], state["gridx"], state["gridy"] = build_grid(state["x"], state["y"], GRID_M)
+        state["field"] = krige_tiled(state["model"], state["x"], state["y"], state["vals"], state["gx"], state["gy"],
+                                     mode="local", neighbours=NEIGHBOURS)
+
+    def render():
+        lats, lons = from_mercator(state["gridx"].ravel(), state["gridy"].ravel())
+        _, _, weights = grid_to_heatmap_data(state["field"], state["gridx"], state["gridy"])
+        create_folium_map(BASE_LAT, BASE_LON, lats, lons, weights, os.path.join(work_dir, "bench.html"))
+
+    return dict(zip(STAGES, [convert, load, project, bin_, slice_, variogram, krige, render]))
+
+
+def _quiet(fn):
+    # the pipeline functions print progress; keep the benchmark table readable
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        fn()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def warm_up():
+    # build the cached pyproj Transformer outside the timed "project" stage, and pay
+    # gstools' first-call setup outside the timed "variogram" stage
+    from_mercator(*to_mercator(np.array([BASE_LAT]), np.array([BASE_LON])))
+    rng = np.random.default_rng(0)
+    _quiet(lambda: estimate_variogram(rng.uniform(0, 100, 50), rng.uniform(0, 100, 50), rng.normal(size=50)))
+
+
+def bench_size(n, repeat, memory, max_variogram_n, seed):
+    warm_up()
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = os.path.join(work_dir, f"synthetic-{n}.csv")
+        write_survey(csv_path, random_walks(n, seed=seed))
+        times = {s: float("inf") for s in STAGES}
+        peaks = {}
+        for run in range(repeat + (1 if memory else 0)):
+            traced = memory and run == repeat
+            if run:
+                # every run converts from scratch
+                os.utime(csv_path)
+            stages = run_pipeline(csv_path, work_dir, max_variogram_n)
+            for stage in STAGES:
+                if traced:
+                    tracemalloc.start()
+                t0 = time.perf_counter()
+                _quiet(stages[stage])
+                elapsed = time.perf_counter() - t0
+                if traced:
+                    peaks[stage] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                    tracemalloc.stop()
+                else:
+                    times[stage] = min(times[stage], elapsed)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    return [{"n": n, "stage": s, "seconds": times[s], "peak_mb": peaks.get(s)} for s in STAGES], rss
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def compare(results, baseline, tolerance):
+    """Rows (n, stage, metric, old, new, ratio) that are worse than baseline by more than tolerance."""
+    old = {(r["n"], r["stage"]): r for r in baseline["results"]}
+    worse = []
+    for r in results:
+        b = old.get((r["n"], r["stage"]))
+        if b is None:
+            continue
+        if r["seconds"] > b["seconds"] * (1 + tolerance) and r["seconds"] - b["seconds"] > NOISE_FLOOR_S:
+            worse.append((r["n"], r["stage"], "seconds", b["seconds"], r["seconds"], r["seconds"] / b["seconds"]))
+        if r.get("peak_mb") and b.get("peak_mb") and r["peak_mb"] > b["peak_mb"] * (1 + tolerance) + 1.0:
+            worse.append((r["n"], r["stage"], "peak_mb", b["peak_mb"], r["peak_mb"], r["peak_mb"] / b["peak_mb"]))
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage-by-stage pipeline benchmark on synthetic surveys")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per size, best kept (default: 3)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--max-variogram-n", type=int, default=5_000,
+                        help="fit the variogram on an even subsample above this many points (default: 5000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", default=None, help="write results JSON here (default: bench_pipeline-<time>.json)")
+    parser.add_argument("--compare", default=None, help="results JSON of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown / growth, 0.2 = 20%% (default)")
+    args = parser.parse_args()
+
+    report = {"environment": environment(), "settings": {"repeat": args.repeat, "seed": args.seed, "grid_m": GRID_M,
+                                                         "neighbours": NEIGHBOURS, "bin_sizes": BIN_SIZES,
+                                                         "max_variogram_n": args.max_variogram_n},
+              "results": [], "peak_rss_mb": {}}
+    print(f"{'points':>9} " + " ".join(f"{s:>10}" for s in STAGES) + f" {'peak RSS MB':>12}")
+    for n in args.sizes:
+        rows, rss = bench_size(n, args.repeat, not args.no_memory, args.max_variogram_n, args.seed)
+        report["results"].extend(rows)
+        report["peak_rss_mb"][str(n)] = rss
+        print(f"{n:>9} " + " ".join(f"{r['seconds']:>9.3f}s" for r in rows) + f" {rss:>12.0f}")
+        if not args.no_memory:
+            print(f"{'peak MB':>9} " + " ".join(f"{r['peak_mb']:>10.1f}" for r in rows))
+
+    save = args.save or time.strftime("bench_pipeline-%Y%m%d-%H%M%S.json")
+    with open(save, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Saved results to {save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        worse = compare(report["results"], baseline, args.tolerance)
+        for n, stage, metric, old, new, ratio in worse:
+            print(f"REGRESSION {stage} at {n} points: {metric} {old:.4g} -> {new:.4g} ({ratio:.2f}x)")
+        if worse:
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
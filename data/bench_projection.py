@@ -0,0 +1,73 @@
+# Accuracy and speed of projection.py's local tangent plane against pyproj
+#
+# Distances between random point pairs within R of the base station, measured in the
+# local plane vs the WGS84 geodesic (pyproj.Geod), plus the Web Mercator distance for
+# comparison, and the time to project N points each way.
+#
+# Usage:
+#   python bench_projection.py                       # R = 0.5, 2, 5, 10 km
+#   python bench_projection.py --radii 1000 --n 1000000
+
+import argparse
+import time
+
+import numpy as np
+from pyproj import Geod, Transformer
+
+import projection
+from projection import BASE_LAT, BASE_LON
+
+
+def random_points(n, radius_m, seed=0):
+    rng = np.random.default_rng(seed)
+    r = radius_m * np.sqrt(rng.uniform(0, 1, n))
+    az = rng.uniform(0, 360, n)
+    lon, lat, _ = Geod(ellps="WGS84").fwd(np.full(n, BASE_LON), np.full(n, BASE_LAT), az, r)
+    return lat, lon
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="local tangent plane vs pyproj accuracy / speed")
+    parser.add_argument("--radii", nargs="+", type=float, default=[500, 2000, 5000, 10000])
+    parser.add_argument("--n", type=int, default=200_000, help="point pairs per radius / points timed")
+    args = parser.parse_args()
+
+    geod = Geod(ellps="WGS84")
+    print(f"{'R (m)':>7} {'local max err (m)':>18} {'local max rel':>14} {'mercator max rel':>17}")
+    for radius in args.radii:
+        lat1, lon1 = random_points(args.n, radius, seed=1)
+        lat2, lon2 = random_points(args.n, radius, seed=2)
+        _, _, ref = geod.inv(lon1, lat1, lon2, lat2)
+
+        x1, y1 = projection.to_local(lat1, lon1)
+        x2, y2 = projection.to_local(lat2, lon2)
+        err = np.abs(np.hypot(x2 - x1, y2 - y1) - ref)
+
+        mx1, my1 = projection.to_mercator(lat1, lon1)
+        mx2, my2 = projection.to_mercator(lat2, lon2)
+        merc_rel = np.abs(np.hypot(mx2 - mx1, my2 - my1) / ref - 1)
+
+        ok = ref > 1.0
+        print(f"{radius:>7.0f} {err.max():>18.3f} {(err[ok] / ref[ok]).max():>14.2e} {merc_rel[ok].max():>17.3f}")
+
+        # round trip
+        lat_b, lon_b = projection.from_local(x1, y1)
+        assert np.abs(lat_b - lat1).max() < 1e-12 and np.abs(lon_b - lon1).max() < 1e-12
+
+    lat, lon = random_points(args.n, 2000)
+    _, t_fresh = timed(lambda: Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True).transform(lon, lat))
+    projection.to_mercator(lat[:1], lon[:1])
+    _, t_cached = timed(projection.to_mercator, lat, lon)
+    _, t_local = timed(projection.to_local, lat, lon)
+    print(f"{args.n} points: fresh Transformer {t_fresh * 1e3:.1f} ms, cached {t_cached * 1e3:.1f} ms, "
+          f"local plane {t_local * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Benchmark of the binary frame decoder (serial_frames.py) against the text line parser
+#
+# A synthetic survey is written both as the receiver's text lines (capture_io format)
+# and as binary frames with some packets dropped before framing. The binary stream is
+# then corrupted (random bit flips and inserted noise) and fed to FrameDecoder in
+# serial-port-sized reads. Reports bytes per packet and decode time for both formats
+# (read by read, as ingest_serial.py does), and checks that a clean stream decodes
+# bit-exactly (headings included) with the dropped packets counted as lost, and that
+# nothing decoded from the corrupted stream is a record that was never sent.
+#
+# Usage:
+#   python bench_serial_frames.py                          # 10k, 100k, 1M packets
+#   python bench_serial_frames.py --sizes 100000 --flips 1000 --read 256
+
+import argparse
+import time
+
+import numpy as np
+
+from capture_io import parse_records
+from serial_frames import FRAME_SIZE, FrameDecoder, encode_frames
+from synthetic_survey import random_walks
+
+
+def text_stream(records):
+    lines = [f"{r}, {la}, {lo}, {al}, {h:.2f}\r\n" for r, la, lo, al, h in
+             zip(*(records[name].tolist() for name in records.dtype.names))]
+    return "".join(lines).encode("ascii")
+
+
+def corrupt(stream, flips, noise, rng):
+    b = bytearray(stream)
+    for p in rng.integers(0, len(b), flips):
+        b[p] ^= 1 << int(rng.integers(8))
+    for p in np.sort(rng.integers(0, len(b), noise))[::-1]:
+        b[p:p] = b"\xaa\x55" + rng.bytes(int(rng.integers(1, 40)))
+    return bytes(b)
+
+
+def parse_all(stream, read_bytes):
+    # the text path of ingest_serial.py: keep the partial last line between reads
+    tail, parts = b"", []
+    for i in range(0, len(stream), read_bytes):
+        buf = tail + stream[i:i + read_bytes]
+        cut = buf.rfind(b"\n")
+        if cut >= 0:
+            tail = buf[cut + 1:]
+            parts.append(parse_records(buf[:cut]))
+        else:
+            tail = buf
+    return np.concatenate(parts)
+
+
+def feed_all(stream, read_bytes):
+    decoder = FrameDecoder()
+    parts = [decoder.feed(stream[i:i + read_bytes]) for i in range(0, len(stream), read_bytes)]
+    return decoder, np.concatenate(parts)
+
+
+def bench(n, flips, noise, read_bytes, drop, seed):
+    rng = np.random.default_rng(seed)
+    records = random_walks(n, seed=seed)
+    sent = rng.random(n) >= drop
+    seq = np.arange(n)
+    text = text_stream(records)
+    clean = encode_frames(records[sent], seq=seq[sent])
+
+    t0 = time.perf_counter()
+    parsed = parse_all(text, read_bytes)
+    t_text = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    decoder, decoded = feed_all(clean, read_bytes)
+    t_bin = time.perf_counter() - t0
+    assert np.array_equal(decoded.view(np.uint8), records[sent].view(np.uint8)), "clean stream must round-trip"
+    assert decoder.stats["lost"] == int((~sent[:np.flatnonzero(sent)[-1]]).sum())
+    assert len(parsed) == n
+
+    dirty = corrupt(clean, flips, noise, rng)
+    t0 = time.perf_counter()
+    dec2, got = feed_all(dirty, read_bytes)
+    t_dirty = time.perf_counter() - t0
+    originals = records[sent]
+    key = lambda r: (r["latitude"].astype(np.int64) << 32) ^ r["longitude"].astype(np.int64) ^ r["rssi"]
+    assert np.isin(key(got), key(originals)).all(), "decoded a record that was never sent"
+    return {
+        "n": n, "text_bytes": len(text) / n, "frame_bytes": FRAME_SIZE,
+        "text_s": t_text, "binary_s": t_bin, "corrupt_s": t_dirty,
+        "decoded": len(got), "sent": int(sent.sum()), "lost": dec2.stats["lost"],
+        "crc_errors": dec2.stats["crc_errors"], "skipped": dec2.stats["skipped_bytes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary frame decoder vs text line parser")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--flips", type=int, default=100, help="random bit flips in the binary stream")
+    parser.add_argument("--noise", type=int, default=20, help="bursts of sync-led noise inserted")
+    parser.add_argument("--drop", type=float, default=0.01, help="share of packets never framed (default: 0.01)")
+    parser.add_argument("--read", type=int, default=4096, help="bytes per simulated port read (default: 4096)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'packets':>9} {'text B/pkt':>10} {'bin B/pkt':>9} {'text s':>8} {'binary s':>8} {'speedup':>7}"
+          f" {'corrupt s':>9} {'decoded':>8} {'lost':>6} {'crc err':>7}")
+    for n in args.sizes:
+        r = bench(n, args.flips, args.noise, args.read, args.drop, args.seed)
+        print(f"{n:>9} {r['text_bytes']:>10.1f} {r['frame_bytes']:>9} {r['text_s']:>8.3f} {r['binary_s']:>8.3f}"
+              f" {r['text_s'] / r['binary_s']:>6.1f}x {r['corrupt_s']:>9.3f} {r['decoded']:>8} {r['lost']:>6}"
+              f" {r['crc_errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Chunked, vectorized reader/writer for the base station serial captures (.cap)
+
+The receiver firmware prints one line per ESP-NOW packet:
+
+    rssi, latitude, longitude, altitude, heading
+    -59, 532681755, -5269116, 25885, 97.00
+
+which is the packed `struct_message` from the firmware plus the RSSI taken from
+the packet metadata:
+
+    int32_t  latitude   degrees * 1e-7
+    int32_t  longitude  degrees * 1e-7
+    uint32_t altitude   millimetres
+    float    heading    degrees
+    int8_t   rssi       dBm
+
+If the rover sends its GNSS time of week (UBX iTOW, milliseconds), the receiver may
+append it as a sixth field; such lines parse too (parse_records(..., with_itow=True)
+returns it, ITOW_NONE where a line has none).
+
+Timed captures (.tcap) are what ingest_serial.py --timed-log writes: the same fields
+behind a host timestamp, plus iTOW (-1 when unknown), after a header line giving the
+wall-clock time of the monotonic clock's origin:
+
+    # t0_unix=1763047962.118
+    1532.204183, -59, 532681755, -5269116, 25885, 97.00, 312345600
+
+Captures are read in fixed-size byte chunks, so memory stays bounded however
+long the walk was. Well-formed record lines are picked out of each chunk with a
+single regex pass (debug lines such as "Error initializing ESP-NOW", "Free heap: ..."
+and boot garbage are skipped) and parsed in bulk with NumPy.
+
+Dependencies: numpy
+"""
+
+import re
+import numpy as np
+
+# Same layout (and field names) as struct_message in the firmware, plus the RSSI
+RECORD_DTYPE = np.dtype([
+    ("rssi", "i1"),
+    ("latitude", "<i4"),
+    ("longitude", "<i4"),
+    ("altitude", "<u4"),
+    ("heading", "<f4"),
+])
+
+# Records with their host arrival time (monotonic seconds) and GNSS time of week (ms)
+TIMED_DTYPE = np.dtype(RECORD_DTYPE.descr + [("t", "<f8"), ("itow", "<u4")])
+ITOW_NONE = 0xFFFFFFFF
+
+CHUNK_BYTES = 4 * 1024 * 1024
+
+_FIELDS = rb"-?\d+[ \t]*,[ \t]*-?\d+[ \t]*,[ \t]*-?\d+[ \t]*,[ \t]*\d+[ \t]*,[ \t]*-?\d+(?:\.\d+)?"
+
+# A complete record line: four integers and the heading as printed by Serial.print(float),
+# optionally followed by the iTOW. Anything else on the line (minicom noise, debug prints,
+# partial lines) rejects it.
+RECORD_RE = re.compile(rb"^[ \t]*" + _FIELDS + rb"(?:[ \t]*,[ \t]*\d+)?[ \t]*(?=\r?$)", re.MULTILINE)
+# the same, split into the record fields and the iTOW (for lines that carry one)
+RECORD_ITOW_RE = re.compile(rb"^[ \t]*(" + _FIELDS + rb")(?:[ \t]*,[ \t]*(\d+))?[ \t]*(?=\r?$)", re.MULTILINE)
+
+# A timed capture line: host time, the record fields, iTOW or -1
+TIMED_RE = re.compile(rb"^[ \t]*\d+(?:\.\d+)?[ \t]*,[ \t]*" + _FIELDS + rb"[ \t]*,[ \t]*-?\d+[ \t]*(?=\r?$)",
+                      re.MULTILINE)
+
+N_FIELDS = 5
+
+
+def _fill_records(out, vals):
+    out["rssi"] = vals[:, 0]
+    out["latitude"] = vals[:, 1]
+    out["longitude"] = vals[:, 2]
+    out["altitude"] = vals[:, 3]
+    out["heading"] = vals[:, 4]
+    return out
+
+
+def parse_records(buf, with_itow=False):
+    """
+    Parse every well-formed record line in `buf` (bytes) into a RECORD_DTYPE array.
+    with_itow=True returns (records, itow), itow uint32 ms or ITOW_NONE per record.
+    """
+    lines = RECORD_RE.findall(buf)
+    out = np.empty(len(lines), dtype=RECORD_DTYPE)
+    itow = np.full(len(lines), ITOW_NONE, dtype=np.uint32)
+    if not lines:
+        return (out, itow) if with_itow else out
+    text = b",".join(lines)
+    if text.count(b",") != N_FIELDS * len(lines) - 1:
+        # some lines carry an iTOW: split it off (the common case never pays for this)
+        lines, itows = zip(*RECORD_ITOW_RE.findall(b"\n".join(lines)))
+        text = b",".join(lines)
+        has = np.fromiter((len(v) > 0 for v in itows), dtype=bool, count=len(itows))
+        itow[has] = np.fromstring(b",".join(v for v in itows if v).decode("ascii"), dtype=np.float64, sep=",")
+    # One C-level parse of all fields; integers up to 2**31 are exact in float64
+    vals = np.fromstring(text.decode("ascii"), dtype=np.float64, sep=",")
+    _fill_records(out, vals.reshape(-1, N_FIELDS))
+    return (out, itow) if with_itow else out
+
+
+def parse_timed_records(buf):
+    """Parse every timed capture line in `buf` into a TIMED_DTYPE array (header lines are skipped)."""
+    lines = TIMED_RE.findall(buf)
+    out = np.empty(len(lines), dtype=TIMED_DTYPE)
+    if not lines:
+        return out
+    vals = np.fromstring(b",".join(lines).decode("ascii"), dtype=np.float64, sep=",").reshape(-1, N_FIELDS + 2)
+    out["t"] = vals[:, 0]
+    _fill_records(out, vals[:, 1:N_FIELDS + 1])
+    out["itow"] = np.where(vals[:, -1] < 0, ITOW_NONE, vals[:, -1])
+    return out
+
+
+def read_timed_header(path):
+    """Header fields of a timed capture (e.g. {"t0_unix": 1763047962.118}), from its leading # lines."""
+    meta = {}
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.startswith(b"#"):
+                break
+            for item in line[1:].split():
+                key, _, value = item.decode("ascii", "replace").partition("=")
+                try:
+                    meta[key] = float(value)
+                except ValueError:
+                    meta[key] = value
+    return meta
+
+
+def iter_capture_chunks(path, chunk_bytes=CHUNK_BYTES, parse=parse_records):
+    """
+    Yield RECORD_DTYPE arrays of at most ~chunk_bytes worth of lines from a capture file
+    (TIMED_DTYPE from a timed capture with parse=parse_timed_records).
+    """
+    tail = b""
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            block = tail + block
+            cut = block.rfind(b"\n")
+            if cut < 0:
+                # no complete line yet, keep accumulating
+                tail = block
+                continue
+            tail = block[cut + 1:]
+            records = parse(block[:cut])
+            if len(records):
+                yield records
+    if tail:
+        records = parse(tail)
+        if len(records):
+            yield records
+
+
+def read_capture(path, chunk_bytes=CHUNK_BYTES):
+    """Read a whole capture into one RECORD_DTYPE array (for small files)."""
+    chunks = list(iter_capture_chunks(path, chunk_bytes))
+    if not chunks:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.concatenate(chunks)
+
+
+def scale_records(records):
+    """Return (rssi, lat, lon, alt, heading) float64 columns in dBm, degrees, metres, degrees."""
+    return (
+        records["rssi"].astype(np.float64),
+        records["latitude"] * 1e-7,
+        records["longitude"] * 1e-7,
+        records["altitude"] * 1e-3,
+        records["heading"].astype(np.float64),
+    )
+
+
+def _fixed_point(values, places):
+    """
+    ASCII for integer fixed-point values as an (n, width) uint8 matrix, e.g. (-5269116, 7)
+    -> b"-0.5269116". Unused leading positions are 0 bytes, stripped when rows are joined.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    mag = np.abs(values)
+    whole = mag // 10 ** places
+    n_whole = len(str(int(whole.max()))) if len(whole) else 1
+    powers = 10 ** np.arange(n_whole + places - 1, -1, -1, dtype=np.int64)
+    digits = (mag[:, None] // powers) % 10 + ord("0")
+    # blank leading zeros of the whole part, always keeping the units digit
+    significant = np.cumsum(digits[:, :n_whole - 1] != ord("0"), axis=1) > 0
+    digits[:, :n_whole - 1] *= significant
+    out = np.zeros((len(values), n_whole + places + 2), dtype=np.uint8)
+    out[:, 1:n_whole + 1] = digits[:, :n_whole]
+    out[:, n_whole + 1] = ord(".")
+    out[:, n_whole + 2:] = digits[:, n_whole:]
+    first = (~significant).sum(axis=1)
+    neg = values < 0
+    # the sign goes right in front of the first printed digit
+    out[neg, first[neg]] = ord("-")
+    return out
+
+
+def format_fixed_csv(records, lineterminator="\r\n"):
+    """
+    Format records as corrected CSV bytes, identical to the original fix-csv.py output:
+    rssi (1 dp), lat/lon (7 dp, degrees), alt (3 dp, metres), heading (2 dp).
+    """
+    if len(records) == 0:
+        return b""
+    n = len(records)
+    sep = np.full((n, 1), ord(","), dtype=np.uint8)
+    eol = np.frombuffer(lineterminator.encode("ascii"), dtype=np.uint8)
+    cols = [
+        _fixed_point(records["rssi"].astype(np.int64) * 10, 1), sep,
+        _fixed_point(records["latitude"], 7), sep,
+        _fixed_point(records["longitude"], 7), sep,
+        _fixed_point(records["altitude"], 3), sep,
+        _fixed_point(np.round(records["heading"].astype(np.float64) * 100), 2),
+        np.broadcast_to(eol, (n, len(eol))),
+    ]
+    flat = np.concatenate(cols, axis=1).ravel()
+    return flat[flat != 0].tobytes()
+
+
+def format_timed_lines(rows):
+    """Timed capture lines (bytes) for TIMED_DTYPE rows: t (6 dp), the record as received, iTOW or -1."""
+    if len(rows) == 0:
+        return b""
+    n = len(rows)
+    sep = np.broadcast_to(np.frombuffer(b", ", dtype=np.uint8), (n, 2))
+    itow = np.where(rows["itow"] == ITOW_NONE, -1, rows["itow"].astype(np.int64))
+    cols = [
+        _fixed_point(np.round(rows["t"] * 1e6), 6), sep,
+        _fixed_point(rows["rssi"], 0)[:, :-1], sep,
+        _fixed_point(rows["latitude"], 0)[:, :-1], sep,
+        _fixed_point(rows["longitude"], 0)[:, :-1], sep,
+        _fixed_point(rows["altitude"], 0)[:, :-1], sep,
+        _fixed_point(np.round(rows["heading"].astype(np.float64) * 100), 2), sep,
+        _fixed_point(itow, 0)[:, :-1],
+        np.full((n, 1), ord("\n"), dtype=np.uint8),
+    ]
+    flat = np.concatenate(cols, axis=1).ravel()
+    return flat[flat != 0].tobytes()
+
+
+def convert_capture(in_path, out_path, chunk_bytes=CHUNK_BYTES):
+    """Stream one capture into a corrected CSV. Returns the number of records written."""
+    n = 0
+    with open(out_path, "wb") as f_out:
+        for records in iter_capture_chunks(in_path, chunk_bytes):
+            f_out.write(format_fixed_csv(records))
+            n += len(records)
+    return n
@@ -0,0 +1,202 @@
+"""
+Persistent per-cell RSSI accumulators, merged one capture session at a time
+
+A cell store is a directory (by convention `<name>.cells/`) holding, for every session
+folded in, that session's per-cell accumulators (count, sum, sum of squares, min, max,
+centroid sums; see grid_bins.py) plus the running total over all sessions:
+
+    meta.json               cell size, origin, CRS and the session list with provenance
+    session-<id>.npz        one session's cells (packed keys + accumulators)
+    total.npz               all sessions combined
+
+Cells are anchored to a fixed projected origin (the base station in EPSG:3857), not to
+the min x / y of whatever data is loaded, so cells line up across sessions. Adding a
+capture costs O(new samples) plus one merge of cell tables; removing a bad session
+recombines the remaining per-session tables without touching any samples. Coarser
+grids (multiples of the store's cell size) are derived from the stored accumulators.
+Files pass the outlier filter (sample_filters.py) on their way in, so the stored cells
+hold only kept samples; each session records the thresholds it was filtered with.
+
+Usage:
+    python cell_store.py ./csv/RIH-all.cells add ./csv/20251113_fixed.csv ./captures/go2-initial-walk.cap
+    python cell_store.py ./csv/RIH-all.cells add ./captures/walk.tcap --max-radius 800
+    python cell_store.py ./csv/RIH-all.cells remove 20251113_fixed
+    python cell_store.py ./csv/RIH-all.cells list
+
+    from cell_store import CellStore
+    levels = CellStore("./csv/RIH-all.cells").levels([5, 10, 20])
+
+Dependencies: numpy, pandas, pyproj
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+import filter_args
+from projection import WEB_MERCATOR, to_mercator
+from grid_bins import ACCUMULATORS, accumulate, build_levels, finish, merge
+from sample_filters import filter_store, format_stats
+from survey_store import open_survey, source_stamp
+
+CELL_STORE_VERSION = 1
+CRS = WEB_MERCATOR
+DEFAULT_CELL = 1.0
+
+BASE_LAT = 53.268339893585555
+BASE_LON = -0.5298533178776605
+
+
+def _save_table(path, keys, acc):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, keys=keys, **acc)
+    os.replace(tmp, path)
+
+
+def _load_table(path):
+    with np.load(path) as npz:
+        return npz["keys"], {name: npz[name] for name in ACCUMULATORS}
+
+
+class CellStore:
+    """A cell store directory; created on first add() if it does not exist."""
+
+    def __init__(self, path, cell=DEFAULT_CELL, base_lat=BASE_LAT, base_lon=BASE_LON):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+            if self.meta.get("version") != CELL_STORE_VERSION:
+                raise ValueError(f"{path}: unsupported cell store version {self.meta.get('version')}")
+        else:
+            ox, oy = to_mercator(base_lat, base_lon)
+            self.meta = {"version": CELL_STORE_VERSION, "crs": CRS, "cell": float(cell),
+                         "origin": [float(ox), float(oy)], "next_id": 0, "sessions": []}
+
+    @property
+    def cell(self):
+        return self.meta["cell"]
+
+    @property
+    def sessions(self):
+        return self.meta["sessions"]
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write_meta(self):
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f, indent=1)
+        os.replace(tmp, self._file("meta.json"))
+
+    def session(self, name):
+        for s in self.sessions:
+            if s["name"] == name:
+                return s
+        raise KeyError(f"{self.path}: no session named {name!r}")
+
+    def total(self):
+        """(keys, accumulators) over all sessions."""
+        path = self._file("total.npz")
+        if not self.sessions or not os.path.exists(path):
+            return merge([])
+        return _load_table(path)
+
+    def add_samples(self, name, lat, lon, rssi, source=None, filter_options=None):
+        """Fold one session's samples in. Returns the session's meta entry (filter_options recorded as given)."""
+        if any(s["name"] == name for s in self.sessions):
+            raise ValueError(f"{self.path}: session {name!r} is already in the store (remove it first)")
+        x, y = to_mercator(lat, lon)
+        keys, acc = accumulate(x, y, rssi, self.cell, self.meta["origin"])
+
+        os.makedirs(self.path, exist_ok=True)
+        sid = self.meta["next_id"]
+        _save_table(self._file(f"session-{sid}.npz"), keys, acc)
+        _save_table(self._file("total.npz"), *merge([self.total(), (keys, acc)]))
+        entry = {"id": sid, "name": name, "n": int(len(rssi)), "cells": int(len(keys)), "source": source,
+                 "filter": filter_options}
+        self.meta["next_id"] = sid + 1
+        self.sessions.append(entry)
+        self._write_meta()
+        return entry
+
+    def add_file(self, path, filter_options=None):
+        """
+        Fold in a .cap/.csv/.survey file; each session of a multi-session .survey is added separately.
+        filter_options (SampleFilter keywords, None = unfiltered) drops outliers first.
+        """
+        survey = open_survey(path)
+        df = survey.to_dataframe(("rssi", "lat", "lon", "session"))
+        if filter_options is not None:
+            keep, stats = filter_store(survey, **filter_options)
+            print(f"{path}: outlier filter: {format_stats(stats)}")
+            df = df[keep]
+        source = source_stamp(path) if os.path.isfile(path) else {"path": os.path.abspath(path)}
+        if len(survey.sessions) == 1 and os.path.isfile(path):
+            names = [os.path.splitext(os.path.basename(path))[0]]
+        else:
+            names = [s["name"] for s in survey.sessions]
+        added = []
+        for i, name in enumerate(names):
+            part = df[df["session"] == i]
+            added.append(self.add_samples(name, part["lat"].values, part["lon"].values, part["rssi"].values,
+                                          source=dict(source, session=i), filter_options=filter_options))
+        return added
+
+    def remove(self, name):
+        """Subtract a session back out: the total is recombined from the remaining sessions."""
+        entry = self.session(name)
+        self.sessions.remove(entry)
+        parts = [_load_table(self._file(f"session-{s['id']}.npz")) for s in self.sessions]
+        _save_table(self._file("total.npz"), *merge(parts))
+        self._write_meta()
+        os.remove(self._file(f"session-{entry['id']}.npz"))
+        return entry
+
+    def level(self):
+        """Per-cell statistics at the store's own cell size (see grid_bins.finish)."""
+        return finish(self.cell, *self.total())
+
+    def levels(self, cell_sizes):
+        """Per-cell statistics for several multiples of the store's cell size."""
+        return build_levels(self.cell, *self.total(), cell_sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-cell RSSI accumulator store, merged session by session")
+    parser.add_argument("store", help="cell store directory (e.g. ./csv/RIH-all.cells)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="fold captures / corrected CSVs / .survey stores in, one session each")
+    add.add_argument("sources", nargs="+")
+    add.add_argument("--cell", default=DEFAULT_CELL, type=float,
+                     help=f"cell size in metres when creating the store (default: {DEFAULT_CELL})")
+    filter_args.add_arguments(add)
+    rm = sub.add_parser("remove", help="subtract sessions back out by name")
+    rm.add_argument("names", nargs="+")
+    sub.add_parser("list", help="list the sessions in the store")
+    args = parser.parse_args()
+
+    store = CellStore(args.store, cell=getattr(args, "cell", DEFAULT_CELL))
+    if args.command == "add":
+        for src in args.sources:
+            for entry in store.add_file(src, filter_args.options_from_args(args)):
+                print(f"Added {entry['name']}: {entry['n']} samples in {entry['cells']} cells")
+    elif args.command == "remove":
+        for name in args.names:
+            entry = store.remove(name)
+            print(f"Removed {entry['name']}: {entry['n']} samples")
+
+    level = store.level()
+    print(f"{store.path}: {int(level['count'].sum())} samples in {len(level['count'])} cells of "
+          f"{store.cell:g} m from {len(store.sessions)} session(s)")
+    for s in store.sessions:
+        print(f"  [{s['id']}] {s['name']}: {s['n']} samples, {s['cells']} cells")
+
+
+if __name__ == "__main__":
+    main()
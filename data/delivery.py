@@ -0,0 +1,280 @@
+"""
+Packet delivery maps: per-cell delivery ratio and inter-arrival gaps next to RSSI
+
+Captures only hold the packets that arrived, so a dead zone shows up as "no data"
+rather than as "0% delivered". Losses are reconstructed from what did arrive:
+
+    sequence numbers   binary frames (serial_frames.py) carry a counter; a jump of k+1
+                       means k packets were lost in between
+    arrival times      with a nominal send interval (default: the median gap), a gap of
+                       about (k+1) intervals means k packets were lost
+
+Each lost packet is placed on the straight line between the last sample before the
+gap and the first one after it (evenly spaced, the walker's position at send time
+is all that is unknown), so a walk through a dead zone leaves a trail of lost
+packets across it. Received and lost packets are then aggregated per cell with the
+same packed-key grid engine as RSSI (grid_bins.group): sent, received, the summed /
+maximum inter-arrival gap before each received packet and centroid sums, all
+additive, so cells can be merged and coarsened like the RSSI accumulators.
+
+    lost, gap = losses_from_seq(seq)                     # or losses_from_times(t)
+    level = bin_delivery(x, y, lost, gap, cell=5)        # gx, gy, sent, received, ratio, ...
+
+Delivery ratio is what decides whether a robot keeps its link; the map command
+renders it as a layer next to mean RSSI (raster_tiles.save_raster_map layers).
+
+The CLI takes binary frame recordings (.frames, sequence numbers) and anything with
+arrival times: timed captures (.tcap, ingest_serial.py --timed-log) or survey stores
+built from them, one loss sequence per session (times from iTOW when every sample has
+one, else host arrival time; see dwell.timestamps). Gaps are reported in seconds; frames
+carry no times, so their gaps are counted in packets unless --interval gives the send
+interval, which mixing frames with timed inputs requires. The CSV names the unit
+(mean_gap_s / mean_gap_packets).
+
+Usage:
+    python delivery.py captures/walk.frames --cell 5 --out gps_delivery-5m.html
+    python delivery.py captures/walk.frames --cells-out delivery-5m.csv --min-sent 5
+    python delivery.py captures/walk.tcap --interval 0.1 --cell 5
+    python delivery.py captures/walk.frames captures/walk2.tcap --interval 0.1
+
+Dependencies: numpy; folium + pyproj for the map
+"""
+
+import argparse
+
+import numpy as np
+
+from grid_bins import cell_keys, group, unpack
+from serial_frames import sequence_gaps
+
+# a silence longer than this is a break in the session (receiver stopped), not losses
+MAX_GAP_S = 60.0
+MIN_SENT = 3
+
+
+# ---------------------------------------------------------
+# LOSSES
+# ---------------------------------------------------------
+
+def losses_from_seq(seq, prev=None):
+    """
+    (lost, gap) per received packet from its sequence counter: packets lost right
+    before it, and the inter-arrival gap in packets (lost + 1, 0 after a reset).
+    """
+    lost, reset = sequence_gaps(seq, prev)
+    gap = np.where(reset, 0, lost + 1)
+    if prev is None and len(gap):
+        gap[0] = 0
+    return lost, gap.astype(np.float64)
+
+
+def losses_from_times(t, interval=None, max_gap_s=MAX_GAP_S):
+    """
+    (lost, gap, interval) per received packet from arrival times in seconds: packets
+    lost before it, assuming one is sent every `interval` seconds (default: the median
+    gap), and the gap since the previous packet in seconds. Gaps over max_gap_s are
+    session breaks: no losses, no gap.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    dt = np.diff(t, prepend=t[0] if len(t) else 0.0)
+    if interval is None:
+        pos = dt[dt > 0]
+        interval = float(np.median(pos)) if len(pos) else 1.0
+    brk = (dt > max_gap_s) | (dt < 0)
+    lost = np.where(brk, 0, np.maximum(np.rint(dt / interval).astype(np.int64) - 1, 0))
+    return lost, np.where(brk, 0.0, dt), interval
+
+
+def lost_points(x, y, lost):
+    """Positions of the lost packets, spread evenly between the samples either side of each gap."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    lost = np.asarray(lost, dtype=np.int64)
+    owner = np.repeat(np.arange(len(lost)), lost)
+    if len(owner) == 0:
+        return np.empty(0), np.empty(0)
+    # j-th of k lost packets before sample i sits at (j + 1) / (k + 1) of the way from i-1 to i
+    j = np.arange(len(owner)) - np.repeat(np.cumsum(lost) - lost, lost)
+    f = (j + 1) / (lost[owner] + 1)
+    prev = np.maximum(owner - 1, 0)
+    return x[prev] + (x[owner] - x[prev]) * f, y[prev] + (y[owner] - y[prev]) * f
+
+
+# ---------------------------------------------------------
+# CELLS
+# ---------------------------------------------------------
+
+def accumulate_delivery(x, y, lost, gap, cell, origin=(0.0, 0.0)):
+    """Per-cell (keys, acc) with sent, received, gap_sum, gap_max, sx, sy of received and lost packets."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    gap = np.asarray(gap, dtype=np.float64)
+    lx, ly = lost_points(x, y, lost)
+    n, m = len(x), len(lx)
+    px, py = np.concatenate((x, lx)), np.concatenate((y, ly))
+    return group(cell_keys(px, py, cell, origin), {
+        "sent": np.ones(n + m),
+        "received": np.concatenate((np.ones(n), np.zeros(m))),
+        "gap_sum": np.concatenate((gap, np.zeros(m))),
+        "gap_max": np.concatenate((gap, np.zeros(m))),
+        "sx": px,
+        "sy": py,
+    })
+
+
+def finish_delivery(cell, keys, acc):
+    """Level dict: gx, gy, sent, received, lost, ratio, mean_gap (per received packet), max_gap, x, y, cell."""
+    gx, gy = unpack(keys)
+    sent, received = acc["sent"], acc["received"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_gap = np.where(received > 0, acc["gap_sum"] / received, np.nan)
+    return {
+        "cell": cell,
+        "gx": gx,
+        "gy": gy,
+        "sent": sent.astype(np.int64),
+        "received": received.astype(np.int64),
+        "lost": (sent - received).astype(np.int64),
+        "ratio": received / sent,
+        "mean_gap": mean_gap,
+        "max_gap": acc["gap_max"],
+        "x": acc["sx"] / sent,
+        "y": acc["sy"] / sent,
+    }
+
+
+def bin_delivery(x, y, lost, gap, cell, origin=(0.0, 0.0), min_sent=1):
+    """Per-cell delivery level (see finish_delivery) of received samples at (x, y) metres."""
+    level = finish_delivery(cell, *accumulate_delivery(x, y, lost, gap, cell, origin))
+    keep = level["sent"] >= min_sent
+    return {name: (arr[keep] if name != "cell" else arr) for name, arr in level.items()}
+
+
+def write_delivery_csv(path, level, origin=(0.0, 0.0), gap_unit="s"):
+    """Per-cell CSV; the gap columns are named with gap_unit (mean_gap_s, max_gap_s)."""
+    cell = level["cell"]
+    header = f"gx,gy,x_m,y_m,sent,received,ratio,mean_gap_{gap_unit},max_gap_{gap_unit}"
+    table = np.column_stack((
+        level["gx"], level["gy"],
+        origin[0] + (level["gx"] + 0.5) * cell, origin[1] + (level["gy"] + 0.5) * cell,
+        level["sent"], level["received"], level["ratio"], level["mean_gap"], level["max_gap"],
+    ))
+    np.savetxt(path, table, delimiter=",", header=header, comments="",
+               fmt=["%d", "%d", "%.2f", "%.2f", "%d", "%d", "%.4f", "%.3f", "%.3f"])
+
+
+# ---------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------
+
+def load_frames(paths, interval=None):
+    """
+    (lat, lon, rssi, lost, gap) of recorded binary frame streams, one counter per file;
+    gap in seconds given the send interval, else in packets.
+    """
+    from serial_frames import FrameDecoder, iter_frame_chunks
+
+    cols = {name: [] for name in ("lat", "lon", "rssi", "lost", "gap")}
+    for path in paths:
+        decoder = FrameDecoder()
+        prev = None
+        for frames in iter_frame_chunks(path, decoder=decoder, frames=True):
+            lost, gap = losses_from_seq(frames["seq"], prev)
+            prev = int(frames["seq"][-1])
+            cols["lat"].append(frames["latitude"] * 1e-7)
+            cols["lon"].append(frames["longitude"] * 1e-7)
+            cols["rssi"].append(frames["rssi"].astype(np.float64))
+            cols["lost"].append(lost)
+            cols["gap"].append(gap if interval is None else gap * interval)
+        print(f"{path}: {decoder.stats['frames']} frames, {decoder.stats['lost']} lost "
+              f"({decoder.delivery_ratio():.1%} delivered)")
+    return tuple(np.concatenate(c) if c else np.empty(0) for c in cols.values())
+
+
+def load_timed(paths, interval=None, max_gap_s=MAX_GAP_S):
+    """(lat, lon, rssi, lost, gap) of timed captures / stores, losses from arrival times per session."""
+    from dwell import timestamps
+    from survey_store import open_survey
+
+    cols = {name: [] for name in ("lat", "lon", "rssi", "lost", "gap")}
+    for path in paths:
+        store = open_survey(path)
+        session = np.asarray(store.column("session"))
+        starts = np.flatnonzero(np.diff(session, prepend=-1))
+        lost_total = received = 0
+        for a, b in zip(starts, np.append(starts[1:], len(store))):
+            t = timestamps(store.column("t")[a:b], store.column("itow")[a:b])
+            if t is None:
+                raise ValueError(f"{path}: session {store.sessions[session[a]]['name']} has no arrival times "
+                                 "(record it with ingest_serial.py --timed-log)")
+            lost, gap, used = losses_from_times(t, interval, max_gap_s)
+            cols["lat"].append(store.column("lat")[a:b] * 1e-7)
+            cols["lon"].append(store.column("lon")[a:b] * 1e-7)
+            cols["rssi"].append(store.column("rssi")[a:b].astype(np.float64))
+            cols["lost"].append(lost)
+            cols["gap"].append(gap)
+            lost_total += int(lost.sum())
+            received += b - a
+            print(f"{path} [{store.sessions[session[a]]['name']}]: {b - a} packets, {int(lost.sum())} lost "
+                  f"at a {used:.3g} s send interval")
+        if received:
+            print(f"{path}: {received / (received + lost_total):.1%} delivered")
+    return tuple(np.concatenate(c) if c else np.empty(0) for c in cols.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-cell packet delivery ratio map from recorded packets")
+    parser.add_argument("streams", nargs="+",
+                        help="binary frame recordings (.frames), timed captures (.tcap) or stores with arrival times")
+    parser.add_argument("--interval", type=float, default=None,
+                        help="nominal send interval in seconds (default: median gap per session of timed inputs; "
+                             "frame gaps stay in packets without it)")
+    parser.add_argument("--max-gap", type=float, default=MAX_GAP_S,
+                        help=f"timed inputs: longer silences are session breaks, not losses (default: {MAX_GAP_S:g} s)")
+    parser.add_argument("--cell", type=float, default=5.0, help="cell size in metres (default: 5)")
+    parser.add_argument("--min-sent", type=int, default=MIN_SENT,
+                        help=f"drop cells with fewer packets sent (default: {MIN_SENT})")
+    parser.add_argument("--render", choices=["overlay", "tiles"], default="overlay")
+    parser.add_argument("--out", "-o", default="gps_delivery.html", help="output HTML map")
+    parser.add_argument("--cells-out", help="also write per-cell delivery statistics CSV")
+    args = parser.parse_args()
+
+    from grid_bins import bin_levels, level_table
+    from projection import to_mercator
+    from raster_tiles import cells_to_grid, save_raster_map
+
+    frames = [p for p in args.streams if p.lower().endswith(".frames")]
+    timed = [p for p in args.streams if not p.lower().endswith(".frames")]
+    if frames and timed and args.interval is None:
+        parser.error("combining .frames with timed inputs needs --interval (frame gaps are counted in packets)")
+    gap_unit = "packets" if frames and args.interval is None else "s"
+    try:
+        parts = [load_frames(frames, args.interval)] if frames else []
+        if timed:
+            parts.append(load_timed(timed, args.interval, args.max_gap))
+    except ValueError as e:
+        parser.error(str(e))
+    lat, lon, rssi, lost, gap = (np.concatenate(c) for c in zip(*parts))
+    if len(lat) == 0:
+        parser.error("no packets loaded")
+    x, y = to_mercator(lat, lon)
+    origin = (float(x.min()), float(y.min()))
+    level = bin_delivery(x, y, lost, gap, args.cell, origin, min_sent=args.min_sent)
+    print(f"{len(level['sent'])} cells at {args.cell:g} m: {int(level['received'].sum())} received, "
+          f"{int(level['lost'].sum())} lost, {int((level['ratio'] < 0.5).sum())} cells below 50% delivery")
+    if args.cells_out:
+        write_delivery_csv(args.cells_out, level, origin, gap_unit)
+        print(f"Saved per-cell delivery statistics to {args.cells_out}")
+
+    rssi_cells = level_table(bin_levels(x, y, rssi, [args.cell], origin=origin)[args.cell])
+    gx, gy, ratio = cells_to_grid(level, origin, value="ratio")
+    save_raster_map(gx, gy, ratio * 100, args.out, mode=args.render, vmin=0, vmax=100,
+                    name=f"Delivery ratio ({args.cell:g} m cells)", units="%",
+                    layers=[dict(zip(("gx", "gy", "field"), cells_to_grid(rssi_cells, origin)),
+                                 name=f"Mean RSSI ({args.cell:g} m cells)", vmin=-100, vmax=-30, units="dBm",
+                                 show=False)])
+    print(f"Saved delivery map to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
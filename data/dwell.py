@@ -0,0 +1,184 @@
+"""
+Dwell collapse: runs of samples at one position merged into one weighted sample
+
+The rover keeps sending while it stands still (the first rows of RIH-all.csv repeat
+one coordinate with the RSSI drifting), so a stop counts as many samples as a walk
+past tens of metres: it dominates its cell mean and floods the variogram with
+zero-lag pairs. Here consecutive samples at the same position form a run (a new run
+starts wherever the position changes, the session changes or, with timestamps, the
+gap exceeds max_gap_s), and each run becomes one sample - mean RSSI / altitude,
+mean position, first timestamp - carrying its sample count as `weight` and the time
+spent there as `dwell_s`. Everything is a diff / flatnonzero / reduceat pass, no
+Python loop per run.
+
+    runs = run_ids(lat, lon, session=session)         # run index per sample
+    d = collapse(lat, lon, rssi, t=t)                 # lat, lon, rssi, weight, dwell_s, ...
+    df = collapse_dataframe(load_survey(path))        # the same on a survey DataFrame
+
+tolerance_m > 0 also chains steps shorter than that into one run (GNSS jitter while
+standing still); keep it below the distance walked between packets (~1.5 m median on
+RIH-all), or a slow walk collapses into long runs. Times come from timed captures
+(capture_io.py .tcap, survey_store t / itow columns): timestamps() prefers the GNSS
+iTOW when every sample has one, else the host arrival time.
+
+Usage:
+    python dwell.py ./csv/RIH-all.csv                    # runs, dwell and size reduction
+    python dwell.py captures/walk.tcap --tolerance 0.3 --out walk-collapsed.csv
+
+Dependencies: numpy; pandas for collapse_dataframe() and the CLI
+"""
+
+import argparse
+
+import numpy as np
+
+from capture_io import ITOW_NONE
+from geodesy import haversine
+
+# a silence longer than this splits a run even at the same position (seconds)
+MAX_GAP_S = 60.0
+
+WEEK_MS = 7 * 24 * 3600 * 1000
+
+# averaged per run by collapse_dataframe(); other columns keep the run's first value
+MEAN_COLUMNS = ("rssi", "lat", "lon", "alt")
+
+
+def timestamps(t=None, itow=None):
+    """
+    Seconds per sample: the unwrapped GNSS iTOW (week rollovers undone) when every
+    sample has one, else the host time t, else None.
+    """
+    if itow is not None:
+        itow = np.asarray(itow)
+        if len(itow) and not np.any(itow == ITOW_NONE):
+            ms = itow.astype(np.int64)
+            step = np.diff(ms)
+            rollover = np.concatenate(([0], np.cumsum(step < -WEEK_MS // 2)))
+            return (ms + rollover * WEEK_MS) * 1e-3
+    if t is not None:
+        t = np.asarray(t, dtype=np.float64)
+        if len(t) and np.isfinite(t).all():
+            return t
+    return None
+
+
+def run_ids(lat, lon, tolerance_m=0.0, session=None, t=None, max_gap_s=MAX_GAP_S):
+    """Run index per sample: consecutive samples at the same position (within tolerance_m per step) share one."""
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    n = len(lat)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    if tolerance_m > 0:
+        moved = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:]) > tolerance_m
+    else:
+        moved = (lat[1:] != lat[:-1]) | (lon[1:] != lon[:-1])
+    if session is not None:
+        session = np.asarray(session)
+        moved |= session[1:] != session[:-1]
+    if t is not None:
+        dt = np.diff(np.asarray(t, dtype=np.float64))
+        moved |= (dt > max_gap_s) | (dt < 0)
+    return np.concatenate(([0], np.cumsum(moved)))
+
+
+def _run_bounds(runs):
+    starts = np.flatnonzero(np.diff(runs, prepend=-1))
+    return starts, np.diff(np.append(starts, len(runs)))
+
+
+def collapse(lat, lon, rssi, t=None, tolerance_m=0.0, session=None, max_gap_s=MAX_GAP_S, **columns):
+    """
+    One sample per run. Returns a dict: lat, lon, rssi (run means), t (first, if
+    given), weight (samples), dwell_s (last - first time, NaN without t), start
+    (index of the run's first sample), plus the run mean of any extra columns.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    runs = run_ids(lat, lon, tolerance_m, session, t, max_gap_s)
+    starts, weight = _run_bounds(runs)
+    out = {"start": starts, "weight": weight}
+    if len(starts) == 0:
+        for name in ("lat", "lon", "rssi", *columns):
+            out[name] = np.empty(0)
+        out["dwell_s"] = np.empty(0)
+        return out
+    for name, values in (("lat", lat), ("lon", lon), ("rssi", rssi), *columns.items()):
+        out[name] = np.add.reduceat(np.asarray(values, dtype=np.float64), starts) / weight
+    if t is not None:
+        t = np.asarray(t, dtype=np.float64)
+        out["t"] = t[starts]
+        out["dwell_s"] = t[starts + weight - 1] - t[starts]
+    else:
+        out["dwell_s"] = np.full(len(starts), np.nan)
+    return out
+
+
+def speed(lat, lon, t):
+    """Ground speed in m/s from each sample to the next (NaN for the last one and zero time steps)."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    out = np.full(len(lat), np.nan)
+    if len(lat) > 1:
+        dt = np.diff(np.asarray(t, dtype=np.float64))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[:-1] = np.where(dt > 0, haversine(lat[:-1], lon[:-1], lat[1:], lon[1:]) / dt, np.nan)
+    return out
+
+
+def collapse_dataframe(df, tolerance_m=0.0, max_gap_s=MAX_GAP_S):
+    """
+    Collapse a survey DataFrame (load_survey columns) to one row per run: rssi, lat,
+    lon, alt averaged, other columns from the run's first row, plus weight and dwell_s.
+    Times come from its t / itow columns when present.
+    """
+    import pandas as pd
+
+    t = timestamps(df["t"].to_numpy() if "t" in df else None, df["itow"].to_numpy() if "itow" in df else None)
+    session = df["session"].to_numpy() if "session" in df else None
+    runs = run_ids(df["lat"].to_numpy(), df["lon"].to_numpy(), tolerance_m, session, t, max_gap_s)
+    starts, weight = _run_bounds(runs)
+    out = {}
+    for name in df.columns:
+        values = df[name].to_numpy()
+        if name in MEAN_COLUMNS and len(starts):
+            out[name] = np.add.reduceat(values.astype(np.float64), starts) / weight
+        else:
+            out[name] = values[starts]
+    out["weight"] = weight
+    out["dwell_s"] = t[starts + weight - 1] - t[starts] if t is not None else np.full(len(starts), np.nan)
+    return pd.DataFrame(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collapse stationary runs of a survey into weighted samples")
+    parser.add_argument("survey", help=".csv, .cap, .tcap or .survey store")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="chain steps shorter than this many metres into one run (default: 0, exact repeats)")
+    parser.add_argument("--max-gap", type=float, default=MAX_GAP_S,
+                        help=f"split runs at time gaps longer than this many seconds (default: {MAX_GAP_S:g})")
+    parser.add_argument("--out", help="write the collapsed samples as CSV")
+    args = parser.parse_args()
+
+    from survey_store import load_survey
+
+    df = load_survey(args.survey, columns=("rssi", "lat", "lon", "alt", "heading", "session", "sample", "t", "itow"))
+    out = collapse_dataframe(df, args.tolerance, args.max_gap)
+    w = out["weight"].to_numpy()
+    print(f"{len(df)} samples -> {len(out)} runs ({len(out) / max(len(df), 1):.1%}), "
+          f"{int((w > 1).sum())} runs of 2+ samples, longest {int(w.max()) if len(w) else 0}")
+    dwell = out["dwell_s"].to_numpy()
+    if np.isfinite(dwell).any():
+        print(f"dwell: {np.nansum(dwell):.1f} s stationary in total, longest {np.nanmax(dwell):.1f} s")
+        t = timestamps(df["t"].to_numpy(), df["itow"].to_numpy())
+        v = speed(df["lat"].to_numpy(), df["lon"].to_numpy(), t)
+        if np.isfinite(v).any():
+            print(f"speed: median {np.nanmedian(v):.2f} m/s, 95th percentile {np.nanpercentile(v, 95):.2f} m/s")
+    if args.out:
+        out.to_csv(args.out, index=False)
+        print(f"Saved collapsed samples to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
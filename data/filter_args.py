@@ -0,0 +1,47 @@
+"""
+Command line options of the outlier filter (sample_filters.py), shared by every script that runs it
+
+Standard library only, so survey.py can build its parser without importing NumPy.
+The thresholds here are the SampleFilter defaults.
+
+    filter_args.add_arguments(parser)            # --no-filter, --max-radius, ...
+    options = filter_args.options_from_args(args)
+    if options is not None:
+        keep, stats = sample_filters.filter_store(store, **options)
+
+Dependencies: none
+"""
+
+MAX_RADIUS_M = 1500.0
+MAX_SPEED = 5.0        # m/s, well above the walker / robot
+MAX_STEP_M = 25.0      # per sample, when there are no timestamps
+DESPIKE_DB = 15.0
+
+# (flag, SampleFilter keyword, default, help)
+OPTIONS = (
+    ("--max-radius", "max_radius_m", MAX_RADIUS_M, "drop samples farther than this from the base station, metres"),
+    ("--max-speed", "max_speed", MAX_SPEED, "jump filter speed limit with timestamps, m/s"),
+    ("--max-step", "max_step_m", MAX_STEP_M, "jump filter step limit without timestamps, metres"),
+    ("--despike", "despike_db", DESPIKE_DB, "drop RSSI this many dB off the rolling median, 0 = off"),
+)
+
+
+def add_arguments(parser, switch=True):
+    """Add the threshold options (and --no-filter unless switch=False) to an argparse parser."""
+    if switch:
+        parser.add_argument("--no-filter", action="store_true", help="skip outlier filtering (sample_filters.py)")
+    for flag, _, default, text in OPTIONS:
+        parser.add_argument(flag, type=float, default=default, help=f"{text} (default: {default:g})")
+
+
+def options_from_args(args):
+    """SampleFilter keyword arguments from add_arguments() options, or None with --no-filter."""
+    if getattr(args, "no_filter", False):
+        return None
+    return {keyword: getattr(args, flag[2:].replace("-", "_")) for flag, keyword, _, _ in OPTIONS}
+
+
+def changed_options(args):
+    """Flags of the add_arguments() options given away from their defaults (--no-filter included)."""
+    changed = ["--no-filter"] if getattr(args, "no_filter", False) else []
+    return changed + [flag for flag, _, default, _ in OPTIONS if getattr(args, flag[2:].replace("-", "_")) != default]
@@ -1,40 +1,53 @@
 # Script to correct the values that are in a weird format straight out of the GPS in the CSV file
 #r.w.lloyd Nov 2025
+#
+# Usage:
+#   python fix-csv.py                                  # go2-initial-walk.cap -> go2-initial-walk.csv
+#   python fix-csv.py captures/a.cap captures/b.cap    # -> captures/a.csv, captures/b.csv
+#   python fix-csv.py --glob "captures/*.cap" --out-dir csv
+#
+# Captures are streamed in fixed-size chunks and parsed/written in bulk (see capture_io.py),
+# so multi-hour minicom captures convert in bounded memory. Debug lines are skipped.
 
-import csv
-
-input_file = "go2-initial-walk.cap"
-output_file = "go2-initial-walk.csv"
-
-with open(input_file, "r") as f_in, open(output_file, "w", newline="") as f_out:
-    reader = csv.reader(f_in)
-    writer = csv.writer(f_out)
-
-    for row in reader:
-        if not row:
-            continue
-
-        # Parse raw columns
-        rssi       = float(row[0])
-        lat_raw    = float(row[1])
-        lon_raw    = float(row[2])
-        alt_raw    = float(row[3])
-        heading    = float(row[4])
-
-        # Apply corrections
-        rssi_corrected = rssi  # Assuming RSSI is already correct
-        lat_corrected = lat_raw / 10_000_000
-        lon_corrected = lon_raw / 10_000_000
-        alt_corrected = alt_raw / 1000
-        heading_corrected = heading  # Assuming heading is already correct
-
-        # Write corrected row
-        writer.writerow([
-            rssi,
-            f"{lat_corrected:.7f}",
-            f"{lon_corrected:.7f}",
-            f"{alt_corrected:.3f}",
-            f"{heading:.2f}"
-        ])
-
-print("Finished! Corrected file written to", output_file)
+import argparse
+import glob
+import os
+import time
+
+from capture_io import CHUNK_BYTES, convert_capture
+
+
+def output_path(in_path, out_dir=None):
+    stem = os.path.splitext(os.path.basename(in_path))[0]
+    return os.path.join(out_dir if out_dir else os.path.dirname(in_path), stem + ".csv")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert raw base station captures to corrected CSV")
+    parser.add_argument("inputs", nargs="*", help="capture files (.cap)")
+    parser.add_argument("--glob", "-g", action="append", default=[], help="glob pattern of capture files (repeatable)")
+    parser.add_argument("--out-dir", "-o", default=None, help="output directory (default: next to each input)")
+    parser.add_argument("--chunk-mb", default=CHUNK_BYTES / 2**20, type=float, help="read chunk size in MiB")
+    args = parser.parse_args()
+
+    inputs = list(args.inputs)
+    for pattern in args.glob:
+        inputs.extend(sorted(glob.glob(pattern)))
+    if not inputs:
+        inputs = ["go2-initial-walk.cap"]
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    chunk_bytes = max(int(args.chunk_mb * 2**20), 1024)
+    for input_file in inputs:
+        output_file = output_path(input_file, args.out_dir)
+        t0 = time.perf_counter()
+        n = convert_capture(input_file, output_file, chunk_bytes=chunk_bytes)
+        print(f"{input_file}: {n} records -> {output_file} ({time.perf_counter() - t0:.2f}s)")
+
+    print("Finished!")
+
+
+if __name__ == "__main__":
+    main()
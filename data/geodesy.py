@@ -0,0 +1,36 @@
+"""
+Vectorized great-circle helpers shared by the signal-over-* scripts
+
+Drop-in column versions of the scalar haversine()/bearing()/angle_diff() the scripts
+used to apply row by row; all arguments broadcast (scalars or NumPy/pandas columns)
+and are computed in float64 with the same formulas, so results match the scalar
+versions to floating point rounding (see bench_geodesy.py).
+"""
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(np.subtract(lat2, lat1))
+    dlambda = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """Initial bearing from point 1 to point 2 in degrees, 0..360 (0 = north, 90 = east)."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dlon = np.radians(np.subtract(lon2, lon1))
+    x = np.sin(dlon) * np.cos(phi2)
+    y = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlon)
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+def angle_diff(a, b):
+    """Smallest absolute difference between two angles in degrees, 0..180."""
+    d = np.abs(np.subtract(a, b)) % 360
+    return np.minimum(d, 360 - d)
@@ -0,0 +1,167 @@
+"""
+Multi-resolution grid binning: per-cell RSSI statistics for many cell sizes in one pass
+
+Samples (already projected to metres) are binned once at a base cell size - the
+largest size that divides every requested one - and every requested level is then
+built from the finest level already built whose cell size divides it, by integer
+division of the cell indices and summing the children's count / sum / sum of
+squares / centroid sums. Nothing is regrouped from the raw samples after the base
+level, so e.g. 2, 4, 10 and 20 m come from 1 m -> 2 m -> 4 m, 2 m -> 10 m -> 20 m.
+
+Cell (0, 0) starts at the minimum x / y of the samples, as in heatmap_generator-2.py,
+so a level's cells are exactly those of grouping the samples at that size directly.
+
+    levels = bin_levels(x, y, rssi, [2, 3, 4, 5, 10, 20])
+    lv = levels[5]     # dict of equal-length arrays: gx, gy, count, mean, var, min, max, x, y
+
+The accumulators (count, sum, sum of squares, min, max, centroid sums) are also the
+building blocks of the persistent per-session cell store (cell_store.py): accumulate(),
+merge() and coarsen() work on (keys, accumulators) tables of packed cell indices.
+
+Dependencies: numpy
+"""
+
+import math
+
+import numpy as np
+
+# cell sizes are compared on this grid (metres) to find common divisors
+SIZE_QUANTUM = 1e-3
+MAX_INDEX = 2 ** 31
+
+# per-cell accumulators; all but min/max combine by addition (in group(), any accumulator
+# named "min" / "max" or ending in "_min" / "_max" combines that way, the rest add up)
+ACCUMULATORS = ("count", "sum", "sumsq", "min", "max", "sx", "sy")
+
+
+def pack(gx, gy):
+    """Both (signed, |i| < 2^31) cell indices in one int64 key, so grouping is a 1-D unique."""
+    return (np.asarray(gx, dtype=np.int64) << 32) | (np.asarray(gy, dtype=np.int64) & 0xFFFFFFFF)
+
+
+def unpack(keys):
+    keys = np.asarray(keys, dtype=np.int64)
+    return keys >> 32, ((keys & 0xFFFFFFFF) ^ 0x80000000) - 0x80000000
+
+
+def group(keys, acc):
+    """
+    Combine accumulator arrays per unique key. Returns (keys, {name: combined}). Any
+    per-sample accumulators work (e.g. delivery.py's sent / received / gap sums).
+    """
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    n = len(uniq)
+    out = {}
+    for name, a in acc.items():
+        if name == "min" or name.endswith("_min"):
+            out[name] = np.full(n, np.inf)
+            np.minimum.at(out[name], inverse, a)
+        elif name == "max" or name.endswith("_max"):
+            out[name] = np.full(n, -np.inf)
+            np.maximum.at(out[name], inverse, a)
+        else:
+            out[name] = np.bincount(inverse, weights=a, minlength=n)
+    return uniq, out
+
+
+def cell_keys(x, y, cell, origin=(0.0, 0.0)):
+    """Packed cell keys of points (metres) on a grid of `cell` metres from origin."""
+    gx = np.floor((np.asarray(x, dtype=np.float64) - origin[0]) / cell).astype(np.int64)
+    gy = np.floor((np.asarray(y, dtype=np.float64) - origin[1]) / cell).astype(np.int64)
+    if len(gx) and max(-gx.min(), gx.max() + 1, -gy.min(), gy.max() + 1) > MAX_INDEX:
+        raise ValueError(f"samples must lie within 2^31 cells of {cell} m of the origin")
+    return pack(gx, gy)
+
+
+def accumulate(x, y, values, cell, origin=(0.0, 0.0)):
+    """Per-cell accumulators (count, sum, sumsq, min, max, sx, sy) of `values`. Returns (keys, acc)."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    return group(cell_keys(x, y, cell, origin), {"count": np.ones_like(values), "sum": values,
+                                                  "sumsq": values * values, "min": values, "max": values,
+                                                  "sx": x, "sy": y})
+
+
+def merge(parts):
+    """Combine several (keys, acc) tables of the same grid into one."""
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return np.empty(0, dtype=np.int64), {name: np.empty(0) for name in ACCUMULATORS}
+    if len(parts) == 1:
+        return parts[0]
+    keys = np.concatenate([k for k, _ in parts])
+    return group(keys, {name: np.concatenate([a[name] for _, a in parts]) for name in parts[0][1]})
+
+
+def coarsen(keys, acc, factor):
+    """The same accumulators on a grid with `factor` times larger cells (same origin)."""
+    gx, gy = unpack(keys)
+    return group(pack(gx // factor, gy // factor), acc)
+
+
+def finish(cell, keys, acc):
+    """Level dict: gx, gy (cell indices), count, mean, var, min, max, x, y (sample centroid), cell."""
+    count = acc["count"]
+    mean = acc["sum"] / count
+    gx, gy = unpack(keys)
+    return {
+        "cell": cell,
+        "gx": gx,
+        "gy": gy,
+        "count": count.astype(np.int64),
+        "mean": mean,
+        # population variance of the samples in the cell
+        "var": np.maximum(acc["sumsq"] / count - mean * mean, 0.0),
+        "min": acc["min"],
+        "max": acc["max"],
+        "x": acc["sx"] / count,
+        "y": acc["sy"] / count,
+    }
+
+
+def build_levels(base_cell, keys, acc, cell_sizes):
+    """
+    Levels for `cell_sizes` from accumulators at base_cell, each built from the finest
+    level already built whose cell size divides it. Every size must be a multiple of
+    base_cell.
+    """
+    base_q = int(round(base_cell / SIZE_QUANTUM))
+    quanta = {c: int(round(c / SIZE_QUANTUM)) for c in cell_sizes}
+    bad = [c for c, q in quanta.items() if q <= 0 or q % base_q]
+    if bad:
+        raise ValueError(f"cell sizes {bad} are not multiples of the {base_cell} m base cell")
+    built = {base_q: (keys, acc)}
+
+    levels = {}
+    for cell in sorted(cell_sizes, key=quanta.get):
+        q = quanta[cell]
+        if q not in built:
+            parent_q = max(p for p in built if q % p == 0)
+            built[q] = coarsen(*built[parent_q], q // parent_q)
+        levels[cell] = finish(cell, *built[q])
+    return levels
+
+
+def bin_levels(x, y, values, cell_sizes, origin=None):
+    """
+    Per-cell count, mean, variance, min/max and sample centroid of `values` for every
+    cell size in `cell_sizes` (metres). origin defaults to (min x, min y). Returns
+    {cell size: level}, see finish().
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if origin is None:
+        origin = (x.min(), y.min()) if len(x) else (0.0, 0.0)
+
+    quanta = [int(round(c / SIZE_QUANTUM)) for c in cell_sizes]
+    if any(q <= 0 for q in quanta):
+        raise ValueError(f"cell sizes must be at least {SIZE_QUANTUM} m: {list(cell_sizes)}")
+    base = math.gcd(*quanta) * SIZE_QUANTUM
+    return build_levels(base, *accumulate(x, y, values, base, origin), cell_sizes)
+
+
+def level_table(level, min_count=1):
+    """One level's cell arrays, keeping only cells with at least min_count samples."""
+    keep = level["count"] >= min_count
+    return {name: (arr[keep] if name != "cell" else arr) for name, arr in level.items()}
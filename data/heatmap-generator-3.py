@@ -2,27 +2,21 @@
 # r.w.lloyd, updated with kriging by ChatGPT, Nov 2025
 
 import folium
-from folium.plugins import HeatMap
-import pandas as pd
 import numpy as np
-from pyproj import Transformer
+from projection import from_mercator, to_mercator
+from survey_store import load_survey
+from heatmap_payload import ArrayHeatMap
 from pykrige.ok import OrdinaryKriging
 
 # -----------------------------
 # Load CSV
 # -----------------------------
-df = pd.read_csv("./csv/RIH-all.csv", header=None,
-                 names=["rssi", "lat", "lon", "alt", "heading"])
-
-df["lat"] = df["lat"].astype(float)
-df["lon"] = df["lon"].astype(float)
-df["rssi"] = df["rssi"].astype(float)
+df = load_survey("./csv/RIH-all.csv")   # binary sidecar store, built on first run
 
 # -----------------------------
 # Project WGS84 -> Web Mercator (meters)
 # -----------------------------
-transformer_fwd = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
-df["x"], df["y"] = transformer_fwd.transform(df["lon"].values, df["lat"].values)
+df["x"], df["y"] = to_mercator(df["lat"].values, df["lon"].values)
 
 x = df["x"].values
 y = df["y"].values
@@ -47,6 +41,11 @@ OK = OrdinaryKriging(
 # Grid resolution controls smoothness: 30–150m depending on dataset
 grid_res = 30  # meters
 
+# Moving-neighbourhood kriging: krige each cell from its N closest points instead of
+# solving one system over every point (much faster / smaller on big datasets and fine grids).
+# None = global solve.
+N_CLOSEST = None
+
 grid_x = np.arange(np.min(x), np.max(x), grid_res)
 grid_y = np.arange(np.min(y), np.max(y), grid_res)
 
@@ -57,7 +56,10 @@ print(f"Grid size: {len(grid_x)} x {len(grid_y)} = {gridx.size} cells")
 # -----------------------------
 # Perform kriging interpolation
 # -----------------------------
-z_pred, ss = OK.execute("grid", grid_x, grid_y)
+if N_CLOSEST:
+    z_pred, ss = OK.execute("grid", grid_x, grid_y, backend="loop", n_closest_points=N_CLOSEST)
+else:
+    z_pred, ss = OK.execute("grid", grid_x, grid_y)
 
 # Flatten arrays for conversion back to lat/lon
 flat_x = gridx.flatten()
@@ -67,19 +69,15 @@ flat_pred = z_pred.flatten()
 # -----------------------------
 # Convert grid back to lat/lon
 # -----------------------------
-transformer_inv = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
-flat_lon, flat_lat = transformer_inv.transform(flat_x, flat_y)
+flat_lat, flat_lon = from_mercator(flat_x, flat_y)
 
 # -----------------------------
 # Build heatmap data (lat, lon, weight)
 # -----------------------------
-heatmap_data = []
-for la, lo, sig in zip(flat_lat, flat_lon, flat_pred):
-    # Convert RSSI (negative) to a positive Folium weight
-    weight = sig + 100
-    heatmap_data.append([la, lo, weight])
+# Convert RSSI (negative) to a positive Folium weight
+flat_weight = flat_pred + 100
 
-print(f"Generated {len(heatmap_data)} kriged points for heatmap")
+print(f"Generated {len(flat_weight)} kriged points for heatmap")
 
 # -----------------------------
 # Create Folium Map
@@ -87,8 +85,8 @@ print(f"Generated {len(heatmap_data)} kriged points for heatmap")
 # Hardcoded centre (because folium freaks out if coordinate precision is too high)
 m = folium.Map(location=[53.26831, -0.52984], zoom_start=15)
 
-HeatMap(
-    heatmap_data,
+ArrayHeatMap(
+    flat_lat, flat_lon, flat_weight,
     radius=20,        # grid is coarse, so use bigger radius
     blur=15,
     min_opacity=0.35,
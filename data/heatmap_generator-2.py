@@ -2,84 +2,88 @@
 # r.w.lloyd, Modified by ChatGPT to bin data, Nov 2025
 
 import folium
-from folium.plugins import HeatMap
 import pandas as pd
 import numpy as np
-from pyproj import Transformer
+from projection import from_mercator, to_mercator
+from survey_store import load_survey
+from grid_bins import bin_levels, level_table
+from cell_store import CellStore
+from raster_tiles import cells_to_grid, save_raster_map
+from heatmap_payload import ArrayHeatMap
 
 # ------------------
-# Load CSV
+# Grid parameters (adjust to taste)
 # ------------------
-df = pd.read_csv("./csv/RIH-all.csv", header=None,
-                 names=["rssi", "lat", "lon", "alt", "heading"])
+# every cell size is binned in one pass (grid_bins.py); one map per size
+cell_sizes_m = [2, 3, 4, 5, 6, 7, 10, 15, 20]   # <<< CHANGE THIS IF YOU WANT
+out_pattern = "gps_heatmap-{cell}m-averaged.html"   # 1.5 m -> gps_heatmap-1-5m-averaged.html
+# Per-session cell store (cell_store.py) to read instead of re-binning the CSV,
+# e.g. "./csv/RIH-all.cells" - new walks are added with `cell_store.py ... add`
+cells_path = None
+# "heatmap" (folium HeatMap of cell centres) or a server-side rendered raster of the
+# cells: "overlay" (one PNG) or "tiles" (XYZ pyramid), written to <html>_raster/
+render = "heatmap"
 
-df["lat"] = df["lat"].astype(float)
-df["lon"] = df["lon"].astype(float)
-df["rssi"] = df["rssi"].astype(float)
+if cells_path:
+    # ------------------
+    # Aggregates already accumulated per cell (fixed origin at the base station)
+    # ------------------
+    store = CellStore(cells_path)
+    levels = store.levels(cell_sizes_m)
+    origin = store.meta["origin"]
+else:
+    # ------------------
+    # Load CSV
+    # ------------------
+    df = load_survey("./csv/RIH-all.csv")   # binary sidecar store, built on first run
 
-# ------------------
-# Project WGS84 → Web Mercator (meters)
-# ------------------
-transformer_fwd = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
-df["x"], df["y"] = transformer_fwd.transform(df["lon"].values, df["lat"].values)
+    # ------------------
+    # Project WGS84 → Web Mercator (meters)
+    # ------------------
+    df["x"], df["y"] = to_mercator(df["lat"].values, df["lon"].values)
 
-# ------------------
-# Grid parameters (adjust to taste)
-# ------------------
-cell_size_m = 5   # 30m grid cells   <<< CHANGE THIS IF YOU WANT
-min_x, max_x = df["x"].min(), df["x"].max()
-min_y, max_y = df["y"].min(), df["y"].max()
+    # ------------------
+    # Assign each point to a grid cell and aggregate: mean RSSI per grid cell
+    # ------------------
+    origin = (df["x"].min(), df["y"].min())
+    levels = bin_levels(df["x"].values, df["y"].values, df["rssi"].values, cell_sizes_m, origin=origin)
 
-# ------------------
-# Assign each point to a grid cell
-# ------------------
-df["gx"] = ((df["x"] - min_x) // cell_size_m).astype(int)
-df["gy"] = ((df["y"] - min_y) // cell_size_m).astype(int)
+for cell_size_m in cell_sizes_m:
+    # Optional: throw away cells with too few readings (reduces noise)
+    cells = level_table(levels[cell_size_m], min_count=2)
+    out_html = out_pattern.format(cell=f"{cell_size_m:g}".replace(".", "-"))
 
-# ------------------
-# Aggregate: mean RSSI per grid cell
-# ------------------
-agg = df.groupby(["gx", "gy"]).agg(
-    mean_rssi=("rssi", "mean"),
-    count=("rssi", "size"),
-    x_center=("x", "mean"),
-    y_center=("y", "mean")
-).reset_index()
+    if render != "heatmap":
+        save_raster_map(*cells_to_grid(cells, origin), out_html, mode=render, vmin=-100, vmax=-30,
+                        center=(53.26831, -0.52984), name=f"Mean RSSI ({cell_size_m:g} m cells)")
+        print(f"Saved {len(cells['count'])} cells at {cell_size_m:g} m to {out_html}")
+        continue
 
-# Optional: throw away cells with too few readings (reduces noise)
-agg = agg[agg["count"] >= 2]
+    agg = pd.DataFrame(cells)
 
-# ------------------
-# Convert cell center positions back to lat/lon
-# ------------------
-transformer_inv = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
-agg["lon"], agg["lat"] = transformer_inv.transform(
-    agg["x_center"].values, agg["y_center"].values
-)
+    # ------------------
+    # Convert cell center positions back to lat/lon
+    # ------------------
+    agg["lat"], agg["lon"] = from_mercator(agg["x"].values, agg["y"].values)
 
-# ------------------
-# Convert RSSI to positive weight for Folium
-# ------------------
-# Example: RSSI -30 → weight 70; RSSI -80 → weight 20
-agg["weight"] = agg["mean_rssi"] + 100
+    # ------------------
+    # Convert RSSI to positive weight for Folium
+    # ------------------
+    # Example: RSSI -30 → weight 70; RSSI -80 → weight 20
+    agg["weight"] = agg["mean"] + 100
 
-# ------------------
-# Prepare heatmap data
-# ------------------
-heat_data = agg[["lat", "lon", "weight"]].values.tolist()
-
-# ------------------
-# Create map
-# ------------------
-m = folium.Map(location=[53.26831, -0.52984], zoom_start=15)
+    # ------------------
+    # Create map
+    # ------------------
+    m = folium.Map(location=[53.26831, -0.52984], zoom_start=15)
 
-HeatMap(
-    heat_data,
-    radius=25,      # larger because data is now coarser
-    blur=20,
-    max_zoom=20,
-    min_opacity=0.4
-).add_to(m)
+    ArrayHeatMap(
+        agg["lat"].values, agg["lon"].values, agg["weight"].values,
+        radius=25,      # larger because data is now coarser
+        blur=20,
+        max_zoom=20,
+        min_opacity=0.4
+    ).add_to(m)
 
-m.save("gps_heatmap-RIH-All-1-5m-averaged.html")
-print("Saved to gps_heatmap-averaged.html")
+    m.save(out_html)
+    print(f"Saved {len(agg)} cells at {cell_size_m:g} m to {out_html}")
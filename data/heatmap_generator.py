@@ -2,32 +2,25 @@
 # r.w.lloyd, Nov 2025
 
 import folium
-from folium.plugins import HeatMap
-import pandas as pd
+from survey_store import load_survey
+from heatmap_payload import ArrayHeatMap
 
 # Load CSV
-df = pd.read_csv("20251117-1_fixed.csv", header=None,
-                 names=["rssi", "lat", "lon", "alt", "heading"])
-
-# Ensure correct data types
-df["lat"] = df["lat"].astype(float)
-df["lon"] = df["lon"].astype(float)
-df["rssi"] = df["rssi"].astype(float)
+df = load_survey("20251117-1_fixed.csv")   # binary sidecar store, built on first run
 
 # rssi is negative (e.g., -30 dBm). HeatMap expects positive weights.
 # Convert RSSI to a positive scale: stronger signal → bigger number.
 df["weight"] = 100 + df["rssi"]   # invert the scale
 
-# Build heatmap data: [lat, lon, weight]
-heat_data = df[["lat", "lon", "weight"]].values.tolist()
+# Heatmap data [lat, lon, weight] goes in as arrays (heatmap_payload.py)
 
 # Center map on the average of your data
 # m = folium.Map(location=[df["lat"].mean(), df["lon"].mean()], zoom_start=10)
 m = folium.Map(location=[53.26831, -0.52984], zoom_start=15)  ## Hardcoded because folium cant handle too high an accuracy
 
 # Add heatmap
-HeatMap(
-    heat_data,
+ArrayHeatMap(
+    df["lat"].values, df["lon"].values, df["weight"].values,
     radius=15, #20
     blur=15, #18
     max_zoom=20,
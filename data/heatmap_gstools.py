@@ -4,26 +4,62 @@ Compatible with NumPy 2+ (uses gstools, which supports newer numpy)
 
 Usage (example):
     python heatmap_gstools.py --csv ./csv/RIH-all.csv --out gps_heatmap_gstools.html --grid 30
-
-Outputs: a Folium HTML heatmap file (kriged RSSI -> positive weights).
+    python heatmap_gstools.py --grid 5 --mode local --neighbours 64          # moving neighbourhood
+    python heatmap_gstools.py --grid 5 --mode local --error-budget 1.0       # pick k for <= 1 dB RMS
+    python heatmap_gstools.py --grid 2 --workers 8                           # global model, tiles on 8 cores
+    python heatmap_gstools.py --grid 10 --refit                              # ignore the cached variogram fit
+    python heatmap_gstools.py --grid 30 --model spherical                    # fixed variogram model family
+    python heatmap_gstools.py --grid 5 --profile - --trace run.trace.json    # per-stage timings
+    python heatmap_gstools.py --grid 2 --mode local --render tiles           # XYZ PNG tiles instead of HeatMap
+    python heatmap_gstools.py --grid 5 --collapse-dwell 0.3                  # one sample per stop
+    python heatmap_gstools.py --grid 5 --max-radius 800 --despike 20         # outlier filter thresholds
+
+Outputs: a Folium HTML heatmap file (kriged RSSI -> positive weights), or with
+--render overlay/tiles an HTML map referencing PNGs in <out>_raster/ (raster_tiles.py).
 
 Dependencies (also provided in requirements.txt):
-    gstools, pyproj, pandas, folium, numpy
+    gstools, pyproj, pandas, folium, numpy, scipy
 
 Notes:
-- The script projects lat/lon -> WebMercator (EPSG:3857) for metric kriging.
+- The script projects lat/lon -> WebMercator (EPSG:3857) for metric kriging, or with
+  --projection local onto the tangent plane at the base station (projection.py), where
+  --grid and variogram ranges are true ground metres (Mercator stretches them ~1.67x here).
 - It attempts to estimate a variogram automatically and fit a model. If that fails,
   it falls back to reasonable defaults.
 - The script includes compatibility fallbacks for different gstools versions.
+- --mode local kriges each grid cell from its k nearest samples, tile by tile
+  (local_kriging.py), instead of one global N x N solve; memory stays bounded.
+- The variogram fit is cached in --vario-cache (variogram_cache.py), keyed by the
+  projected data and the binning, so changing --grid, --radius, --mode or --satellite
+  reuses it; --refit forces a fresh estimate.
+- --profile FILE writes per-stage wall / CPU time and RSS as JSON lines (spans.py),
+  --trace FILE a Chrome trace of the same stages, down to each kriging fallback.
+- Samples pass an outlier filter first (sample_filters.py): invalid / zero fixes,
+  fixes beyond --max-radius of the base, short GNSS jumps and RSSI spikes are dropped
+  and counted per filter; --no-filter keeps everything.
+- --collapse-dwell merges runs of samples at one position (the rover standing still)
+  into one before the variogram and kriging (dwell.py), so stops do not flood the
+  variogram with zero-lag pairs.
+- --workers N evaluates grid tiles on N processes (global or local mode) with the
+  inputs and output in shared memory; the field is bit-identical for any N.
 """
 
 import argparse
 import sys
 import numpy as np
-import pandas as pd
-from pyproj import Transformer
 import folium
-from folium.plugins import HeatMap
+
+from survey_store import load_survey
+from dwell import collapse_dataframe
+import filter_args
+import sample_filters
+from projection import project, unproject
+from local_kriging import DEFAULT_NEIGHBOURS, DEFAULT_TILE, choose_neighbours, krige_tiled
+from variogram_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_ENTRIES, VariogramCache
+from raster_tiles import save_raster_map
+from heatmap_payload import ArrayHeatMap
+import spans
+from spans import span
 
 # Try to import gstools and provide clear error if missing
 try:
@@ -33,27 +69,27 @@ except Exception:
     raise
 
 
-def load_csv(path):
-    # Try to detect columns similarly to existing scripts: expect rssi, lat, lon
-    df = pd.read_csv(path, header=None)
-    # Common patterns: some CSVs in this repo appear to have columns: rssi, lat, lon, alt, heading
-    if df.shape[1] >= 3:
-        df = df.iloc[:, :5]
-        df.columns = ["rssi", "lat", "lon", "alt", "heading"][: df.shape[1]]
-    else:
-        raise ValueError("CSV must contain at least three columns: rssi, lat, lon")
+# --model choices: gstools CovModel class per family name (as in pykrige's variogram_model)
+MODEL_FAMILIES = {
+    "spherical": "Spherical",
+    "exponential": "Exponential",
+    "gaussian": "Gaussian",
+    "linear": "Linear",        # bounded linear; gstools warns it is only valid in 1D
+    "stable": "Stable",
+    "matern": "Matern",
+}
+
 
-    df = df.dropna(subset=["rssi", "lat", "lon"])  # drop incomplete rows
-    df["lat"] = df["lat"].astype(float)
-    df["lon"] = df["lon"].astype(float)
-    df["rssi"] = df["rssi"].astype(float)
-    return df
+def load_csv(path):
+    # Columns rssi, lat, lon, alt, heading (+ session, sample, t, itow). Accepts a .csv, a
+    # raw or timed capture (.cap/.tcap) or a .survey store; text files are converted once
+    # to a binary sidecar store. Incomplete rows are dropped during conversion.
+    return load_survey(path, columns=("rssi", "lat", "lon", "alt", "heading", "session", "sample", "t", "itow"))
 
 
-def project_to_meters(df):
-    transformer = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
-    xs, ys = transformer.transform(df["lon"].values, df["lat"].values)
-    return np.asarray(xs), np.asarray(ys)
+def project_to_meters(df, projection="mercator"):
+    # EPSG:3857 (cached transformer), or true metres on the base station's tangent plane
+    return project(df["lat"].values, df["lon"].values, projection)
 
 
 def build_grid(x, y, grid_res_m):
@@ -68,45 +104,108 @@ def build_grid(x, y, grid_res_m):
     return gx, gy, gridx, gridy
 
 
-def fit_variogram(x, y, vals, max_dist=None, bin_num=15):
-    # Estimate empirical variogram with fallbacks for different gstools versions
-    coords = (x, y)
+def _default_max_dist(x, y):
+    # max distance: half of diagonal
+    return np.hypot(x.max() - x.min(), y.max() - y.min()) / 2.0
+
+
+def estimate_variogram(x, y, vals, max_dist=None, bin_num=15):
+    # (bins, vario, model) without any cache; bins and vario are None when the estimate
+    # failed and model is the default fallback
+    if max_dist is None:
+        max_dist = _default_max_dist(x, y)
+    return _fit_variogram(x, y, vals, max_dist, bin_num)
+
+
+def fit_variogram(x, y, vals, max_dist=None, bin_num=15, cache=None, refit=False, family=None):
+    # Estimate empirical variogram with fallbacks for different gstools versions.
+    # With a VariogramCache, a previous fit of the same data and binning is reused
+    # unless refit is set. family ("spherical", "gaussian", ... see MODEL_FAMILIES)
+    # fits that model to the empirical variogram instead of the automatic choice; the
+    # estimate itself is shared with (and cached as) the automatic fit.
     if max_dist is None:
-        # max distance: half of diagonal
-        max_dist = np.hypot(x.max() - x.min(), y.max() - y.min()) / 2.0
+        max_dist = _default_max_dist(x, y)
+    if cache is None:
+        bins, vario, model = _fit_variogram(x, y, vals, max_dist, bin_num)
+        return model if family is None else _fit_family(family, bins, vario, model)
+
+    key = cache.key(x, y, vals, max_dist, bin_num, family)
+    if not refit:
+        entry = cache.get(key)
+        if entry is not None:
+            print(f"Using cached variogram fit {key[:12]} from {cache.path}: {entry['model']}")
+            return entry["model"]
+    base_key = cache.key(x, y, vals, max_dist, bin_num)
+    entry = None if refit or family is None else cache.get(base_key)
+    if entry is None:
+        bins, vario, model = _fit_variogram(x, y, vals, max_dist, bin_num)
+        cache.put(base_key, bins, vario, model)
+    else:
+        bins, vario, model = entry["bins"], entry["vario"], entry["model"]
+    if family is not None:
+        model = _fit_family(family, bins, vario, model)
+        cache.put(key, bins, vario, model)
+    return model
+
+
+def _fit_family(family, bins, vario, fallback):
+    # Fit one gstools model family to the empirical variogram; without an estimate (or
+    # if the fit fails) it takes the automatic/fallback model's variance and length scale
+    cls = getattr(gs, MODEL_FAMILIES[family])
+    model = cls(dim=2, var=float(fallback.var), len_scale=float(fallback.len_scale), nugget=float(fallback.nugget))
+    if bins is None or vario is None:
+        return model
+    try:
+        print(f"Fitting {family} variogram model...")
+        model.fit_variogram(bins, vario, nugget=True)
+    except Exception as e:
+        print(f"{family} fit failed, using the automatic fit's scale. Error:", e)
+        model = cls(dim=2, var=float(fallback.var), len_scale=float(fallback.len_scale), nugget=float(fallback.nugget))
+    return model
+
+
+def _fit_variogram(x, y, vals, max_dist, bin_num):
+    # Returns (bins, vario, model); bins/vario are None when estimation failed
+    coords = (x, y)
+    bins = None
+    vario = None
     try:
         print("Estimating empirical variogram...")
         # gstools API changed over versions; try a few common call signatures
-        bins = None
-        vario = None
         called = False
-        # Try named kw first
-        try:
-            bins, vario = gs.vario_estimate(coords, vals, max_dist=max_dist, bin_num=bin_num)
-            called = True
-        except TypeError:
-            try:
-                bins, vario = gs.vario_estimate(coords, vals, max_dist=max_dist, bins=bin_num)
-                called = True
-            except TypeError:
+        with span("variogram.estimate", n=len(vals), bin_num=bin_num) as s:
+            call_forms = (
+                # current API (gstools >= 1.3): explicit bin edges
+                lambda: gs.vario_estimate(coords, vals, np.linspace(0.0, max_dist, bin_num + 1)),
+                # older named kw forms
+                lambda: gs.vario_estimate(coords, vals, max_dist=max_dist, bin_num=bin_num),
+                lambda: gs.vario_estimate(coords, vals, max_dist=max_dist, bins=bin_num),
+                # positional fallback
+                lambda: gs.vario_estimate(coords, vals, bin_num),
+            )
+            for call in call_forms:
                 try:
-                    # positional fallback
-                    bins, vario = gs.vario_estimate(coords, vals, bin_num)
+                    bins, vario = call()
                     called = True
+                    break
+                except TypeError:
+                    continue
                 except Exception:
                     # give up; let outer except handle
-                    called = False
+                    break
+            s.set(ok=called)
 
         if not called:
             raise RuntimeError("vario_estimate call failed for available gstools API")
 
         # Try to fit a model automatically
         print("Fitting variogram model...")
-        try:
-            fit = gs.vario_fit(bins, vario)
-        except Exception:
-            # some gstools versions use different fit helpers; try building a reasonable model
-            fit = None
+        with span("variogram.fit"):
+            try:
+                fit = gs.vario_fit(bins, vario)
+            except Exception:
+                # some gstools versions use different fit helpers; try building a reasonable model
+                fit = None
 
         # vario_fit may return a CovModel instance (depending on gstools version) or parameters
         if fit is not None and isinstance(fit, gs.CovModel):
@@ -117,7 +216,7 @@ def fit_variogram(x, y, vals, max_dist=None, bin_num=15):
             rng = float(bins[np.nanargmax(vario)]) if (vario is not None and np.any(~np.isnan(vario))) else max_dist / 3.0
             model = gs.Exponential(dim=2, var=sill, len_scale=max(rng, 1.0))
         print("Variogram fit done.")
-        return model
+        return bins, vario, model
     except Exception as e:
         print("Variogram estimation/fit failed, falling back to default model. Error:", e)
         # Fallback: use exponential with variance from data and length scale ~ 1/5 of diagonal
@@ -126,7 +225,7 @@ def fit_variogram(x, y, vals, max_dist=None, bin_num=15):
         length = max(diag / 5.0, 1.0)
         model = gs.Exponential(dim=2, var=float(sill), len_scale=float(length))
         print(f"Fallback model: Exponential var={sill:.2f} len_scale={length:.1f}")
-        return model
+        return bins, vario, model
 
 
 def krige_with_gstools(model, x, y, vals, gx, gy, gridx, gridy):
@@ -134,16 +233,17 @@ def krige_with_gstools(model, x, y, vals, gx, gy, gridx, gridy):
     cond_pos = np.column_stack((x, y))
     try:
         print("Attempting SRF conditional kriging (gstools.SRF)...")
-        srf = gs.SRF(model, mean=float(np.nanmean(vals)))
-        # Try several calling conventions for SRF.structured / SRF.__call__
-        try:
-            field = srf.structured([gx, gy], cond_pos=cond_pos, cond_val=vals, mode="conditional")
-        except TypeError:
+        with span("krige.srf_conditional"):
+            srf = gs.SRF(model, mean=float(np.nanmean(vals)))
+            # Try several calling conventions for SRF.structured / SRF.__call__
             try:
-                field = srf.structured([gx, gy], cond_pos=cond_pos, cond_val=vals)
+                field = srf.structured([gx, gy], cond_pos=cond_pos, cond_val=vals, mode="conditional")
             except TypeError:
-                # Some versions expect cond_pos/cond_val as separate positional args
-                field = srf.structured([gx, gy], cond_pos, vals)
+                try:
+                    field = srf.structured([gx, gy], cond_pos=cond_pos, cond_val=vals)
+                except TypeError:
+                    # Some versions expect cond_pos/cond_val as separate positional args
+                    field = srf.structured([gx, gy], cond_pos, vals)
         print("SRF conditional kriging success.")
         return np.asarray(field)
     except Exception as e1:
@@ -151,11 +251,12 @@ def krige_with_gstools(model, x, y, vals, gx, gy, gridx, gridy):
         # Try alternative SRF call without explicit mode
         try:
             print("Attempting SRF.structured with default mode...")
-            srf = gs.SRF(model, mean=float(np.nanmean(vals)))
-            try:
-                field = srf.structured([gx, gy], cond_pos=cond_pos, cond_val=vals)
-            except TypeError:
-                field = srf.structured([gx, gy], cond_pos, vals)
+            with span("krige.srf_default"):
+                srf = gs.SRF(model, mean=float(np.nanmean(vals)))
+                try:
+                    field = srf.structured([gx, gy], cond_pos=cond_pos, cond_val=vals)
+                except TypeError:
+                    field = srf.structured([gx, gy], cond_pos, vals)
             print("SRF structured (default) success.")
             return np.asarray(field)
         except Exception as e2:
@@ -164,30 +265,31 @@ def krige_with_gstools(model, x, y, vals, gx, gy, gridx, gridy):
     # Try krige.Ordinary interface
     try:
         print("Attempting krige.Ordinary interface...")
-        ok = gs.krige.Ordinary(model, cond_pos=cond_pos, cond_val=vals)
-        # Call kriging on the grid. Some gstools versions accept a tuple of 1D axes, others expect meshgrids.
-        try:
-            res = ok((gx, gy))
-        except Exception:
-            # try passing meshgrid arrays
-            res = ok((gridx, gridy))
-        # res may be field or (field, var). Handle both.
-        if isinstance(res, tuple) and len(res) == 2:
-            field, var = res
-        else:
-            field = res
-        field = np.asarray(field)
-        # Ensure field has shape (ny, nx). If shapes mismatch, try reshape or transpose.
-        ny, nx = len(gy), len(gx)
-        if field.shape != (ny, nx):
-            # If it's a flat array with correct number of elements, reshape it
-            if field.ndim == 1 and field.size == ny * nx:
-                field = field.reshape((ny, nx))
-            # Try transposing
-            elif field.T.shape == (ny, nx):
-                field = field.T
+        with span("krige.ordinary"):
+            ok = gs.krige.Ordinary(model, cond_pos=cond_pos, cond_val=vals)
+            # Call kriging on the grid. Some gstools versions accept a tuple of 1D axes, others expect meshgrids.
+            try:
+                res = ok((gx, gy))
+            except Exception:
+                # try passing meshgrid arrays
+                res = ok((gridx, gridy))
+            # res may be field or (field, var). Handle both.
+            if isinstance(res, tuple) and len(res) == 2:
+                field, var = res
             else:
-                print(f"Warning: kriging result shape {field.shape} doesn't match expected {(ny,nx)}")
+                field = res
+            field = np.asarray(field)
+            # Ensure field has shape (ny, nx). If shapes mismatch, try reshape or transpose.
+            ny, nx = len(gy), len(gx)
+            if field.shape != (ny, nx):
+                # If it's a flat array with correct number of elements, reshape it
+                if field.ndim == 1 and field.size == ny * nx:
+                    field = field.reshape((ny, nx))
+                # Try transposing
+                elif field.T.shape == (ny, nx):
+                    field = field.T
+                else:
+                    print(f"Warning: kriging result shape {field.shape} doesn't match expected {(ny,nx)}")
         print("krige.Ordinary success.")
         return field
     except Exception as e3:
@@ -196,10 +298,8 @@ def krige_with_gstools(model, x, y, vals, gx, gy, gridx, gridy):
     raise RuntimeError("All gstools kriging attempts failed. Please check your gstools version and API; see script notes.")
 
 
-def to_latlon(xs, ys):
-    transformer_inv = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
-    lons, lats = transformer_inv.transform(xs, ys)
-    return lats, lons
+def to_latlon(xs, ys, projection="mercator"):
+    return unproject(xs, ys, projection)
 
 
 def grid_to_heatmap_data(field, gridx, gridy):
@@ -219,7 +319,7 @@ def grid_to_heatmap_data(field, gridx, gridy):
     return flat_x, flat_y, weights
 
 
-def create_folium_map(lat_center, lon_center, heatmap_data, out_html, radius=15, blur=12, satellite=False):
+def create_folium_map(lat_center, lon_center, lats, lons, weights, out_html, radius=15, blur=12, satellite=False):
     # Base map (OpenStreetMap). Add satellite tiles as an optional toggleable layer.
     m = folium.Map(location=[lat_center, lon_center], zoom_start=15, tiles="OpenStreetMap", control_scale=True)
 
@@ -235,53 +335,137 @@ def create_folium_map(lat_center, lon_center, heatmap_data, out_html, radius=15,
 
     # Put heatmap into a FeatureGroup so it can be toggled in the layer control
     fg = folium.FeatureGroup(name="Kriged RSSI Heatmap", overlay=True, show=True)
-    HeatMap(heatmap_data, radius=radius, blur=blur, min_opacity=0.25, max_zoom=20).add_to(fg)
+    ArrayHeatMap(lats, lons, weights, radius=radius, blur=blur, min_opacity=0.25, max_zoom=20).add_to(fg)
     fg.add_to(m)
 
     folium.LayerControl().add_to(m)
-    m.save(out_html)
+    with span("render.save", points=len(lats)):
+        m.save(out_html)
 
 
-def main():
-    parser = argparse.ArgumentParser(description="GSTools kriging heatmap generator")
-    parser.add_argument("--csv", "-c", default="./csv/RIH-all.csv", help="input csv file (rssi,lat,lon,...")
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="GSTools kriging heatmap generator")
+    parser.add_argument("--csv", "-c", default="./csv/RIH-all.csv", help="input csv/cap file or .survey store (rssi,lat,lon,...)")
     parser.add_argument("--out", "-o", default="gps_heatmap_gstools.html", help="output html file")
     parser.add_argument("--grid", "-g", default=30, type=float, help="grid spacing in meters (default: 30)")
     parser.add_argument("--radius", default=20, type=int, help="Folium HeatMap point radius")
     parser.add_argument("--satellite", action="store_true", help="Add Esri satellite tiles as a toggleable layer")
-    args = parser.parse_args()
-
-    df = load_csv(args.csv)
+    parser.add_argument("--mode", choices=["global", "local"], default="global",
+                        help="global gstools solve, or moving-neighbourhood kriging on tiles (default: global)")
+    parser.add_argument("--neighbours", "-k", default=DEFAULT_NEIGHBOURS, type=int,
+                        help=f"local mode: conditioning points per grid cell (default: {DEFAULT_NEIGHBOURS})")
+    parser.add_argument("--tile", default=DEFAULT_TILE, type=int,
+                        help=f"local mode: tile edge in grid cells (default: {DEFAULT_TILE})")
+    parser.add_argument("--error-budget", default=None, type=float,
+                        help="local mode: grow --neighbours until RMS difference to the global solve is within this many dB")
+    parser.add_argument("--workers", "-j", default=0, type=int,
+                        help="evaluate grid tiles on N processes (global mode: solve once, then tile the grid; "
+                             "default 0 = single-process gstools path)")
+    parser.add_argument("--vario-cache", default=DEFAULT_CACHE_DIR,
+                        help=f"directory caching variogram fits per dataset + binning (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--vario-cache-size", default=DEFAULT_MAX_ENTRIES, type=int,
+                        help=f"keep at most N cached fits, least recently used evicted first (default: {DEFAULT_MAX_ENTRIES})")
+    parser.add_argument("--no-vario-cache", action="store_true", help="always estimate and fit, without reading or writing the cache")
+    parser.add_argument("--refit", action="store_true", help="re-estimate and refit the variogram, replacing any cached fit")
+    parser.add_argument("--render", choices=["heatmap", "overlay", "tiles"], default="heatmap",
+                        help="folium HeatMap of grid points, or the field rasterized server-side into one PNG overlay "
+                             "or an XYZ tile pyramid next to the HTML (default: heatmap)")
+    parser.add_argument("--vmin", default=None, type=float, help="overlay/tiles: RSSI at the bottom of the colour scale")
+    parser.add_argument("--vmax", default=None, type=float, help="overlay/tiles: RSSI at the top of the colour scale")
+    parser.add_argument("--model", choices=["auto"] + list(MODEL_FAMILIES), default="auto",
+                        help="variogram model family to fit; auto keeps the gstools fit / exponential fallback "
+                             "(default: auto)")
+    parser.add_argument("--projection", choices=["mercator", "local"], default="mercator",
+                        help="krige in Web Mercator metres (EPSG:3857), or in true metres on the tangent plane "
+                             "at the base station (small survey areas; no pyproj needed) (default: mercator)")
+    parser.add_argument("--collapse-dwell", type=float, nargs="?", const=0.0, default=None, metavar="METRES",
+                        help="merge runs of samples at one position (within METRES per step, default 0) into one")
+    filter_args.add_arguments(parser)
+    spans.add_arguments(parser)
+    args = parser.parse_args(argv)
+    spans.enable_from_args(args)
+
+    with span("load", path=args.csv) as s:
+        df = load_csv(args.csv)
+        s.set(n=len(df))
     print(f"Loaded {len(df)} input rows from {args.csv}")
-
-    x, y = project_to_meters(df)
+    filter_options = filter_args.options_from_args(args)
+    if filter_options is not None:
+        with span("filter") as s:
+            keep, stats = sample_filters.filter_frame(df, **filter_options)
+            df = df[keep].reset_index(drop=True)
+            s.set(**stats)
+        print(f"Outlier filter: {sample_filters.format_stats(stats)}")
+    if args.collapse_dwell is not None:
+        with span("dwell", tolerance_m=args.collapse_dwell) as s:
+            df = collapse_dataframe(df, args.collapse_dwell)
+            s.set(n=len(df))
+        print(f"Collapsed stationary runs: {len(df)} samples")
+
+    with span("project", projection=args.projection):
+        x, y = project_to_meters(df, args.projection)
     vals = df["rssi"].values
 
-    gx, gy, gridx, gridy = build_grid(x, y, grid_res_m=float(args.grid))
+    with span("grid", grid_m=float(args.grid)) as s:
+        gx, gy, gridx, gridy = build_grid(x, y, grid_res_m=float(args.grid))
+        s.set(cells=int(gridx.size))
     print(f"Grid constructed: {len(gx)} x {len(gy)} -> {gridx.size} cells")
 
     # Fit variogram / covariance model
-    model = fit_variogram(x, y, vals, max_dist=None, bin_num=20)
-
-    # Perform kriging (gstools)
-    field = krige_with_gstools(model, x, y, vals, gx, gy, gridx, gridy)
-
-    # Convert grid XY back to lat/lon
-    flat_x = gridx.flatten()
-    flat_y = gridy.flatten()
-    lats, lons = to_latlon(flat_x, flat_y)
-
-    # Build heatmap weights (0..1)
-    _, _, weights = grid_to_heatmap_data(field, gridx, gridy)
-
-    heatmap_data = [[float(lat), float(lon), float(w)] for lat, lon, w in zip(lats, lons, weights) if w > 0]
-    print(f"Prepared {len(heatmap_data)} weighted points for folium heatmap")
+    cache = None if args.no_vario_cache else VariogramCache(args.vario_cache, max_entries=args.vario_cache_size)
+    with span("variogram", model=args.model) as s:
+        model = fit_variogram(x, y, vals, max_dist=None, bin_num=20, cache=cache, refit=args.refit,
+                              family=None if args.model == "auto" else args.model)
+        s.set(fitted=str(model))
+
+    # Perform kriging (gstools, or local neighbourhoods)
+    with span("krige", mode=args.mode, workers=args.workers, n=len(vals), cells=int(gridx.size)):
+        if args.mode == "local":
+            neighbours = args.neighbours
+            if args.error_budget is not None:
+                print(f"Choosing neighbourhood size for a {args.error_budget} dB RMS error budget...")
+                with span("krige.choose_neighbours", budget_db=args.error_budget) as s:
+                    neighbours, rms = choose_neighbours(model, x, y, vals, gx, gy, args.error_budget,
+                                                        start=args.neighbours)
+                    s.set(neighbours=neighbours, rms_db=rms)
+            print(f"Local kriging: {neighbours} neighbours per cell, {args.tile}x{args.tile} cell tiles, {max(args.workers, 1)} worker(s)")
+            field = krige_tiled(model, x, y, vals, gx, gy, mode="local", neighbours=neighbours, tile=args.tile,
+                                workers=args.workers)
+        elif args.workers > 0:
+            print(f"Global kriging: {args.tile}x{args.tile} cell tiles on {args.workers} worker(s)")
+            field = krige_tiled(model, x, y, vals, gx, gy, mode="global", tile=args.tile, workers=args.workers)
+        else:
+            field = krige_with_gstools(model, x, y, vals, gx, gy, gridx, gridy)
 
     # Center map at median GPS point
     lat_c = float(df["lat"].median())
     lon_c = float(df["lon"].median())
 
-    create_folium_map(lat_c, lon_c, heatmap_data, args.out, radius=args.radius, satellite=args.satellite)
+    if args.render != "heatmap":
+        field = np.asarray(field)
+        if field.shape != gridx.shape and field.T.shape == gridx.shape:
+            field = field.T
+        with span("render", render=args.render):
+            save_raster_map(gx, gy, field, args.out, mode=args.render, vmin=args.vmin, vmax=args.vmax, smooth=True,
+                            center=(lat_c, lon_c), satellite=args.satellite, name="Kriged RSSI",
+                            projection=args.projection)
+        print(f"Saved kriged RSSI {args.render} map to: {args.out}")
+        return
+
+    with span("render", render=args.render):
+        # Convert grid XY back to lat/lon
+        flat_x = gridx.flatten()
+        flat_y = gridy.flatten()
+        lats, lons = to_latlon(flat_x, flat_y, args.projection)
+
+        # Build heatmap weights (0..1)
+        _, _, weights = grid_to_heatmap_data(field, gridx, gridy)
+
+        keep = weights > 0
+        print(f"Prepared {int(keep.sum())} weighted points for folium heatmap")
+
+        create_folium_map(lat_c, lon_c, lats[keep], lons[keep], weights[keep], args.out, radius=args.radius,
+                          satellite=args.satellite)
     print(f"Saved kriged folium heatmap to: {args.out}")
 
 
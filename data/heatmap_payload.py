@@ -0,0 +1,96 @@
+"""
+Compact heatmap payloads: NumPy arrays straight into the HTML as base64 typed arrays
+
+folium.plugins.HeatMap turns its input into a Python list of [lat, lon, weight] lists
+(one validate_location() call per point) and then JSON-encodes every float with 15+
+digits. ArrayHeatMap is the same Leaflet.heat layer, but lat/lon are rounded to
+integer micro-degrees (~0.1 m) and weights to float32, packed little-endian and
+base64 encoded in a few vectorized calls; the browser decodes them into typed arrays
+before handing the points to L.heatLayer. See bench_heatmap_payload.py.
+
+    ArrayHeatMap(lats, lons, weights, radius=15, blur=15).add_to(m)
+
+Dependencies: numpy, folium
+"""
+
+import base64
+
+import numpy as np
+from folium.elements import JSCSSMixin
+from folium.map import Layer
+from folium.plugins import HeatMap
+from folium.utilities import camelize, remove_empty
+from jinja2 import Template
+
+# lat/lon are sent as int32 multiples of 10^-COORD_DECIMALS degrees
+COORD_DECIMALS = 6
+
+
+def encode_array(values, dtype):
+    """base64 of values cast to a little-endian dtype (e.g. "<i4", "<f4")."""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode("ascii")
+
+
+def encode_points(lats, lons, weights=None, decimals=COORD_DECIMALS):
+    """Payload dict (n, scale, lat, lon, weight) for ArrayHeatMap; rows with a NaN are dropped."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    weights = np.ones_like(lats) if weights is None else np.asarray(weights, dtype=np.float64)
+    keep = ~(np.isnan(lats) | np.isnan(lons) | np.isnan(weights))
+    if not keep.all():
+        lats, lons, weights = lats[keep], lons[keep], weights[keep]
+    scale = 10.0 ** decimals
+    return {
+        "n": int(len(lats)),
+        "scale": 1.0 / scale,
+        "lat": encode_array(np.rint(lats * scale), "<i4"),
+        "lon": encode_array(np.rint(lons * scale), "<i4"),
+        "weight": encode_array(weights, "<f4"),
+    }
+
+
+class ArrayHeatMap(JSCSSMixin, Layer):
+    """
+    Leaflet.heat layer fed from NumPy arrays; takes the same options as
+    folium.plugins.HeatMap (radius, blur, min_opacity, max_zoom, gradient, ...).
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function() {
+                function decode(b64, Typed) {
+                    var s = atob(b64), bytes = new Uint8Array(s.length);
+                    for (var i = 0; i < s.length; i++) { bytes[i] = s.charCodeAt(i); }
+                    return new Typed(bytes.buffer);
+                }
+                var lat = decode({{ this.payload.lat|tojson }}, Int32Array),
+                    lon = decode({{ this.payload.lon|tojson }}, Int32Array),
+                    w = decode({{ this.payload.weight|tojson }}, Float32Array),
+                    scale = {{ this.payload.scale|tojson }},
+                    points = new Array(lat.length);
+                for (var i = 0; i < lat.length; i++) { points[i] = [lat[i] * scale, lon[i] * scale, w[i]]; }
+                return L.heatLayer(points, {{ this.options|tojson }});
+            })();
+        {% endmacro %}
+        """
+    )
+
+    default_js = HeatMap.default_js
+
+    def __init__(self, lats, lons, weights=None, name=None, min_opacity=0.5, max_zoom=18, radius=25, blur=15,
+                 gradient=None, overlay=True, control=True, show=True, decimals=COORD_DECIMALS, **kwargs):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "HeatMap"
+        self.payload = encode_points(lats, lons, weights, decimals)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        self._bounds = ([[float(np.nanmin(lats)), float(np.nanmin(lons))],
+                         [float(np.nanmax(lats)), float(np.nanmax(lons))]] if len(lats) else [[None, None], [None, None]])
+        options = remove_empty(min_opacity=min_opacity, max_zoom=max_zoom, radius=radius, blur=blur,
+                               gradient=gradient, **kwargs)
+        # Leaflet.heat option names, as folium's HeatMap renders them
+        self.options = {camelize(k): v for k, v in options.items()}
+
+    def _get_self_bounds(self):
+        return self._bounds
@@ -0,0 +1,398 @@
+"""
+Live ingestion of the base station serial output with rolling coverage statistics
+
+Reads the receiver's text stream (`rssi, lat, lon, alt, heading` per packet) straight
+from the serial port, or from a file / pty as a stand-in, while the walk is going on.
+Records are parsed in bulk per read (capture_io.parse_records) into a preallocated
+NumPy ring buffer, so memory is fixed however long the session runs, and a status
+line reports packets/s plus per-cell RSSI statistics over the buffered window. The
+cell statistics are rolling accumulators (count, sum, sum of squares per cell),
+updated with each read and retired as the ring overwrites old rows, so a status tick
+costs the same with 1k or 1M rows buffered.
+With --binary the port carries the framed binary records of serial_frames.py instead
+of text lines, and the status line adds sequence-gap losses and CRC errors.
+With --pathloss-step, every read also updates a streaming log-distance path-loss fit
+(pathloss.py) over the whole session, not just the buffered window.
+
+Every record is stamped with a host monotonic time: the records of one read are spread
+evenly over the time since the previous read, as they arrived somewhere in between.
+Text lines that carry the GNSS iTOW as a sixth field keep it too. --timed-log writes
+both, record by record, as a timed capture (.tcap, see capture_io.py), which
+survey_store.py loads with its t / itow columns for dwell.py and speed estimates.
+
+Usage (examples):
+    python ingest_serial.py --port /dev/ttyUSB0 --log captures/walk.cap
+    python ingest_serial.py --file captures/minicom3.cap --no-follow --cell 10
+    python ingest_serial.py --port /dev/ttyUSB0 --binary --log captures/walk.frames
+    python ingest_serial.py --port /dev/ttyUSB0 --pathloss-step 30 --pathloss-out walk-pathloss.npz
+    python ingest_serial.py --port /dev/ttyUSB0 --log captures/walk.cap --timed-log captures/walk.tcap
+
+Dependencies: numpy, pyserial (only for --port)
+"""
+
+import argparse
+import errno
+import os
+import stat
+import sys
+import time
+
+import numpy as np
+
+from capture_io import ITOW_NONE, RECORD_DTYPE, TIMED_DTYPE, format_timed_lines, parse_records
+from pathloss import PathLoss, format_fit
+from serial_frames import FrameDecoder
+from projection import to_local
+
+BASE_LAT = 53.268339893585555
+BASE_LON = -0.5298533178776605
+
+MAX_LINE = 4096
+
+# records of one read are spread over at most this long before it (seconds)
+MAX_SPREAD_S = 1.0
+
+# Ring buffer rows: the firmware record plus host arrival time and GNSS iTOW
+RING_DTYPE = TIMED_DTYPE
+
+
+class RingBuffer:
+    """Fixed-capacity structured array; the oldest rows are overwritten once full."""
+
+    def __init__(self, capacity, dtype=RING_DTYPE):
+        self.capacity = int(capacity)
+        self.data = np.zeros(self.capacity, dtype=dtype)
+        self.head = 0      # next write position
+        self.total = 0     # rows ever pushed
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def push(self, rows):
+        """Append rows; returns the buffered rows they overwrote (a copy, oldest first)."""
+        n = len(rows)
+        if n == 0:
+            return self.data[:0].copy()
+        # the oldest buffered rows, from (head - len) around the ring, are overwritten first
+        evict = max(len(self) + min(n, self.capacity) - self.capacity, 0)
+        oldest = self.head - len(self)
+        evicted = self.data.take(np.arange(oldest, oldest + evict) % self.capacity)
+        if n >= self.capacity:
+            # rows older than the newest `capacity` never enter the buffer, so they are not "evicted"
+            rows = rows[-self.capacity:]
+            self.data[:] = rows
+            self.head = 0
+        else:
+            first = min(n, self.capacity - self.head)
+            self.data[self.head:self.head + first] = rows[:first]
+            self.data[:n - first] = rows[first:]
+            self.head = (self.head + n) % self.capacity
+        self.total += n
+        return evicted
+
+    def last(self):
+        """The newest buffered row (None when empty)."""
+        return self.data[(self.head - 1) % self.capacity] if self.total else None
+
+    def count_since(self, field, value):
+        """Buffered rows with row[field] >= value, for a field that ascends in arrival order (e.g. t)."""
+        if self.total < self.capacity:
+            segments = (self.data[field][:self.head],)
+        else:
+            segments = (self.data[field][self.head:], self.data[field][:self.head])
+        return sum(len(seg) - int(np.searchsorted(seg, value)) for seg in segments)
+
+    def view(self):
+        """Buffered rows in arrival order (a copy once the buffer has wrapped)."""
+        if self.total < self.capacity:
+            return self.data[:self.head]
+        return np.concatenate((self.data[self.head:], self.data[:self.head]))
+
+
+def local_xy(lat, lon, lat0=BASE_LAT, lon0=BASE_LON):
+    # East / north metres on the base station's tangent plane (pure NumPy, see projection.py)
+    return to_local(lat, lon, lat0, lon0)
+
+
+def cell_keys(rows, cell_m, lat0=BASE_LAT, lon0=BASE_LON):
+    """Packed int64 cell key ((cx << 32) | cy, base station in cell 0,0) per row."""
+    x, y = local_xy(rows["latitude"] * 1e-7, rows["longitude"] * 1e-7, lat0, lon0)
+    cx = np.floor(x / cell_m).astype(np.int64)
+    cy = np.floor(y / cell_m).astype(np.int64)
+    return (cx << 32) | (cy & 0xFFFFFFFF)
+
+
+def unpack_keys(keys):
+    return keys >> 32, (keys & 0xFFFFFFFF).astype(np.uint32).astype(np.int32).astype(np.int64)
+
+
+class RollingCells:
+    """
+    Per-cell RSSI count / sum / sum of squares over the rows currently buffered:
+    add() what the ring takes in, remove() what it overwrites. Sums are exact
+    integers (RSSI is whole dBm), so retiring rows never drifts.
+    """
+
+    def __init__(self, cell_m, lat0=BASE_LAT, lon0=BASE_LON):
+        self.cell_m = cell_m
+        self.lat0, self.lon0 = lat0, lon0
+        self.keys = np.empty(0, dtype=np.int64)   # sorted
+        self.count = np.empty(0, dtype=np.int64)
+        self.sum = np.empty(0, dtype=np.int64)
+        self.sumsq = np.empty(0, dtype=np.int64)
+
+    def _update(self, rows, sign):
+        if len(rows) == 0:
+            return
+        keys, inverse = np.unique(cell_keys(rows, self.cell_m, self.lat0, self.lon0), return_inverse=True)
+        rssi = rows["rssi"].astype(np.int64)
+        count = np.bincount(inverse, minlength=len(keys))
+        s = np.bincount(inverse, weights=rssi, minlength=len(keys)).astype(np.int64)
+        ss = np.bincount(inverse, weights=rssi * rssi, minlength=len(keys)).astype(np.int64)
+        new = keys[~np.isin(keys, self.keys)]
+        if len(new):
+            merged = np.union1d(self.keys, new)
+            at = np.searchsorted(merged, self.keys)
+            for name in ("count", "sum", "sumsq"):
+                grown = np.zeros(len(merged), dtype=np.int64)
+                grown[at] = getattr(self, name)
+                setattr(self, name, grown)
+            self.keys = merged
+        at = np.searchsorted(self.keys, keys)
+        self.count[at] += sign * count
+        self.sum[at] += sign * s
+        self.sumsq[at] += sign * ss
+        if sign < 0:
+            live = self.count > 0
+            if not live.all():
+                self.keys, self.count, self.sum, self.sumsq = (a[live] for a in (self.keys, self.count, self.sum,
+                                                                                  self.sumsq))
+
+    def add(self, rows):
+        self._update(rows, 1)
+
+    def remove(self, rows):
+        self._update(rows, -1)
+
+    def stats(self):
+        """cx, cy, count, mean, std per occupied cell (as cell_stats, without min / max)."""
+        cx, cy = unpack_keys(self.keys)
+        mean = self.sum / np.maximum(self.count, 1)
+        std = np.sqrt(np.maximum(self.sumsq / np.maximum(self.count, 1) - mean * mean, 0.0))
+        return {"cx": cx, "cy": cy, "count": self.count, "mean": mean, "std": std}
+
+
+def cell_stats(rows, cell_m, lat0=BASE_LAT, lon0=BASE_LON):
+    """
+    Per-cell RSSI statistics over `rows`. Returns a dict of equal-length arrays:
+    cx, cy (cell indices, base station in cell 0,0), count, mean, std, min, max.
+    """
+    if len(rows) == 0:
+        empty = np.empty(0)
+        return {"cx": empty, "cy": empty, "count": empty, "mean": empty, "std": empty, "min": empty, "max": empty}
+    # both indices packed into one int64 key so grouping is a 1-D unique
+    keys, inverse = np.unique(cell_keys(rows, cell_m, lat0, lon0), return_inverse=True)
+    n_cells = len(keys)
+    rssi = rows["rssi"].astype(np.float64)
+    count = np.bincount(inverse, minlength=n_cells)
+    s = np.bincount(inverse, weights=rssi, minlength=n_cells)
+    ss = np.bincount(inverse, weights=rssi * rssi, minlength=n_cells)
+    mean = s / count
+    std = np.sqrt(np.maximum(ss / count - mean * mean, 0.0))
+    lo = np.full(n_cells, np.inf)
+    hi = np.full(n_cells, -np.inf)
+    np.minimum.at(lo, inverse, rssi)
+    np.maximum.at(hi, inverse, rssi)
+    cx, cy = unpack_keys(keys)
+    return {"cx": cx, "cy": cy, "count": count, "mean": mean, "std": std, "min": lo, "max": hi}
+
+
+def stamp_times(n, last, now, max_spread=MAX_SPREAD_S):
+    """Arrival times for n records read at `now`, evenly spread over (last, now]."""
+    start = max(last, now - max_spread) if last is not None else now
+    return start + (now - start) * np.arange(1, n + 1) / max(n, 1)
+
+
+def packet_rate(ring, now, window_s):
+    """Packets per second over the last `window_s` seconds."""
+    return ring.count_since("t", now - window_s) / window_s
+
+
+# ---------------------------------------------------------
+# SOURCES
+# ---------------------------------------------------------
+
+class SerialSource:
+    def __init__(self, port, baud):
+        try:
+            import serial
+        except Exception:
+            print("Error importing pyserial. Please install it: pip install pyserial")
+            raise
+        self.ser = serial.Serial(port, baud, timeout=0.05)
+        self.follow = True
+
+    def read(self):
+        return self.ser.read(max(self.ser.in_waiting, 1))
+
+    def close(self):
+        self.ser.close()
+
+
+class FileSource:
+    """A capture file (optionally followed like `tail -f`) or a pty/FIFO."""
+
+    def __init__(self, path, follow=True):
+        self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        self.follow = follow or not stat.S_ISREG(os.fstat(self.fd).st_mode)
+
+    def read(self):
+        try:
+            return os.read(self.fd, 65536)
+        except BlockingIOError:
+            return b""
+        except OSError as e:
+            # a pty raises EIO once the writer side has gone away
+            if e.errno == errno.EIO:
+                self.follow = False
+                return b""
+            raise
+
+    def close(self):
+        os.close(self.fd)
+
+
+# ---------------------------------------------------------
+# MAIN LOOP
+# ---------------------------------------------------------
+
+def print_status(ring, cells, args, now, pathloss=None, decoder=None):
+    pps = packet_rate(ring, now, args.rate_window)
+    stats = cells.stats()
+    line = f"packets={ring.total} buffered={len(ring)} rate={pps:.1f}/s cells={len(stats['count'])}"
+    if len(ring):
+        line += f" last_rssi={int(ring.last()['rssi'])}"
+        weak = stats["mean"] < args.weak
+        if np.any(weak):
+            line += f" weak_cells={int(weak.sum())} (mean < {args.weak} dBm)"
+    if decoder is not None:
+        s = decoder.stats
+        line += (f" lost={s['lost']} ({decoder.delivery_ratio():.1%} delivered)"
+                 f" crc_errors={s['crc_errors']} skipped_bytes={s['skipped_bytes']}")
+    if pathloss is not None:
+        line += f" pathloss: {format_fit(pathloss.result(total=True))}"
+    print(line, flush=True)
+
+
+def write_cell_csv(path, stats, cell_m):
+    header = "cx,cy,x_m,y_m,count,mean_rssi,std_rssi,min_rssi,max_rssi"
+    table = np.column_stack((
+        stats["cx"], stats["cy"],
+        (stats["cx"] + 0.5) * cell_m, (stats["cy"] + 0.5) * cell_m,
+        stats["count"], stats["mean"], stats["std"], stats["min"], stats["max"],
+    ))
+    np.savetxt(path, table, delimiter=",", header=header, comments="",
+               fmt=["%d", "%d", "%.1f", "%.1f", "%d", "%.2f", "%.2f", "%.0f", "%.0f"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live ESP-NOW receiver ingestion with rolling RSSI statistics")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--port", "-p", help="serial port of the base station (e.g. /dev/ttyUSB0)")
+    src.add_argument("--file", "-f", help="capture file, FIFO or pty to read instead of a serial port")
+    parser.add_argument("--baud", default=115200, type=int, help="serial baud rate (default: 115200)")
+    parser.add_argument("--no-follow", action="store_true", help="stop at end of --file instead of waiting for more data")
+    parser.add_argument("--capacity", default=1_000_000, type=int, help="ring buffer size in packets")
+    parser.add_argument("--cell", default=10.0, type=float, help="statistics cell size in metres (default: 10)")
+    parser.add_argument("--interval", default=2.0, type=float, help="seconds between status lines")
+    parser.add_argument("--rate-window", default=5.0, type=float, help="window for packets/s in seconds")
+    parser.add_argument("--weak", default=-85.0, type=float, help="report cells with mean RSSI below this (dBm)")
+    parser.add_argument("--base-lat", default=BASE_LAT, type=float)
+    parser.add_argument("--base-lon", default=BASE_LON, type=float)
+    parser.add_argument("--binary", action="store_true",
+                        help="the receiver sends framed binary records (serial_frames.py), not text lines")
+    parser.add_argument("--log", help="append the raw serial stream to this capture file (.cap, or .frames with --binary)")
+    parser.add_argument("--timed-log", help="append the parsed records with arrival time and iTOW to this timed capture (.tcap)")
+    parser.add_argument("--cells-out", help="write per-cell statistics CSV here on exit")
+    parser.add_argument("--pathloss-step", type=float, default=None,
+                        help="fit the log-distance path-loss model live, in sectors of this many degrees")
+    parser.add_argument("--pathloss-out", help="save the path-loss fit (.npz, see pathloss.py) on exit")
+    args = parser.parse_args()
+
+    source = SerialSource(args.port, args.baud) if args.port else FileSource(args.file, follow=not args.no_follow)
+    log = open(args.log, "ab") if args.log else None
+    timed_log = None
+    if args.timed_log:
+        timed_log = open(args.timed_log, "ab")
+        # the wall-clock time of the monotonic clock's origin, once per run
+        timed_log.write(f"# t0_unix={time.time() - time.monotonic():.3f}\n".encode("ascii"))
+    ring = RingBuffer(args.capacity)
+    cells = RollingCells(args.cell, args.base_lat, args.base_lon)
+    decoder = FrameDecoder() if args.binary else None
+    pathloss = None
+    if args.pathloss_step:
+        pathloss = PathLoss(step=args.pathloss_step, lat0=args.base_lat, lon0=args.base_lon)
+    tail = b""
+    last_read = None
+    next_status = time.monotonic() + args.interval
+
+    try:
+        while True:
+            data = source.read()
+            now = time.monotonic()
+            if data:
+                if log:
+                    log.write(data)
+                records, itow = None, ITOW_NONE
+                if decoder is not None:
+                    records = decoder.feed(data)
+                else:
+                    buf = tail + data
+                    cut = buf.rfind(b"\n")
+                    if cut >= 0:
+                        tail = buf[cut + 1:]
+                        records, itow = parse_records(buf[:cut], with_itow=True)
+                    else:
+                        # no newline yet; a line longer than this is line noise, not a record
+                        tail = buf[-MAX_LINE:]
+                if records is not None:
+                    rows = np.empty(len(records), dtype=RING_DTYPE)
+                    for name in RECORD_DTYPE.names:
+                        rows[name] = records[name]
+                    rows["t"] = stamp_times(len(rows), last_read, now)
+                    rows["itow"] = itow
+                    cells.remove(ring.push(rows))
+                    cells.add(rows[-ring.capacity:])
+                    if timed_log and len(rows):
+                        timed_log.write(format_timed_lines(rows))
+                    if pathloss is not None:
+                        pathloss.update_latlon(records["latitude"] * 1e-7, records["longitude"] * 1e-7, records["rssi"])
+            elif not source.follow:
+                break
+            else:
+                time.sleep(0.01)
+            if now >= next_status:
+                print_status(ring, cells, args, now, pathloss, decoder)
+                next_status = now + args.interval
+            last_read = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
+        if log:
+            log.close()
+        if timed_log:
+            timed_log.close()
+
+    print_status(ring, cells, args, time.monotonic(), pathloss, decoder)
+    if args.cells_out:
+        write_cell_csv(args.cells_out, cell_stats(ring.view(), args.cell, args.base_lat, args.base_lon), args.cell)
+        print(f"Saved per-cell statistics to: {args.cells_out}")
+    if pathloss is not None and args.pathloss_out:
+        pathloss.save(args.pathloss_out)
+        print(f"Saved path-loss fit to: {args.pathloss_out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
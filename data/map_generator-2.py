@@ -1,35 +1,43 @@
-import pandas as pd
+import numpy as np
 import folium
+from survey_store import load_survey
+from scatter_layer import RED_GREEN, ScatterLayer, palette_index
 
-# Load CSV
-df = pd.read_csv("go2-initial-walk.csv", header=None, names=["rssi", "lat_raw", "lon_raw", "alt_raw", "heading"])
+# Load CSV (lat/lon in degrees, alt in metres)
+df = load_survey("go2-initial-walk.csv")   # binary sidecar store, built on first run
 
-# Convert to proper lat/lon/alt
-df["lat"] = df["lat_raw"]
-df["lon"] = df["lon_raw"]
-df["alt"] = df["alt_raw"] # if in millimetres, otherwise adjust as needed
+# One canvas layer for all samples (scatter_layer.py); False = one CircleMarker per
+# sample with its own popup, only sensible for a few thousand points
+bulk = True
 
 # Make Folium map centered on average point
 m = folium.Map(location=[df["lat"].mean(), df["lon"].mean()], zoom_start=17)
 
-# Normalize RSSI for color mapping
-rssi_min, rssi_max = df["rssi"].min(), df["rssi"].max()
+# Normalize RSSI for color mapping, red→green gradient (one NumPy pass)
+idx = palette_index(df["rssi"].values)
 
-for _, row in df.iterrows():
-    norm_rssi = (row["rssi"] - rssi_min) / (rssi_max - rssi_min)
-    # Map RSSI to a red→green gradient
-    r = int(255 * (1 - norm_rssi))
-    g = int(255 * norm_rssi)
-    color = f"#{r:02x}{g:02x}00"
-
-    folium.CircleMarker(
-        location=[row["lat"], row["lon"]],
+if bulk:
+    # Popups are built in the browser for the clicked sample only
+    ScatterLayer(
+        df["lat"].values, df["lon"].values, idx, RED_GREEN,
+        popup={"RSSI": (df["rssi"].values, "", 0), "Heading": (df["heading"].values, "°", 0),
+               "Alt": (df["alt"].values, " m", 2)},
         radius=5,
-        color=color,
-        fill=True,
         fill_opacity=0.8,
-        popup=f"RSSI: {row['rssi']}<br>Heading: {row['heading']}°<br>Alt: {row['alt']:.2f} m"
+        name="Samples",
     ).add_to(m)
+else:
+    colors = np.array(RED_GREEN)[idx]
+    for lat, lon, color, rssi, heading, alt in zip(df["lat"].values, df["lon"].values, colors,
+                                                   df["rssi"].values, df["heading"].values, df["alt"].values):
+        folium.CircleMarker(
+            location=[lat, lon],
+            radius=5,
+            color=color,
+            fill=True,
+            fill_opacity=0.8,
+            popup=f"RSSI: {rssi}<br>Heading: {heading}°<br>Alt: {alt:.2f} m"
+        ).add_to(m)
 
 m.save("gps_signal_map-go2-initial-walk.html")
 print("✅ Map saved as gps_signal_map.html — open it in your browser!")
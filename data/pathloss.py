@@ -0,0 +1,307 @@
+"""
+Streaming log-distance path-loss fit, globally and per bearing sector
+
+Fits the propagation model
+
+    rssi = p0 - 10 * n * log10(d / d0)
+
+by least squares of RSSI on x = log10(d / d0), for all samples and separately for
+each angular sector around the base station (sectors centred on
+angular_bins.sector_centers(step, start), each sample in exactly one). Samples are
+never kept: each sector holds the streaming sufficient statistics count, mean x,
+mean rssi and the co-moments Sxx, Sxy, Syy, and a batch is folded in
+with one bincount pass plus the pairwise (Chan et al.) update, which stays exact in
+float64 however many samples arrive. That makes it suitable both for surveys larger
+than RAM (fed column chunks from a memory-mapped store) and for the live receiver
+stream (ingest_serial.py --pathloss-step), where it is updated on every read.
+
+    fit = PathLoss(step=30)
+    for lat, lon, rssi in chunks:
+        fit.update_latlon(lat, lon, rssi)
+    res = fit.result()             # dict of arrays, one row per sector
+    glob = fit.result(total=True)  # the same for all sectors together
+    fit.predict(distance_m, bearing_deg)
+
+Results carry n (samples), p0 and the exponent with their standard errors and
+confidence intervals (Student t), the residual (shadowing) sigma in dB and r2.
+Sectors with too few samples or too little distance spread (the samples within one
+standard deviation of the mean log-distance spanning less than a factor
+MIN_DISTANCE_RATIO in distance, e.g. a walk that stays 150-200 m out) give NaN: the
+slope of such a fit is noise, with exponents like -47. Accumulators
+combine with merge() and round-trip through save() / load() (.npz).
+
+Usage:
+    python pathloss.py ./csv/RIH-all.csv                  # global + 30 degree sectors
+    python pathloss.py ./csv/RIH-all.csv --step 45 --save rih-pathloss.npz --plot
+
+Dependencies: numpy, scipy (t quantiles, normal approximation without it),
+matplotlib (only for --plot)
+"""
+
+import argparse
+
+import numpy as np
+
+from angular_bins import sector_centers
+from geodesy import bearing, haversine
+from projection import BASE_LAT, BASE_LON
+
+D0 = 1.0                 # reference distance of p0 (metres)
+MIN_DISTANCE = 2.0       # closer samples are dominated by GPS error, not path loss
+MIN_SAMPLES = 10         # per sector, for a fit to be reported
+MIN_DISTANCE_RATIO = 2.0  # +-1 std of log10(d) must span at least this factor in distance
+CHUNK_ROWS = 1_000_000
+
+# sufficient statistics per sector
+STATS = ("count", "mx", "my", "sxx", "sxy", "syy")
+
+
+def _combine(a, b):
+    """Pairwise merge of two sets of per-sector statistics (dicts of equal-length arrays)."""
+    n = a["count"] + b["count"]
+    safe = np.where(n > 0, n, 1)
+    dx = b["mx"] - a["mx"]
+    dy = b["my"] - a["my"]
+    w = a["count"] * b["count"] / safe
+    return {
+        "count": n,
+        "mx": a["mx"] + dx * b["count"] / safe,
+        "my": a["my"] + dy * b["count"] / safe,
+        "sxx": a["sxx"] + b["sxx"] + dx * dx * w,
+        "sxy": a["sxy"] + b["sxy"] + dx * dy * w,
+        "syy": a["syy"] + b["syy"] + dy * dy * w,
+    }
+
+
+def batch_stats(sector, x, y, n_sectors):
+    """Per-sector statistics of one batch (two bincount passes: means, then co-moments)."""
+    count = np.bincount(sector, minlength=n_sectors).astype(np.float64)
+    safe = np.where(count > 0, count, 1)
+    mx = np.bincount(sector, weights=x, minlength=n_sectors) / safe
+    my = np.bincount(sector, weights=y, minlength=n_sectors) / safe
+    dx = x - mx[sector]
+    dy = y - my[sector]
+    return {
+        "count": count, "mx": mx, "my": my,
+        "sxx": np.bincount(sector, weights=dx * dx, minlength=n_sectors),
+        "sxy": np.bincount(sector, weights=dx * dy, minlength=n_sectors),
+        "syy": np.bincount(sector, weights=dy * dy, minlength=n_sectors),
+    }
+
+
+def _t_quantile(p, dof):
+    try:
+        from scipy.special import stdtrit
+    except ImportError:
+        return np.full(np.shape(dof), 1.959963984540054)
+    return stdtrit(np.maximum(dof, 1), p)
+
+
+def solve(stats, confidence=0.95, min_samples=MIN_SAMPLES, min_ratio=MIN_DISTANCE_RATIO):
+    """
+    Least-squares p0 / exponent with standard errors and confidence intervals from statistics;
+    NaN with fewer than min_samples or when +-1 std of log10(d) spans less than min_ratio.
+    """
+    n = stats["count"]
+    min_var = max((np.log10(min_ratio) / 2) ** 2, 1e-9)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ok = (n >= max(min_samples, 3)) & (stats["sxx"] >= min_var * np.maximum(n, 1))
+        slope = np.where(ok, stats["sxy"] / stats["sxx"], np.nan)
+        p0 = stats["my"] - slope * stats["mx"]
+        sse = np.maximum(stats["syy"] - slope * stats["sxy"], 0.0)
+        dof = n - 2
+        sigma = np.sqrt(sse / dof)
+        se_slope = sigma / np.sqrt(stats["sxx"])
+        se_p0 = sigma * np.sqrt(1.0 / n + stats["mx"] ** 2 / stats["sxx"])
+        r2 = 1.0 - sse / stats["syy"]
+    t = _t_quantile(0.5 + confidence / 2, dof)
+    exponent = -slope / 10.0
+    se_exp = se_slope / 10.0
+    return {
+        "n": n.astype(np.int64),
+        "p0": p0, "p0_se": se_p0, "p0_lo": p0 - t * se_p0, "p0_hi": p0 + t * se_p0,
+        "exponent": exponent, "exponent_se": se_exp,
+        "exponent_lo": exponent - t * se_exp, "exponent_hi": exponent + t * se_exp,
+        "sigma_db": np.where(ok, sigma, np.nan), "r2": np.where(ok, r2, np.nan),
+    }
+
+
+class PathLoss:
+    """Streaming per-sector (and global) log-distance path-loss fit around one base station."""
+
+    def __init__(self, step=30.0, start=0.0, d0=D0, min_distance=MIN_DISTANCE,
+                 lat0=BASE_LAT, lon0=BASE_LON):
+        self.step = float(step)
+        self.start = float(start) % 360
+        self.d0 = float(d0)
+        self.min_distance = float(min_distance)
+        self.lat0, self.lon0 = lat0, lon0
+        self.centers = sector_centers(self.step, self.start)
+        self.stats = {name: np.zeros(len(self.centers)) for name in STATS}
+
+    def __len__(self):
+        return int(self.stats["count"].sum())
+
+    def sector_of(self, bearing_deg):
+        """Index of the sector whose centre is nearest each bearing."""
+        k = np.floor((np.asarray(bearing_deg, dtype=np.float64) - self.start) % 360 / self.step + 0.5)
+        return k.astype(np.int64) % len(self.centers)
+
+    def update(self, distance_m, bearing_deg, rssi):
+        """Fold in a batch of samples given their distance and bearing from the base station."""
+        d = np.asarray(distance_m, dtype=np.float64)
+        y = np.asarray(rssi, dtype=np.float64)
+        # a scalar bearing applies to every sample, as in predict()
+        bearing_deg = np.broadcast_to(np.asarray(bearing_deg, dtype=np.float64), d.shape)
+        keep = (d >= max(self.min_distance, 1e-9)) & np.isfinite(y)
+        if not keep.all():
+            d, y, bearing_deg = d[keep], y[keep], bearing_deg[keep]
+        if len(d) == 0:
+            return self
+        x = np.log10(d / self.d0)
+        batch = batch_stats(self.sector_of(bearing_deg), x, y, len(self.centers))
+        self.stats = _combine(self.stats, batch)
+        return self
+
+    def update_latlon(self, lat, lon, rssi):
+        """Fold in a batch of samples given in degrees."""
+        return self.update(haversine(self.lat0, self.lon0, lat, lon), bearing(self.lat0, self.lon0, lat, lon), rssi)
+
+    def merge(self, other):
+        """Add another fit's samples (same sectors and d0), e.g. from a parallel chunk."""
+        if not (np.array_equal(self.centers, other.centers) and self.d0 == other.d0):
+            raise ValueError("path-loss fits with different sectors or d0 cannot be merged")
+        self.stats = _combine(self.stats, other.stats)
+        return self
+
+    def total(self):
+        """Statistics of all sectors together."""
+        acc = {name: np.zeros(1) for name in STATS}
+        for k in range(len(self.centers)):
+            acc = _combine(acc, {name: self.stats[name][k:k + 1] for name in STATS})
+        return acc
+
+    def result(self, total=False, confidence=0.95, min_samples=MIN_SAMPLES, min_ratio=MIN_DISTANCE_RATIO):
+        """Fitted parameters per sector (with "center"), or for all samples with total=True."""
+        if total:
+            res = solve(self.total(), confidence, min_samples, min_ratio)
+            return {k: v[0] for k, v in res.items()}
+        res = solve(self.stats, confidence, min_samples, min_ratio)
+        res["center"] = self.centers
+        return res
+
+    def predict(self, distance_m, bearing_deg=None, min_samples=MIN_SAMPLES):
+        """
+        Model RSSI at distance (and bearing): the sector's fit where it has one, the
+        global fit elsewhere or when no bearing is given.
+        """
+        glob = self.result(total=True, min_samples=min_samples)
+        x = np.log10(np.maximum(np.asarray(distance_m, dtype=np.float64), self.d0) / self.d0)
+        if bearing_deg is None:
+            return glob["p0"] - 10.0 * glob["exponent"] * x
+        res = self.result(min_samples=min_samples)
+        k = self.sector_of(bearing_deg)
+        p0 = np.where(np.isfinite(res["p0"][k]), res["p0"][k], glob["p0"])
+        exponent = np.where(np.isfinite(res["exponent"][k]), res["exponent"][k], glob["exponent"])
+        return p0 - 10.0 * exponent * x
+
+    def save(self, path):
+        np.savez(path, centers=self.centers, step=self.step, start=self.start, d0=self.d0,
+                 min_distance=self.min_distance, lat0=self.lat0, lon0=self.lon0, **self.stats)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            fit = cls(step=float(z["step"]), start=float(z["start"]), d0=float(z["d0"]),
+                      min_distance=float(z["min_distance"]), lat0=float(z["lat0"]), lon0=float(z["lon0"]))
+            fit.stats = {name: z[name].astype(np.float64) for name in STATS}
+        return fit
+
+
+def format_fit(res):
+    """One-line summary of a fitted row (a dict of scalars)."""
+    if not np.isfinite(res["p0"]):
+        return f"n={int(res['n'])}: not enough samples / distance spread"
+    return (f"n={int(res['n'])} p0={res['p0']:.1f} dBm [{res['p0_lo']:.1f}, {res['p0_hi']:.1f}] "
+            f"exponent={res['exponent']:.2f} [{res['exponent_lo']:.2f}, {res['exponent_hi']:.2f}] "
+            f"sigma={res['sigma_db']:.1f} dB r2={res['r2']:.2f}")
+
+
+def fit_survey(path, step=30.0, min_distance=MIN_DISTANCE, chunk_rows=CHUNK_ROWS, fit=None):
+    """Fit a survey (.survey store, .csv or .cap) chunk by chunk from its memory-mapped columns."""
+    from survey_store import open_survey
+
+    store = open_survey(path)
+    if fit is None:
+        fit = PathLoss(step=step, min_distance=min_distance)
+    rssi, lat, lon = store.column("rssi"), store.column("lat"), store.column("lon")
+    for i in range(0, len(store), chunk_rows):
+        fit.update_latlon(lat[i:i + chunk_rows] * 1e-7, lon[i:i + chunk_rows] * 1e-7, rssi[i:i + chunk_rows])
+    return fit
+
+
+def plot_fit(fit, path=None, save=None):
+    import matplotlib.pyplot as plt
+
+    glob = fit.result(total=True)
+    res = fit.result()
+    d = np.logspace(np.log10(max(fit.min_distance, fit.d0)), np.log10(500), 100)
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+    ax1.plot(d, fit.predict(d), "k", lw=2, label=f"all: n={glob['exponent']:.2f}, p0={glob['p0']:.1f}")
+    for k, c in enumerate(res["center"]):
+        if np.isfinite(res["p0"][k]):
+            ax1.plot(d, res["p0"][k] - 10 * res["exponent"][k] * np.log10(d / fit.d0), lw=1, alpha=0.7,
+                     label=f"{c:g} deg: n={res['exponent'][k]:.2f}")
+    ax1.set_xscale("log")
+    ax1.set_xlabel("Distance from base station (m)")
+    ax1.set_ylabel("Model RSSI (dBm)")
+    ax1.legend(fontsize=7)
+    ax1.grid(True, which="both", alpha=0.3)
+    ok = np.isfinite(res["exponent"])
+    ax2.errorbar(res["center"][ok], res["exponent"][ok],
+                 yerr=(res["exponent"][ok] - res["exponent_lo"][ok], res["exponent_hi"][ok] - res["exponent"][ok]),
+                 fmt="o", capsize=3)
+    ax2.axhline(glob["exponent"], color="k", lw=1)
+    ax2.set_xlabel("Sector centre (degrees from north)")
+    ax2.set_ylabel("Path-loss exponent n")
+    ax2.grid(True, alpha=0.3)
+    fig.suptitle(f"Log-distance path loss{f' - {path}' if path else ''}")
+    fig.tight_layout()
+    if save:
+        fig.savefig(save, dpi=150)
+    else:
+        plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the log-distance path-loss model globally and per sector")
+    parser.add_argument("surveys", nargs="*", help=".survey stores, .csv or .cap files (fitted together)")
+    parser.add_argument("--step", type=float, default=30.0, help="sector width in degrees (default: 30)")
+    parser.add_argument("--min-distance", type=float, default=MIN_DISTANCE,
+                        help=f"ignore samples closer than this (m, default: {MIN_DISTANCE:g})")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of the intervals")
+    parser.add_argument("--resume", help="start from a fit saved with --save (surveys are added to it)")
+    parser.add_argument("--save", help="save the accumulated fit (.npz) for later --resume / merging")
+    parser.add_argument("--plot", action="store_true", help="plot model curves and per-sector exponents")
+    parser.add_argument("--plot-save", help="write the plot to this image instead of showing it")
+    args = parser.parse_args()
+    if not args.surveys and not args.resume:
+        parser.error("give at least one survey or --resume")
+
+    fit = PathLoss.load(args.resume) if args.resume else PathLoss(step=args.step, min_distance=args.min_distance)
+    for path in args.surveys:
+        fit_survey(path, fit=fit)
+
+    print(f"All sectors: {format_fit(fit.result(total=True, confidence=args.confidence))}")
+    res = fit.result(confidence=args.confidence)
+    for k, c in enumerate(res["center"]):
+        print(f"  {c:6.1f} deg: {format_fit({name: v[k] for name, v in res.items()})}")
+    if args.save:
+        fit.save(args.save)
+        print(f"Saved fit to {args.save}")
+    if args.plot or args.plot_save:
+        plot_fit(fit, ", ".join(args.surveys), args.plot_save)
+
+
+if __name__ == "__main__":
+    main()
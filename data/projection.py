@@ -0,0 +1,127 @@
+"""
+Shared projections: process-wide cached pyproj transformers and a pure-NumPy local plane
+
+Every script used to build its own Transformer.from_crs("EPSG:4326", "EPSG:3857") and
+inverse. transformer() caches them per (src, dst) for the life of the process, and
+pyproj is only imported on first use.
+
+Web Mercator metres are not ground metres: at 53N they are stretched by
+1 / cos(53.27) ~ 1.67. For field-sized surveys the local tangent plane (east / north of
+the base station BASE_LAT / BASE_LON, i.e. ENU with the up axis dropped) gives true
+metres with plain NumPy: WGS84 lat/lon -> ECEF -> rotate into the base's ENU frame.
+The inverse refines the equirectangular guess with LOCAL_INVERSE_ITERATIONS fixed-point
+steps (round trip < 1e-8 m within 20 km).
+
+Distances between two points in the plane against the WGS84 geodesic (pyproj.Geod),
+both points within R of the base (bench_projection.py):
+
+    R = 500 m: < 1 mm      R = 5 km: 1 mm (3e-7)      R = 10 km: 8 mm (1.2e-6)
+
+The error grows ~R^3 / Earth radius^2, so the plane is good for anything a walk
+covers; Web Mercator distances at the same site are 67% too long.
+
+    x, y = to_mercator(lat, lon);  lat, lon = from_mercator(x, y)
+    x, y = to_local(lat, lon);     lat, lon = from_local(x, y)
+
+Dependencies: numpy, pyproj (Mercator / transformer() only)
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+BASE_LAT = 53.268339893585555
+BASE_LON = -0.5298533178776605
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+LOCAL_INVERSE_ITERATIONS = 4
+
+WGS84 = "EPSG:4326"
+WEB_MERCATOR = "EPSG:3857"
+
+
+@lru_cache(maxsize=None)
+def transformer(src=WGS84, dst=WEB_MERCATOR):
+    """Cached always_xy pyproj Transformer from src to dst (lon/lat order for EPSG:4326)."""
+    from pyproj import Transformer
+
+    return Transformer.from_crs(src, dst, always_xy=True)
+
+
+def to_mercator(lat, lon):
+    x, y = transformer(WGS84, WEB_MERCATOR).transform(np.asarray(lon, dtype=np.float64),
+                                                      np.asarray(lat, dtype=np.float64))
+    return np.asarray(x), np.asarray(y)
+
+
+def from_mercator(x, y):
+    """(lat, lon) of EPSG:3857 x / y."""
+    lon, lat = transformer(WEB_MERCATOR, WGS84).transform(np.asarray(x, dtype=np.float64),
+                                                          np.asarray(y, dtype=np.float64))
+    return np.asarray(lat), np.asarray(lon)
+
+
+def radii(lat0):
+    """(M, N): WGS84 meridional and prime-vertical radii of curvature at lat0 (degrees), metres."""
+    s2 = np.sin(np.radians(lat0)) ** 2
+    w = np.sqrt(1 - WGS84_E2 * s2)
+    return WGS84_A * (1 - WGS84_E2) / w ** 3, WGS84_A / w
+
+
+def _ecef(lat, lon):
+    # points on the ellipsoid surface (h = 0)
+    phi, lam = np.radians(lat), np.radians(lon)
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * np.sin(phi) ** 2)
+    return n * np.cos(phi) * np.cos(lam), n * np.cos(phi) * np.sin(lam), n * (1 - WGS84_E2) * np.sin(phi)
+
+
+def to_local(lat, lon, lat0=BASE_LAT, lon0=BASE_LON):
+    """East / north metres on the tangent plane at (lat0, lon0)."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    x, y, z = _ecef(lat, lon)
+    x0, y0, z0 = _ecef(lat0, lon0)
+    dx, dy, dz = x - x0, y - y0, z - z0
+    sp, cp = np.sin(np.radians(lat0)), np.cos(np.radians(lat0))
+    sl, cl = np.sin(np.radians(lon0)), np.cos(np.radians(lon0))
+    east = -sl * dx + cl * dy
+    north = -sp * cl * dx - sp * sl * dy + cp * dz
+    return east, north
+
+
+def from_local(x, y, lat0=BASE_LAT, lon0=BASE_LON, iterations=LOCAL_INVERSE_ITERATIONS):
+    """(lat, lon) on the ellipsoid of east / north metres on the tangent plane at (lat0, lon0)."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    m, n = radii(lat0)
+    kx, ky = np.degrees(1 / (n * np.cos(np.radians(lat0)))), np.degrees(1 / m)
+    lat = lat0 + y * ky
+    lon = lon0 + x * kx
+    # fixed-point refinement with the base's radii as the (near-diagonal) Jacobian
+    for _ in range(iterations):
+        ex, ny = to_local(lat, lon, lat0, lon0)
+        lat = lat + (y - ny) * ky
+        lon = lon + (x - ex) * kx
+    return lat, lon
+
+
+def project(lat, lon, mode="mercator", lat0=BASE_LAT, lon0=BASE_LON):
+    """x / y in metres: mode "mercator" (EPSG:3857) or "local" (tangent plane at lat0 / lon0)."""
+    if mode == "local":
+        return to_local(lat, lon, lat0, lon0)
+    if mode == "mercator":
+        return to_mercator(lat, lon)
+    raise ValueError(f"unknown projection {mode!r} (expected 'mercator' or 'local')")
+
+
+def unproject(x, y, mode="mercator", lat0=BASE_LAT, lon0=BASE_LON):
+    """Inverse of project(): (lat, lon)."""
+    if mode == "local":
+        return from_local(x, y, lat0, lon0)
+    if mode == "mercator":
+        return from_mercator(x, y)
+    raise ValueError(f"unknown projection {mode!r} (expected 'mercator' or 'local')")
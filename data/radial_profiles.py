@@ -0,0 +1,147 @@
+"""
+Radial RSSI profiles on a shared distance axis, smoothed all sectors at once
+
+The compass plots used to smooth each angular slice on its own with savgol_filter
+over sample index, so the effective smoothing distance depended on how densely that
+slice had been walked, and short slices needed ad-hoc window fixes. Here every
+sector (angular_bins.sector_slices, overlapping windows allowed) is resampled onto
+one distance axis of `bin_m` bins - per-bin mean RSSI and sample count, in a single
+bincount over all (sector, sample) pairs - giving a (sector x distance) matrix with
+NaN where a sector has no samples. Smoothing then runs over the whole matrix along
+the distance axis, with windows in metres:
+
+    mean     count-weighted moving average (empty bins simply carry no weight)
+    savgol   Savitzky-Golay over the gap-filled profile, re-masked afterwards
+    median   rolling median of the bin means, robust to multipath spikes
+
+    prof = radial_profiles(bearing_deg, distance_m, rssi, step=5, bin_m=2)
+    rssi_grid = smooth(prof, "savgol", window_m=20)     # (len(prof["centers"]), n_bins)
+    polar_heatmap(ax, prof, rssi_grid)                  # ax = subplot(projection="polar")
+
+Dependencies: numpy, scipy (savgol only), matplotlib (polar_heatmap only)
+"""
+
+import warnings
+
+import numpy as np
+
+from angular_bins import sector_slices
+
+METHODS = ("mean", "savgol", "median")
+
+
+def radial_profiles(bearing_deg, distance_m, values, step, half_width=None, start=0.0, bin_m=1.0,
+                    max_distance=None):
+    """
+    Per-sector, per-distance-bin mean of values. Returns a dict: centers (degrees),
+    edges (metres, n_bins + 1), sum, count and mean as (sectors, n_bins) arrays
+    (mean is NaN in empty bins).
+    """
+    distance_m = np.asarray(distance_m, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    centers, order, bounds = sector_slices(bearing_deg, distance_m, step, half_width, start)
+    if max_distance is None:
+        max_distance = float(distance_m.max()) if len(distance_m) else bin_m
+    n_bins = max(int(np.ceil(max_distance / bin_m)), 1)
+    edges = np.arange(n_bins + 1) * bin_m
+
+    sector = np.repeat(np.arange(len(centers)), np.diff(bounds))
+    dbin = np.floor(distance_m[order] / bin_m).astype(np.int64)
+    ok = dbin < n_bins
+    flat = sector[ok] * n_bins + dbin[ok]
+    size = len(centers) * n_bins
+    count = np.bincount(flat, minlength=size).reshape(len(centers), n_bins)
+    total = np.bincount(flat, weights=values[order][ok], minlength=size).reshape(len(centers), n_bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+    return {"centers": centers, "edges": edges, "bin_m": bin_m, "step": step,
+            "sum": total, "count": count, "mean": mean}
+
+
+def _window_bins(window_m, bin_m, odd=True, minimum=1):
+    w = max(int(round(window_m / bin_m)), minimum)
+    if odd and w % 2 == 0:
+        w += 1
+    return w
+
+
+def _moving_sum(a, w):
+    """Centred moving sum of width w (odd) along the last axis, zero-padded."""
+    half = w // 2
+    c = np.cumsum(np.pad(a, [(0, 0)] * (a.ndim - 1) + [(half + 1, half)]), axis=-1)
+    return c[..., w:] - c[..., :-w]
+
+
+def fill_gaps(mean):
+    """
+    Linearly interpolate NaN bins between valid ones along each row; bins before the
+    first / after the last valid one take its value. Rows without data stay NaN.
+    """
+    valid = np.isfinite(mean)
+    n = mean.shape[-1]
+    idx = np.broadcast_to(np.arange(n), mean.shape)
+    prev = np.maximum.accumulate(np.where(valid, idx, -1), axis=-1)
+    nxt = np.minimum.accumulate(np.where(valid, idx, n)[..., ::-1], axis=-1)[..., ::-1]
+    has = valid.any(axis=-1, keepdims=True)
+    prev_c = np.where(prev < 0, nxt, prev).clip(0, n - 1)
+    nxt_c = np.where(nxt >= n, prev, nxt).clip(0, n - 1)
+    rows = np.arange(mean.shape[0])[:, None]
+    lo, hi = mean[rows, prev_c], mean[rows, nxt_c]
+    span = (nxt_c - prev_c).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.where(span > 0, (idx - prev_c) / span, 0.0)
+    out = lo + (hi - lo) * frac
+    return np.where(has, out, np.nan)
+
+
+def coverage(count):
+    """Bins between each row's nearest and farthest sample (where a smoothed profile is shown)."""
+    seen = count > 0
+    return np.logical_and(np.logical_or.accumulate(seen, axis=-1),
+                          np.logical_or.accumulate(seen[..., ::-1], axis=-1)[..., ::-1])
+
+
+def smooth(prof, method="savgol", window_m=10.0, poly=3):
+    """
+    Smoothed (sectors, n_bins) RSSI matrix of radial_profiles() output, all rows at once.
+    Bins outside each sector's covered distance range are NaN; method None returns the bin means.
+    """
+    bin_m = prof["bin_m"]
+    inside = coverage(prof["count"])
+    if method is None or method == "none":
+        return prof["mean"]
+    if method == "mean":
+        w = _window_bins(window_m, bin_m)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = _moving_sum(prof["sum"], w) / _moving_sum(prof["count"].astype(np.float64), w)
+    elif method == "savgol":
+        from scipy.signal import savgol_filter
+
+        w = _window_bins(window_m, bin_m, minimum=poly + 2)
+        filled = fill_gaps(prof["mean"])
+        empty = ~np.isfinite(filled).any(axis=-1)
+        filled[empty] = 0.0
+        if w > filled.shape[-1]:
+            w = filled.shape[-1] - (1 - filled.shape[-1] % 2)
+        out = savgol_filter(filled, w, min(poly, w - 1), axis=-1, mode="interp") if w > poly else filled
+    elif method == "median":
+        w = _window_bins(window_m, bin_m)
+        half = w // 2
+        padded = np.pad(prof["mean"], [(0, 0), (half, half)], constant_values=np.nan)
+        windows = np.lib.stride_tricks.sliding_window_view(padded, w, axis=-1)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN windows
+            out = np.nanmedian(windows, axis=-1)
+    else:
+        raise ValueError(f"unknown smoothing method {method!r} (expected one of {', '.join(METHODS)})")
+    return np.where(inside, out, np.nan)
+
+
+def polar_heatmap(ax, prof, grid, cmap="viridis", vmin=None, vmax=None):
+    """Draw a (sectors x distance) matrix on a polar axis (north up, clockwise) in one pcolormesh."""
+    half = np.radians(prof["step"]) / 2
+    theta = np.append(np.radians(prof["centers"]) - half, np.radians(prof["centers"][-1]) + half)
+    ax.set_theta_zero_location("N")
+    ax.set_theta_direction(-1)
+    return ax.pcolormesh(theta, prof["edges"], np.ma.masked_invalid(grid).T, cmap=cmap, vmin=vmin, vmax=vmax,
+                         shading="flat")
@@ -0,0 +1,298 @@
+"""
+Server-side rasterized RSSI maps: colormapped PNG image overlays and XYZ tile pyramids
+
+folium's HeatMap ships every point to the browser as a JS list and re-blurs all of them
+on each pan / zoom, so the HTML grows with the point count. Here the aggregated or
+kriged field (on a regular EPSG:3857 grid, or a local tangent-plane grid, see
+projection.py) is colormapped once in NumPy and written to a directory next to the
+HTML, either as
+
+    overlay:  one PNG covering the grid's extent (<out>_raster/rssi.png), or
+    tiles:    a Web Mercator XYZ pyramid (<out>_raster/{z}/{x}/{y}.png),
+
+and the HTML only references those files by relative URL, so its size no longer
+depends on the data. Open the HTML from the same directory as the raster folder (or
+serve both with `python -m http.server`).
+
+    save_raster_map(gx, gy, field, "gps_heatmap.html", mode="tiles", vmin=-100, vmax=-30)
+
+PNG files are written with zlib directly, so no imaging library is needed.
+
+Dependencies: numpy, pyproj, folium
+"""
+
+import os
+import struct
+import zlib
+
+import numpy as np
+from projection import from_mercator, project, to_mercator, unproject
+
+# Web Mercator extent and tile size
+WORLD_M = 20037508.342789244
+TILE_PX = 256
+
+# Leaflet.heat's default gradient, so rasters look like the HeatMap layers they replace
+GRADIENT = [(0.0, (0, 0, 255)), (0.4, (0, 0, 255)), (0.6, (0, 255, 255)),
+            (0.7, (0, 255, 0)), (0.8, (255, 255, 0)), (1.0, (255, 0, 0))]
+DEFAULT_OPACITY = 0.7
+MAX_ZOOM = 20
+
+
+# ---------------------------------------------------------
+# COLOUR + PNG
+# ---------------------------------------------------------
+
+def colormap(values, vmin, vmax, opacity=DEFAULT_OPACITY):
+    """RGBA uint8 image (shape + (4,)) of values on GRADIENT; NaN becomes transparent."""
+    values = np.asarray(values, dtype=np.float64)
+    blank = np.isnan(values)
+    t = np.clip(np.where(blank, 0.0, values - vmin) / max(vmax - vmin, 1e-12), 0.0, 1.0)
+    stops = [s for s, _ in GRADIENT]
+    rgba = np.empty(values.shape + (4,), dtype=np.uint8)
+    for c in range(3):
+        rgba[..., c] = np.rint(np.interp(t, stops, [rgb[c] for _, rgb in GRADIENT]))
+    rgba[..., 3] = np.where(blank, 0, int(round(255 * opacity)))
+    return rgba
+
+
+def encode_png(rgba):
+    """PNG bytes of an (h, w, 4) uint8 image."""
+    h, w, _ = rgba.shape
+    # filter type 0 (none) in front of every scanline
+    raw = np.zeros((h, w * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = np.ascontiguousarray(rgba, dtype=np.uint8).reshape(h, w * 4)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
+
+
+def write_png(path, rgba):
+    with open(path, "wb") as f:
+        f.write(encode_png(rgba))
+
+
+# ---------------------------------------------------------
+# SAMPLING THE GRID
+# ---------------------------------------------------------
+
+def cells_to_grid(level, origin=(0.0, 0.0), value="mean"):
+    """
+    Dense (gx, gy, field) of a grid_bins / cell_store level: cell-centre axes in metres
+    and the mean (or another per-cell array, e.g. a delivery level's "ratio") per
+    cell, NaN where a cell has no samples.
+    """
+    cell = level["cell"]
+    if len(level["gx"]) == 0:
+        return np.empty(0), np.empty(0), np.empty((0, 0))
+    ix0, iy0 = level["gx"].min(), level["gy"].min()
+    nx, ny = level["gx"].max() - ix0 + 1, level["gy"].max() - iy0 + 1
+    field = np.full((ny, nx), np.nan)
+    field[level["gy"] - iy0, level["gx"] - ix0] = level[value]
+    gx = origin[0] + (np.arange(nx) + ix0 + 0.5) * cell
+    gy = origin[1] + (np.arange(ny) + iy0 + 0.5) * cell
+    return gx, gy, field
+
+
+def sample_grid(gx, gy, field, px, py, smooth=False):
+    """
+    Field values at points (px, py) (metres, any equal shapes) of a regular grid with
+    ascending cell-centre axes gx, gy; NaN outside the grid. smooth=True interpolates
+    bilinearly, otherwise each point takes its cell's value.
+    """
+    dx = gx[1] - gx[0] if len(gx) > 1 else 1.0
+    dy = gy[1] - gy[0] if len(gy) > 1 else 1.0
+    fx = (px - gx[0]) / dx
+    fy = (py - gy[0]) / dy
+    ny, nx = field.shape
+    inside = (fx >= -0.5) & (fx < nx - 0.5) & (fy >= -0.5) & (fy < ny - 0.5)
+    out = np.full(np.shape(px), np.nan)
+    if not smooth:
+        ix = np.clip(np.rint(fx).astype(np.int64), 0, nx - 1)
+        iy = np.clip(np.rint(fy).astype(np.int64), 0, ny - 1)
+        out[inside] = field[iy[inside], ix[inside]]
+        return out
+    fx = np.clip(fx, 0, max(nx - 1, 0))
+    fy = np.clip(fy, 0, max(ny - 1, 0))
+    x0 = np.minimum(np.floor(fx).astype(np.int64), max(nx - 2, 0))
+    y0 = np.minimum(np.floor(fy).astype(np.int64), max(ny - 2, 0))
+    x1, y1 = np.minimum(x0 + 1, nx - 1), np.minimum(y0 + 1, ny - 1)
+    tx, ty = fx - x0, fy - y0
+    v = ((field[y0, x0] * (1 - tx) + field[y0, x1] * tx) * (1 - ty)
+         + (field[y1, x0] * (1 - tx) + field[y1, x1] * tx) * ty)
+    out[inside] = v[inside]
+    return out
+
+
+def _extent(gx, gy):
+    dx = gx[1] - gx[0] if len(gx) > 1 else 1.0
+    dy = gy[1] - gy[0] if len(gy) > 1 else 1.0
+    return gx[0] - dx / 2, gx[-1] + dx / 2, gy[0] - dy / 2, gy[-1] + dy / 2
+
+
+def _mercator_extent(gx, gy, projection):
+    """(x0, x1, y0, y1) in EPSG:3857 of a grid in `projection` ("mercator" or "local")."""
+    x0, x1, y0, y1 = _extent(gx, gy)
+    if projection == "mercator":
+        return x0, x1, y0, y1
+    mx, my = to_mercator(*unproject([x0, x1, x0, x1], [y0, y0, y1, y1], projection))
+    return mx.min(), mx.max(), my.min(), my.max()
+
+
+def _sample_mercator(gx, gy, field, mx, my, smooth, projection):
+    # field values at EPSG:3857 pixel centres
+    if projection != "mercator":
+        mx, my = project(*from_mercator(mx, my), projection)
+    return sample_grid(gx, gy, field, mx, my, smooth=smooth)
+
+
+def _pixel_m(z):
+    return 2 * WORLD_M / (TILE_PX * 2 ** z)
+
+
+def default_zooms(gx, gy, projection="mercator"):
+    """(min_zoom, max_zoom): the whole grid in a few tiles up to ~4 pixels per grid cell."""
+    cell = min(abs(gx[1] - gx[0]) if len(gx) > 1 else 1.0, abs(gy[1] - gy[0]) if len(gy) > 1 else 1.0)
+    x0, x1, y0, y1 = _mercator_extent(gx, gy, projection)
+    if projection != "mercator":
+        # cell size in Web Mercator units
+        lx0, lx1, _, _ = _extent(gx, gy)
+        cell *= (x1 - x0) / (lx1 - lx0)
+    max_z = int(np.clip(np.ceil(np.log2(2 * WORLD_M * 4 / (TILE_PX * cell))), 0, MAX_ZOOM))
+    span = max(x1 - x0, y1 - y0)
+    min_z = int(np.clip(np.floor(np.log2(2 * WORLD_M / span)), 0, max_z))
+    return min_z, max_z
+
+
+# ---------------------------------------------------------
+# OUTPUTS
+# ---------------------------------------------------------
+
+def write_overlay(out_dir, gx, gy, field, vmin, vmax, opacity=DEFAULT_OPACITY, smooth=False, max_px=4096,
+                  projection="mercator", filename="rssi.png"):
+    """
+    One PNG over the grid's extent; returns (path, [[south, west], [north, east]]).
+    Rendered at ~4 pixels per cell (at most max_px on a side) so cells stay square.
+    """
+    x0, x1, y0, y1 = _mercator_extent(gx, gy, projection)
+    scale = min(4, max_px / max(len(gx), len(gy), 1))
+    w = max(int(round(len(gx) * scale)), 1)
+    h = max(int(round(len(gy) * scale)), 1)
+    px = x0 + (np.arange(w) + 0.5) * (x1 - x0) / w
+    py = y1 - (np.arange(h) + 0.5) * (y1 - y0) / h    # top row first
+    img = colormap(_sample_mercator(gx, gy, field, *np.meshgrid(px, py), smooth, projection), vmin, vmax, opacity)
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, filename)
+    write_png(path, img)
+    (south, north), (west, east) = from_mercator([x0, x1], [y0, y1])
+    return path, [[south, west], [north, east]]
+
+
+def write_tiles(out_dir, gx, gy, field, vmin, vmax, zooms=None, opacity=DEFAULT_OPACITY, smooth=False,
+                projection="mercator"):
+    """XYZ tile pyramid {out_dir}/{z}/{x}/{y}.png covering the grid. Returns (min_zoom, max_zoom, n_tiles)."""
+    min_z, max_z = zooms or default_zooms(gx, gy, projection)
+    x0, x1, y0, y1 = _mercator_extent(gx, gy, projection)
+    offs = (np.arange(TILE_PX) + 0.5) / TILE_PX
+    n_tiles = 0
+    for z in range(min_z, max_z + 1):
+        tile_m = TILE_PX * _pixel_m(z)
+        n = 2 ** z
+        tx0, tx1 = int((x0 + WORLD_M) // tile_m), int((x1 + WORLD_M) // tile_m)
+        # tile rows count down from the north edge of the world
+        ty0, ty1 = int((WORLD_M - y1) // tile_m), int((WORLD_M - y0) // tile_m)
+        for tx in range(max(tx0, 0), min(tx1, n - 1) + 1):
+            px = -WORLD_M + (tx + offs) * tile_m
+            col_dir = os.path.join(out_dir, str(z), str(tx))
+            for ty in range(max(ty0, 0), min(ty1, n - 1) + 1):
+                py = WORLD_M - (ty + offs) * tile_m
+                values = _sample_mercator(gx, gy, field, *np.meshgrid(px, py), smooth, projection)
+                if np.all(np.isnan(values)):
+                    continue
+                os.makedirs(col_dir, exist_ok=True)
+                write_png(os.path.join(col_dir, f"{ty}.png"), colormap(values, vmin, vmax, opacity))
+                n_tiles += 1
+    return min_z, max_z, n_tiles
+
+
+def _add_raster_layer(m, raster_dir, rel_dir, gx, gy, field, mode, vmin, vmax, zooms, opacity, smooth, name, units,
+                      projection, show=True, filename="rssi.png"):
+    import folium
+    from branca.colormap import LinearColormap
+
+    field = np.asarray(field, dtype=np.float64)
+    if vmin is None:
+        vmin = float(np.nanmin(field))
+    if vmax is None:
+        vmax = float(np.nanmax(field))
+    if mode == "tiles":
+        min_z, max_z, n_tiles = write_tiles(raster_dir, gx, gy, field, vmin, vmax, zooms, opacity, smooth,
+                                               projection=projection)
+        print(f"Wrote {n_tiles} tiles (zoom {min_z}-{max_z}) to {raster_dir}")
+        folium.TileLayer(tiles=rel_dir + "/{z}/{x}/{y}.png", attr=name, name=name, overlay=True, control=True,
+                         show=show, min_zoom=0, max_zoom=MAX_ZOOM, min_native_zoom=min_z,
+                         max_native_zoom=max_z).add_to(m)
+    elif mode == "overlay":
+        path, bounds = write_overlay(raster_dir, gx, gy, field, vmin, vmax, opacity, smooth,
+                                     projection=projection, filename=filename)
+        print(f"Wrote image overlay {path}")
+        overlay = folium.raster_layers.ImageOverlay(image=path, bounds=bounds, name=name, pixelated=not smooth,
+                                                    show=show)
+        # reference the PNG instead of embedding it as a data URL
+        overlay.url = rel_dir + "/" + os.path.basename(path)
+        overlay.add_to(m)
+    else:
+        raise ValueError(f"unknown raster mode {mode!r} (expected 'overlay' or 'tiles')")
+
+    legend = LinearColormap([rgb for _, rgb in GRADIENT[1:]], index=[vmin + s * (vmax - vmin) for s, _ in GRADIENT[1:]],
+                            vmin=vmin, vmax=vmax, caption=f"{name} ({units})")
+    legend.add_to(m)
+
+
+def save_raster_map(gx, gy, field, out_html, mode="overlay", vmin=None, vmax=None, zooms=None, smooth=False,
+                    opacity=DEFAULT_OPACITY, center=None, satellite=False, name="RSSI", projection="mercator",
+                    units="dBm", layers=()):
+    """
+    Render the field (shape (len(gy), len(gx)) on cell-centre axes gx, gy in metres of
+    `projection`, "mercator" (EPSG:3857) or "local" (projection.to_local)) to
+    `<out_html stem>_raster/` and save a folium map at out_html that references it.
+    mode is "overlay" (one PNG) or "tiles" (XYZ pyramid).
+
+    layers adds companion layers (e.g. packet delivery next to RSSI), each a dict with
+    gx, gy, field, name and optionally vmin, vmax, units, smooth and show (whether it
+    starts switched on); they get their own raster subdirectory, legend and entry in
+    the layer control.
+    """
+    import folium
+
+    raster_dir = os.path.splitext(out_html)[0] + "_raster"
+    rel_dir = os.path.relpath(raster_dir, os.path.dirname(os.path.abspath(out_html)) or ".").replace(os.sep, "/")
+
+    if center is None:
+        lat_c, lon_c = unproject(float(np.mean(gx)), float(np.mean(gy)), projection)
+        center = (float(lat_c), float(lon_c))
+    m = folium.Map(location=list(center), zoom_start=17, max_zoom=MAX_ZOOM, tiles="OpenStreetMap", control_scale=True)
+    if satellite:
+        folium.TileLayer(
+            tiles="https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
+            attr="Esri",
+            name="Esri.WorldImagery",
+            overlay=False,
+            control=True,
+        ).add_to(m)
+
+    _add_raster_layer(m, raster_dir, rel_dir, gx, gy, field, mode, vmin, vmax, zooms, opacity, smooth, name, units,
+                      projection)
+    for k, layer in enumerate(layers, 1):
+        sub = f"layer{k}"
+        _add_raster_layer(m, os.path.join(raster_dir, sub), f"{rel_dir}/{sub}", layer["gx"], layer["gy"],
+                          layer["field"], mode, layer.get("vmin"), layer.get("vmax"), zooms, opacity,
+                          layer.get("smooth", smooth), layer["name"], layer.get("units", ""), projection,
+                          show=layer.get("show", True), filename="layer.png")
+    folium.LayerControl().add_to(m)
+    m.save(out_html)
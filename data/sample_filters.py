@@ -0,0 +1,243 @@
+"""
+Outlier and fix-quality filtering of survey samples before binning and kriging
+
+Loading used to stop at dropna, so GNSS jumps, the zero coordinates a cold receiver
+reports before its first fix and RSSI spikes all went straight into the cell means
+and the variogram fit. Each sample is tested against these filters, all vectorized:
+
+    invalid   non-finite, (0, 0) or out-of-range coordinates
+    outside   farther than max_radius_m from the base station
+    jump      a short excursion (up to max_jump_len fixes) that leaves the track and
+              comes back: both steps exceed the speed limit, the points either side
+              are within it of each other (max_speed * dt + jitter_m with timestamps,
+              max_step_m per sample without)
+    spike     RSSI more than despike_db away from the rolling median of `window`
+              samples around it
+    fix       fix type not in FIX_OK (only when the source provides fix types)
+    hacc      horizontal accuracy worse than max_hacc_m (only when provided)
+
+SampleFilter runs them as one streaming pass: feed() takes chunks of any size and
+returns the keep mask of the rows it can decide, holding back the few rows that
+still need look-ahead, so arbitrarily long captures go through in bounded memory
+and the result does not depend on the chunking. stats counts the samples each
+filter rejected (a sample can fail several) next to the totals.
+
+    keep, stats = filter_store(open_survey(path))       # chunked over the memmapped columns
+    keep, stats = filter_arrays(lat, lon, rssi, t=t)
+    print(format_stats(stats))
+
+Usage:
+    python sample_filters.py ./csv/RIH-all.csv                       # rejection counts
+    python sample_filters.py captures/walk.tcap --max-radius 800 --out walk-clean.csv
+
+Dependencies: numpy; pandas for filter_frame() and --out
+"""
+
+import argparse
+
+import numpy as np
+
+from filter_args import DESPIKE_DB, MAX_RADIUS_M, MAX_SPEED, MAX_STEP_M, add_arguments, options_from_args
+from geodesy import haversine
+from projection import BASE_LAT, BASE_LON
+
+# MAX_RADIUS_M, MAX_SPEED, MAX_STEP_M and DESPIKE_DB live in filter_args.py with their options
+JITTER_M = 5.0         # GNSS noise allowed on top of max_speed * dt
+MAX_JUMP_LEN = 4       # longest excursion (fixes) treated as a jump
+WINDOW = 9
+FIX_OK = (3, 4)        # u-blox fixType: 3D, GNSS + dead reckoning
+MAX_HACC_M = 5.0
+
+CHUNK_ROWS = 1_000_000
+
+FILTERS = ("invalid", "outside", "jump", "spike", "fix", "hacc")
+COLUMNS = ("lat", "lon", "rssi", "t", "session", "fix_type", "h_acc")
+
+
+def _rolling_median(x, window, pad_left, pad_right):
+    """Centred rolling median; NaN where the window would reach past an unpadded end."""
+    half = window // 2
+    xp = np.pad(x, (half if pad_left else 0, half if pad_right else 0), mode="edge")
+    out = np.full(len(x), np.nan)
+    if len(xp) >= window:
+        med = np.median(np.lib.stride_tricks.sliding_window_view(xp, window), axis=-1)
+        first = 0 if pad_left else half
+        out[first:first + len(med)] = med
+    return out
+
+
+class SampleFilter:
+    """Streaming filter: feed() column chunks in order, then finish(); both return keep masks."""
+
+    def __init__(self, base=(BASE_LAT, BASE_LON), max_radius_m=MAX_RADIUS_M, max_speed=MAX_SPEED,
+                 jitter_m=JITTER_M, max_step_m=MAX_STEP_M, max_jump_len=MAX_JUMP_LEN, window=WINDOW,
+                 despike_db=DESPIKE_DB, fix_ok=FIX_OK, max_hacc_m=MAX_HACC_M):
+        self.base = base
+        self.max_radius_m = max_radius_m
+        self.max_speed = max_speed
+        self.jitter_m = jitter_m
+        self.max_step_m = max_step_m
+        self.max_jump_len = max_jump_len
+        self.window = window | 1
+        self.despike_db = despike_db
+        self.fix_ok = fix_ok
+        self.max_hacc_m = max_hacc_m
+        # rows of context needed either side of a row to decide it
+        self.look = max(self.window // 2, max_jump_len + 1)
+        self._buf = None
+        self._decided = 0      # leading rows of _buf that are context only
+        self._at_start = True  # _buf starts at the first row of the stream
+        self.stats = dict.fromkeys(("samples", "kept") + FILTERS, 0)
+
+    def _limits(self, t, session, lo, hi):
+        """Allowed distance between rows lo and hi (index arrays) of the buffer."""
+        if t is None:
+            limit = self.max_step_m * (hi - lo).astype(np.float64)
+        else:
+            dt = t[hi] - t[lo]
+            with np.errstate(invalid="ignore"):
+                limit = np.where(dt >= 0, self.max_speed * dt + self.jitter_m, self.max_step_m * (hi - lo))
+        if session is not None:
+            limit = np.where(session[hi] != session[lo], np.inf, limit)
+        return limit
+
+    def _jumps(self, lat, lon, t, session):
+        n = len(lat)
+        out = np.zeros(n, dtype=bool)
+        if n < 3:
+            return out
+        idx = np.arange(n - 1)
+        step = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        breaks = np.flatnonzero(step > self._limits(t, session, idx, idx + 1))
+        if len(breaks) < 2:
+            return out
+        # an excursion leaves after row a and returns after row b: rows a+1 .. b
+        a, b = breaks[:-1], breaks[1:]
+        short = (b - a) <= self.max_jump_len
+        a, b = a[short], b[short]
+        back = haversine(lat[a], lon[a], lat[b + 1], lon[b + 1]) <= self._limits(t, session, a, b + 1)
+        a, b = a[back], b[back]
+        mark = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(mark, a + 1, 1)
+        np.add.at(mark, b + 1, -1)
+        return np.cumsum(mark[:-1]) > 0
+
+    def _flags(self, cols, at_end):
+        lat, lon, rssi = cols["lat"], cols["lon"], cols["rssi"]
+        t, session = cols.get("t"), cols.get("session")
+        flags = {}
+        with np.errstate(invalid="ignore"):
+            flags["invalid"] = (~np.isfinite(lat) | ~np.isfinite(lon) | ((lat == 0) & (lon == 0))
+                                | (np.abs(lat) > 90) | (np.abs(lon) > 180))
+            flags["outside"] = haversine(self.base[0], self.base[1], lat, lon) > self.max_radius_m
+        flags["jump"] = self._jumps(lat, lon, t, session)
+        if self.despike_db:
+            med = _rolling_median(rssi, self.window, self._at_start, at_end)
+            with np.errstate(invalid="ignore"):
+                flags["spike"] = np.abs(rssi - med) > self.despike_db
+        if cols.get("fix_type") is not None:
+            flags["fix"] = ~np.isin(cols["fix_type"], self.fix_ok)
+        if cols.get("h_acc") is not None and self.max_hacc_m is not None:
+            with np.errstate(invalid="ignore"):
+                flags["hacc"] = ~(cols["h_acc"] <= self.max_hacc_m)
+        return flags
+
+    def _decide(self, at_end):
+        n = len(self._buf["lat"])
+        end = n if at_end else n - self.look
+        if end <= self._decided:
+            return np.empty(0, dtype=bool)
+        flags = self._flags(self._buf, at_end)
+        rejected = np.zeros(end - self._decided, dtype=bool)
+        for name, flag in flags.items():
+            f = flag[self._decided:end]
+            self.stats[name] += int(f.sum())
+            rejected |= f
+        keep = ~rejected
+        self.stats["samples"] += len(keep)
+        self.stats["kept"] += int(keep.sum())
+        # keep `look` decided rows as context for the rows still to come
+        start = max(end - self.look, 0)
+        self._buf = {name: col[start:] for name, col in self._buf.items()}
+        self._decided = end - start
+        self._at_start = self._at_start and start == 0
+        return keep
+
+    def feed(self, lat, lon, rssi, t=None, session=None, fix_type=None, h_acc=None):
+        """Add a chunk of rows; returns the keep mask of the next rows that can be decided (lags by up to `look`)."""
+        chunk = {"lat": lat, "lon": lon, "rssi": rssi, "t": t, "session": session, "fix_type": fix_type,
+                 "h_acc": h_acc}
+        chunk = {name: np.asarray(col, dtype=np.float64 if name in ("lat", "lon", "rssi", "t") else None)
+                 for name, col in chunk.items() if col is not None}
+        if self._buf is None:
+            self._buf = chunk
+        else:
+            self._buf = {name: np.concatenate((self._buf[name], chunk[name])) for name in self._buf}
+        return self._decide(at_end=False)
+
+    def finish(self):
+        """Keep mask of the rows still held back."""
+        if self._buf is None:
+            return np.empty(0, dtype=bool)
+        return self._decide(at_end=True)
+
+
+def _run(filt, chunks):
+    parts = [filt.feed(**chunk) for chunk in chunks]
+    parts.append(filt.finish())
+    return np.concatenate(parts), filt.stats
+
+
+def filter_arrays(lat, lon, rssi, t=None, session=None, fix_type=None, h_acc=None, chunk_rows=CHUNK_ROWS,
+                  **options):
+    """(keep, stats) for in-memory columns (lat / lon in degrees), chunk_rows at a time."""
+    cols = {"lat": lat, "lon": lon, "rssi": rssi, "t": t, "session": session, "fix_type": fix_type, "h_acc": h_acc}
+    cols = {name: col for name, col in cols.items() if col is not None}
+    n = len(lat)
+    chunks = ({name: col[i:i + chunk_rows] for name, col in cols.items()} for i in range(0, n, chunk_rows))
+    return _run(SampleFilter(**options), chunks)
+
+
+def filter_store(store, chunk_rows=CHUNK_ROWS, **options):
+    """(keep, stats) for a SurveyStore, reading its memmapped columns chunk by chunk."""
+    lat, lon, rssi = store.column("lat"), store.column("lon"), store.column("rssi")
+    t, session = store.column("t"), store.column("session")
+
+    def chunks():
+        for i in range(0, len(store), chunk_rows):
+            s = slice(i, i + chunk_rows)
+            yield {"lat": lat[s] * 1e-7, "lon": lon[s] * 1e-7, "rssi": rssi[s], "t": t[s], "session": session[s]}
+
+    return _run(SampleFilter(**options), chunks())
+
+
+def filter_frame(df, **options):
+    """(keep, stats) for a survey DataFrame (load_survey columns; t, session, fix_type, h_acc when present)."""
+    cols = {name: df[name].to_numpy() for name in COLUMNS if name in df}
+    return filter_arrays(**cols, **options)
+
+
+def format_stats(stats):
+    rejected = ", ".join(f"{name} {stats[name]}" for name in FILTERS if stats[name])
+    return f"{stats['kept']} of {stats['samples']} samples kept" + (f" (rejected: {rejected})" if rejected else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count (and drop) outlier samples of a survey")
+    parser.add_argument("survey", help=".csv, .cap, .tcap or .survey store")
+    add_arguments(parser, switch=False)
+    parser.add_argument("--out", help="write the kept samples as CSV")
+    args = parser.parse_args()
+
+    from survey_store import open_survey
+
+    store = open_survey(args.survey)
+    keep, stats = filter_store(store, **options_from_args(args))
+    print(format_stats(stats))
+    if args.out:
+        store.to_dataframe()[keep].to_csv(args.out, index=False)
+        print(f"Saved {int(keep.sum())} samples to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
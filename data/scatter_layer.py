@@ -0,0 +1,154 @@
+"""
+Bulk scatter layer: every sample as one canvas-drawn Leaflet layer from typed arrays
+
+One folium.CircleMarker per sample means one Leaflet layer, one SVG path and one
+popup string per point; that stops being usable after a few thousand points.
+ScatterLayer sends all points in a single base64 payload (heatmap_payload.py):
+lat/lon as int32 micro-degrees, a uint8 palette index per point computed in one NumPy
+pass, and the popup fields as float32 columns. In the browser it is an L.GridLayer
+whose canvas tiles draw only the points inside them (points are sorted by longitude,
+so each tile is a binary search plus a scan), and a map click finds the nearest point
+and builds its popup on demand. 500k+ samples stay interactive.
+
+    ScatterLayer(df["lat"], df["lon"], palette_index(df["rssi"]), RED_GREEN,
+                 popup={"RSSI": (df["rssi"], "", 0), "Alt": (df["alt"], " m", 2)}).add_to(m)
+
+Dependencies: numpy, folium
+"""
+
+import numpy as np
+from folium.map import Layer
+from jinja2 import Template
+
+from heatmap_payload import COORD_DECIMALS, encode_array
+
+
+def _palette(r, g, b):
+    return [f"#{int(ri):02x}{int(gi):02x}{int(bi):02x}" for ri, gi, bi in zip(r, g, b)]
+
+
+# 256-entry red -> green ramp, as map_generator-2.py coloured its markers
+_t = np.arange(256) / 255.0
+RED_GREEN = _palette(np.rint(255 * (1 - _t)), np.rint(255 * _t), np.zeros(256))
+
+
+def palette_index(values, vmin=None, vmax=None):
+    """uint8 index into a 256-colour palette for each value (linear from vmin to vmax)."""
+    values = np.asarray(values, dtype=np.float64)
+    vmin = np.nanmin(values) if vmin is None else vmin
+    vmax = np.nanmax(values) if vmax is None else vmax
+    t = np.clip((values - vmin) / max(vmax - vmin, 1e-12), 0.0, 1.0)
+    return np.rint(np.nan_to_num(t) * 255).astype(np.uint8)
+
+
+class ScatterLayer(Layer):
+    """
+    All points as one canvas GridLayer. colors is a uint8 palette index per point into
+    `palette` (list of CSS colours); popup maps a label to (values, suffix, decimals).
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function() {
+                function decode(b64, Typed) {
+                    var s = atob(b64), bytes = new Uint8Array(s.length);
+                    for (var i = 0; i < s.length; i++) { bytes[i] = s.charCodeAt(i); }
+                    return new Typed(bytes.buffer);
+                }
+                var lat = decode({{ this.payload.lat|tojson }}, Int32Array),
+                    lon = decode({{ this.payload.lon|tojson }}, Int32Array),
+                    color = decode({{ this.payload.color|tojson }}, Uint8Array),
+                    palette = {{ this.palette|tojson }},
+                    scale = {{ this.payload.scale|tojson }},
+                    opts = {{ this.options|tojson }},
+                    n = lat.length,
+                    X = new Float64Array(n), Y = new Float64Array(n),
+                    fields = [];
+                {% for f in this.payload.popup %}
+                fields.push({label: {{ f.label|tojson }}, suffix: {{ f.suffix|tojson }}, decimals: {{ f.decimals }},
+                             values: decode({{ f.data|tojson }}, Float32Array)});
+                {% endfor %}
+                // Web Mercator in world units (0..1); points arrive sorted by longitude, so X ascends
+                for (var i = 0; i < n; i++) {
+                    var s = Math.sin(lat[i] * scale * Math.PI / 180);
+                    X[i] = (lon[i] * scale + 180) / 360;
+                    Y[i] = 0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI);
+                }
+                function lowerBound(v) {
+                    var lo = 0, hi = n;
+                    while (lo < hi) { var mid = (lo + hi) >> 1; if (X[mid] < v) { lo = mid + 1; } else { hi = mid; } }
+                    return lo;
+                }
+                var r = opts.radius;
+                var layer = L.GridLayer.extend({
+                    createTile: function(coords) {
+                        var tile = L.DomUtil.create("canvas", "leaflet-tile"), size = this.getTileSize();
+                        tile.width = size.x; tile.height = size.y;
+                        var ctx = tile.getContext("2d"), world = size.x * Math.pow(2, coords.z),
+                            x0 = coords.x * size.x, y0 = coords.y * size.y;
+                        ctx.globalAlpha = opts.fillOpacity;
+                        for (var i = lowerBound((x0 - r) / world); i < n && X[i] * world <= x0 + size.x + r; i++) {
+                            var py = Y[i] * world - y0;
+                            if (py < -r || py > size.y + r) { continue; }
+                            ctx.fillStyle = palette[color[i]];
+                            ctx.beginPath();
+                            ctx.arc(X[i] * world - x0, py, r, 0, 2 * Math.PI);
+                            ctx.fill();
+                        }
+                        return tile;
+                    }
+                });
+                var scatter = new layer({maxZoom: 22, pane: "overlayPane"});
+                if (fields.length) {
+                    scatter.on("add", function() {
+                        var map = this._map;
+                        this._onClick = function(e) {
+                            var world = 256 * Math.pow(2, map.getZoom()), p = map.project(e.latlng, map.getZoom()),
+                                best = -1, bestD = (r + 2) * (r + 2);
+                            for (var i = lowerBound((p.x - r - 2) / world); i < n && X[i] * world <= p.x + r + 2; i++) {
+                                var dx = X[i] * world - p.x, dy = Y[i] * world - p.y, d = dx * dx + dy * dy;
+                                if (d <= bestD) { best = i; bestD = d; }
+                            }
+                            if (best < 0) { return; }
+                            var html = fields.map(function(f) {
+                                return f.label + ": " + f.values[best].toFixed(f.decimals) + f.suffix;
+                            }).join("<br>");
+                            L.popup().setLatLng([lat[best] * scale, lon[best] * scale]).setContent(html).openOn(map);
+                        };
+                        map.on("click", this._onClick);
+                    });
+                    scatter.on("remove", function(e) { e.target._map.off("click", this._onClick); });
+                }
+                return scatter;
+            })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, lats, lons, colors, palette=RED_GREEN, popup=None, radius=5, fill_opacity=0.8,
+                 name=None, overlay=True, control=True, show=True, decimals=COORD_DECIMALS):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "ScatterLayer"
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        keep = ~(np.isnan(lats) | np.isnan(lons))
+        # sorted by longitude so a tile's points are one contiguous run
+        order = np.flatnonzero(keep)[np.argsort(lons[keep], kind="stable")]
+        scale = 10.0 ** decimals
+        self.payload = {
+            "scale": 1.0 / scale,
+            "lat": encode_array(np.rint(lats[order] * scale), "<i4"),
+            "lon": encode_array(np.rint(lons[order] * scale), "<i4"),
+            "color": encode_array(np.asarray(colors)[order], "u1"),
+            "popup": [{"label": label, "suffix": suffix, "decimals": int(dec),
+                       "data": encode_array(np.asarray(values, dtype=np.float64)[order], "<f4")}
+                      for label, (values, suffix, dec) in (popup or {}).items()],
+        }
+        self.palette = list(palette)
+        self.options = {"radius": float(radius), "fillOpacity": float(fill_opacity)}
+        self._bounds = ([[float(lats[keep].min()), float(lons[keep].min())],
+                         [float(lats[keep].max()), float(lons[keep].max())]] if keep.any() else [[None, None], [None, None]])
+
+    def _get_self_bounds(self):
+        return self._bounds
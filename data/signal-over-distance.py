@@ -1,7 +1,8 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from math import radians, sin, cos, sqrt, atan2
+from survey_store import load_survey
+from geodesy import bearing, haversine
+from pathloss import PathLoss, format_fit
 
 # ---------------------------------------------------------
 # USER SETTINGS
@@ -12,37 +13,35 @@ csv_file = "./csv/RIH-all.csv"
 BASE_LAT = 53.268339893585555    # <-- update these
 BASE_LON = -0.5298533178776605     # <-- update these
 
-# ---------------------------------------------------------
-# FUNCTIONS
-# ---------------------------------------------------------
-
-# Haversine distance in meters
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000  # Earth radius in meters
-    phi1, phi2 = radians(lat1), radians(lat2)
-    dphi = radians(lat2 - lat1)
-    dlambda = radians(lon2 - lon1)
-
-    a = sin(dphi/2)**2 + cos(phi1) * cos(phi2) * sin(dlambda/2)**2
-    return 2 * R * atan2(sqrt(a), sqrt(1-a))
-
 # ---------------------------------------------------------
 # LOAD DATA
 # ---------------------------------------------------------
 # Assumes columns: RSSI, lat, lon, alt, heading  (like your earlier sample)
-df = pd.read_csv(csv_file, header=None, names=["rssi","lat","lon","alt","heading"])
+df = load_survey(csv_file)   # binary sidecar store, built on first run
 
 # ---------------------------------------------------------
 # COMPUTE DISTANCE FROM BASE
 # ---------------------------------------------------------
-df["distance_m"] = df.apply(lambda row: 
-    haversine(BASE_LAT, BASE_LON, row["lat"], row["lon"]), axis=1)
+df["distance_m"] = haversine(BASE_LAT, BASE_LON, df["lat"].values, df["lon"].values)
+
+# ---------------------------------------------------------
+# FIT LOG-DISTANCE PATH LOSS (see pathloss.py for per-sector fits)
+# ---------------------------------------------------------
+fit = PathLoss(lat0=BASE_LAT, lon0=BASE_LON)
+fit.update(df["distance_m"].values, bearing(BASE_LAT, BASE_LON, df["lat"].values, df["lon"].values), df["rssi"].values)
+model = fit.result(total=True)
+print(f"Path loss: {format_fit(model)}")
 
 # ---------------------------------------------------------
 # PLOT: Signal Strength vs Distance
 # ---------------------------------------------------------
 plt.figure(figsize=(10,6))
 plt.scatter(df["distance_m"], df["rssi"], s=12)
+if np.isfinite(model["p0"]):
+    d = np.linspace(max(fit.min_distance, df["distance_m"].min()), df["distance_m"].max(), 200)
+    plt.plot(d, fit.predict(d), "r", lw=2,
+             label=f"RSSI = {model['p0']:.1f} - 10 x {model['exponent']:.2f} x log10(d)")
+    plt.legend()
 plt.xlabel("Distance from base station (meters)")
 plt.ylabel("Signal Strength (RSSI)")
 plt.title("RSSI vs Distance from Base Station")
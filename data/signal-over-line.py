@@ -1,7 +1,8 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from math import radians, sin, cos, sqrt, atan2, degrees
+from survey_store import load_survey
+from geodesy import haversine, bearing, angle_diff
+from spatial_index import SpatialIndex
 
 # ---------------------------------------------------------
 # USER SETTINGS
@@ -17,70 +18,57 @@ BASE_LON = -0.5298533178776605     # <-- update these
 TARGET_HEADING = 180       # degrees (0=north, 90=east)
 HEADING_TOLERANCE = 2     # degrees each side
 
-# ---------------------------------------------------------
-# FUNCTIONS
-# ---------------------------------------------------------
-
-# Haversine distance in meters
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000  # meters
-    phi1, phi2 = radians(lat1), radians(lat2)
-    dphi = radians(lat2 - lat1)
-    dlambda = radians(lon2 - lon1)
-
-    a = sin(dphi/2)**2 + cos(phi1) * cos(phi2) * sin(dlambda/2)**2
-    return 2 * R * atan2(sqrt(a), sqrt(1-a))
-
-# Bearing from base station to a point
-def bearing(lat1, lon1, lat2, lon2):
-    phi1, phi2 = radians(lat1), radians(lat2)
-    dlon = radians(lon2 - lon1)
-
-    x = sin(dlon) * cos(phi2)
-    y = cos(phi1)*sin(phi2) - sin(phi1)*cos(phi2)*cos(dlon)
-
-    brng = atan2(x, y)
-    brng = (degrees(brng) + 360) % 360
-    return brng
+# Slice along an arbitrary path instead: (lat, lon) waypoints, None = radial slice above
+PATH = None                # e.g. [(BASE_LAT, BASE_LON), (53.2650, -0.5301), (53.2641, -0.5330)]
+CORRIDOR_HALF_WIDTH = 3.0  # metres each side of the path
 
 # ---------------------------------------------------------
 # LOAD DATA
 # ---------------------------------------------------------
 
-df = pd.read_csv(csv_file, header=None, names=["rssi", "lat", "lon", "alt", "heading"])
+df = load_survey(csv_file)   # binary sidecar store, built on first run
 
 # ---------------------------------------------------------
 # COMPUTE DISTANCE & BEARING FROM BASE
 # ---------------------------------------------------------
 
-df["distance_m"] = df.apply(lambda row:
-    haversine(BASE_LAT, BASE_LON, row["lat"], row["lon"]), axis=1)
+df["distance_m"] = haversine(BASE_LAT, BASE_LON, df["lat"].values, df["lon"].values)
 
-df["bearing_deg"] = df.apply(lambda row:
-    bearing(BASE_LAT, BASE_LON, row["lat"], row["lon"]), axis=1)
+df["bearing_deg"] = bearing(BASE_LAT, BASE_LON, df["lat"].values, df["lon"].values)
 
-# ---------------------------------------------------------
-# FILTER POINTS ALONG THE DESIRED HEADING
-# ---------------------------------------------------------
+if PATH is None:
+    # ---------------------------------------------------------
+    # FILTER POINTS ALONG THE DESIRED HEADING
+    # ---------------------------------------------------------
 
-def angle_diff(a, b):
-    d = abs(a - b) % 360
-    return min(d, 360 - d)
+    df_slice = df[angle_diff(df["bearing_deg"].values, TARGET_HEADING) <= HEADING_TOLERANCE]
+    x_label = "Distance from base (m)"
+    title = f"RSSI vs Distance Along {TARGET_HEADING}° ± {HEADING_TOLERANCE}°"
+    x_col = "distance_m"
+else:
+    # ---------------------------------------------------------
+    # FILTER POINTS IN A CORRIDOR AROUND THE PATH (spatial index, no full scan)
+    # ---------------------------------------------------------
 
-df_slice = df[df["bearing_deg"].apply(lambda b:
-    angle_diff(b, TARGET_HEADING) <= HEADING_TOLERANCE)]
+    index = SpatialIndex.from_latlon(df["lat"].values, df["lon"].values)
+    path_lat, path_lon = np.array(PATH).T
+    idx, along, offset = index.corridor(*index.project(path_lat, path_lon), CORRIDOR_HALF_WIDTH)
+    df_slice = df.iloc[idx].assign(along_m=along, offset_m=offset)
+    x_label = "Distance along path (m)"
+    title = f"RSSI Along {len(PATH)}-Point Path ± {CORRIDOR_HALF_WIDTH} m"
+    x_col = "along_m"
 
 # ---------------------------------------------------------
 # PLOT SLICE
 # ---------------------------------------------------------
 
 plt.figure(figsize=(10,6))
-plt.scatter(df_slice["distance_m"], df_slice["rssi"], s=15)
-plt.xlabel("Distance from base (m)")
+plt.scatter(df_slice[x_col], df_slice["rssi"], s=15)
+plt.xlabel(x_label)
 plt.ylabel("Signal Strength (RSSI)")
-plt.title(f"RSSI vs Distance Along {TARGET_HEADING}° ± {HEADING_TOLERANCE}°")
+plt.title(title)
 plt.grid(True)
 plt.show()
 
 # If you want to print number of points found:
-print(f"Points in radial slice: {len(df_slice)}")
+print(f"Points in slice: {len(df_slice)}")
@@ -0,0 +1,187 @@
+"""
+Stage spans: wall time, CPU time and RSS per pipeline stage, as JSON lines or a Chrome trace
+
+    import spans
+    spans.enable("run.jsonl", trace="run.trace.json")   # or spans.enable_from_args(args)
+    with spans.span("variogram", n=len(vals)) as s:
+        ...
+        s.set(model="Exponential")                     # attributes known only at the end
+
+Every span, when it closes, writes one JSON line:
+
+    {"name": "krige", "parent": null, "depth": 0, "start_s": 0.41, "wall_s": 12.3,
+     "cpu_s": 12.1, "rss_mb": 310.2, "peak_rss_mb": 402.7, "peak_growth_mb": 88.0, ...attrs}
+
+rss_mb is the resident set when the span ended, peak_rss_mb the process high-water mark
+so far and peak_growth_mb how much this span raised it. Spans nest (parent / depth
+follow the `with` blocks). With a trace path, all spans are also written at exit as a
+Chrome trace-event file (open in chrome://tracing or ui.perfetto.dev).
+
+Disabled, which is the default, span() hands back one shared no-op context manager,
+so instrumented code pays a function call and a global lookup per stage. Spans are
+per process: work done inside pool workers shows up as its parent's span.
+
+Dependencies: none (peak RSS via the resource module where it exists)
+"""
+
+import atexit
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_recorder = None
+
+
+def _rss_mb():
+    """Current resident set in MiB (Linux /proc), else None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class Span:
+    """One timed stage; use through span()."""
+
+    def __init__(self, recorder, name, attrs):
+        self.recorder = recorder
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.recorder.stack
+        self.parent = stack[-1].name if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+        self.peak0 = _peak_rss_mb()
+        self.cpu0 = time.process_time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.t0
+        cpu = time.process_time() - self.cpu0
+        self.recorder.stack.pop()
+        peak = _peak_rss_mb()
+        record = {
+            "name": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "start_s": round(self.t0 - self.recorder.t0, 6),
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rss_mb": _rss_mb(),
+            "peak_rss_mb": peak,
+            "peak_growth_mb": None if peak is None else peak - self.peak0,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        record.update(self.attrs)
+        self.recorder.emit(record)
+        return False
+
+
+class Recorder:
+    """Destination of finished spans: a JSON-lines stream and/or Chrome trace events."""
+
+    def __init__(self, jsonl=None, trace=None):
+        self.t0 = time.perf_counter()
+        self.stack = []
+        self.trace = trace
+        self.events = []
+        if jsonl == "-":
+            self.out, self._close = sys.stderr, False
+        elif jsonl:
+            self.out, self._close = open(jsonl, "a", buffering=1), True
+        else:
+            self.out, self._close = None, False
+
+    def emit(self, record):
+        if self.out is not None:
+            # one flushed line per span, so a killed run still shows how far it got
+            self.out.write(json.dumps(record, default=str) + "\n")
+        if self.trace:
+            args = {k: v for k, v in record.items() if k not in ("name", "start_s", "wall_s")}
+            self.events.append({"name": record["name"], "cat": "stage", "ph": "X", "pid": os.getpid(), "tid": 0,
+                                "ts": record["start_s"] * 1e6, "dur": record["wall_s"] * 1e6, "args": args})
+
+    def close(self):
+        if self.trace:
+            with open(self.trace, "w") as f:
+                json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f, default=str)
+        if self._close:
+            self.out.close()
+
+
+def enable(jsonl=None, trace=None):
+    """Start recording spans to jsonl (a path, or "-" for stderr) and/or a Chrome trace written at exit."""
+    global _recorder
+    disable()
+    _recorder = Recorder(jsonl, trace)
+    atexit.register(disable)
+    return _recorder
+
+
+def disable():
+    """Stop recording; writes the Chrome trace if one was requested."""
+    global _recorder
+    if _recorder is not None:
+        recorder, _recorder = _recorder, None
+        recorder.close()
+
+
+def enabled():
+    return _recorder is not None
+
+
+def span(name, **attrs):
+    """Context manager timing one stage; a shared no-op while spans are disabled."""
+    if _recorder is None:
+        return _NULL
+    return Span(_recorder, name, attrs)
+
+
+def add_arguments(parser):
+    parser.add_argument("--profile", metavar="JSONL", default=None,
+                        help="record per-stage wall / CPU time and RSS as JSON lines to this file ('-' = stderr)")
+    parser.add_argument("--trace", metavar="JSON", default=None,
+                        help="also write the stages as a Chrome trace (chrome://tracing, ui.perfetto.dev)")
+
+
+def enable_from_args(args):
+    if args.profile or args.trace:
+        enable(args.profile, args.trace)
@@ -0,0 +1,132 @@
+"""
+Spatial index over survey samples: batch k-nearest, radius and polyline-corridor queries
+
+A KD-tree (scipy cKDTree, as in local_kriging.py) over projected sample positions.
+from_latlon() projects onto the local tangent plane around the survey
+(projection.to_local), so radii and corridor widths are true metres (Web Mercator
+would stretch them ~1.67x at 53N).
+
+Corridor queries only look at samples near the path: each segment is covered by
+balls spaced along it, the candidates are tested exactly against the segment, and
+each hit gets its distance along the path (chainage) and signed offset from it.
+Cost grows with the corridor's area, not the dataset size.
+
+    index = SpatialIndex.from_latlon(df["lat"].values, df["lon"].values)
+    dist, idx = index.nearest(*index.project(lat, lon), k=8)
+    idx = index.within(*index.project(BASE_LAT, BASE_LON), 25.0)
+    idx, along, offset = index.corridor(*index.project(path_lat, path_lon), half_width=3.0)
+
+Dependencies: numpy, scipy
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from projection import to_local
+
+# candidate segments x samples processed at once in corridor()
+MAX_BATCH_FLOATS = 2 ** 22
+
+
+class SpatialIndex:
+    """KD-tree over (x, y) in metres; all queries return indices into the original arrays."""
+
+    def __init__(self, x, y, transform=None):
+        self.xy = np.column_stack((np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)))
+        self.tree = cKDTree(self.xy)
+        self._transform = transform
+
+    @classmethod
+    def from_latlon(cls, lat, lon, lat0=None, lon0=None):
+        """Index lat/lon samples in true metres on the tangent plane at (lat0, lon0), default the median."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if lat0 is None:
+            lat0 = float(np.median(lat)) if len(lat) else 0.0
+        if lon0 is None:
+            lon0 = float(np.median(lon)) if len(lon) else 0.0
+
+        def transform(qlat, qlon):
+            return to_local(qlat, qlon, lat0, lon0)
+
+        return cls(*transform(lat, lon), transform=transform)
+
+    def __len__(self):
+        return len(self.xy)
+
+    def project(self, lat, lon):
+        """Query coordinates for lat/lon in the index's space (from_latlon indexes only)."""
+        if self._transform is None:
+            raise ValueError("index was built from x/y; project queries yourself")
+        return self._transform(lat, lon)
+
+    def nearest(self, qx, qy, k=1, max_dist=np.inf):
+        """(dist, idx) of the k nearest samples to each query point; shape (m,) for k=1 else (m, k)."""
+        q = np.column_stack((np.atleast_1d(qx), np.atleast_1d(qy)))
+        return self.tree.query(q, k=k, distance_upper_bound=max_dist)
+
+    def within(self, qx, qy, radius):
+        """
+        Samples within radius of each query point: one sorted index array for a scalar
+        query, otherwise a list of them.
+        """
+        if np.ndim(qx) == 0:
+            return np.sort(np.asarray(self.tree.query_ball_point([qx, qy], radius), dtype=np.int64))
+        hits = self.tree.query_ball_point(np.column_stack((qx, qy)), radius)
+        return [np.sort(np.asarray(h, dtype=np.int64)) for h in hits]
+
+    def count_within(self, qx, qy, radius):
+        return self.tree.query_ball_point(np.column_stack((np.atleast_1d(qx), np.atleast_1d(qy))), radius,
+                                          return_length=True)
+
+    def corridor(self, path_x, path_y, half_width):
+        """
+        Samples within half_width of the polyline (path_x, path_y). Returns (idx, along,
+        offset), sorted by along: distance along the path of each sample's closest point
+        on it, and signed distance from the path (positive = left of travel direction).
+        """
+        px = np.asarray(path_x, dtype=np.float64)
+        py = np.asarray(path_y, dtype=np.float64)
+        if len(px) < 2:
+            raise ValueError("a corridor path needs at least two points")
+        if not half_width > 0:
+            raise ValueError(f"corridor half_width must be > 0 (got {half_width!r})")
+        ax, ay = px[:-1], py[:-1]
+        dx, dy = np.diff(px), np.diff(py)
+        seg_len = np.hypot(dx, dy)
+        chain = np.concatenate(([0.0], np.cumsum(seg_len)))
+
+        # cover every segment with balls half_width apart: radius sqrt(2) * half_width reaches the corridor edges
+        centers = []
+        for i in range(len(seg_len)):
+            n = max(int(np.ceil(seg_len[i] / half_width)), 1)
+            t = np.arange(n + 1) / n
+            centers.append(np.column_stack((ax[i] + t * dx[i], ay[i] + t * dy[i])))
+        hits = self.tree.query_ball_point(np.concatenate(centers), np.sqrt(2.0) * half_width)
+        cand = np.unique(np.concatenate([np.asarray(h, dtype=np.int64) for h in hits] + [np.empty(0, np.int64)]))
+        if len(cand) == 0:
+            return cand, np.empty(0), np.empty(0)
+
+        best_d = np.full(len(cand), np.inf)
+        best_along = np.zeros(len(cand))
+        best_off = np.zeros(len(cand))
+        batch = max(MAX_BATCH_FLOATS // len(seg_len), 1)
+        safe_len2 = np.maximum(seg_len ** 2, 1e-300)
+        for s in range(0, len(cand), batch):
+            q = self.xy[cand[s:s + batch]]
+            rx = q[:, 0, None] - ax            # (m, segments)
+            ry = q[:, 1, None] - ay
+            t = np.clip((rx * dx + ry * dy) / safe_len2, 0.0, 1.0)
+            ex, ey = rx - t * dx, ry - t * dy
+            d = np.hypot(ex, ey)
+            j = np.argmin(d, axis=1)
+            rows = np.arange(len(q))
+            best_d[s:s + batch] = d[rows, j]
+            best_along[s:s + batch] = chain[j] + t[rows, j] * seg_len[j]
+            cross = dx[j] * ry[rows, j] - dy[j] * rx[rows, j]
+            best_off[s:s + batch] = np.where(cross < 0, -1.0, 1.0) * d[rows, j]
+
+        keep = best_d <= half_width
+        idx, along, offset = cand[keep], best_along[keep], best_off[keep]
+        order = np.argsort(along, kind="stable")
+        return idx[order], along[order], offset[order]
@@ -0,0 +1,429 @@
+"""
+One command line for the survey tools: convert, bin, krige, slice, plot and map
+
+Every analysis used to be its own script with hard-coded paths and eager imports, so
+even printing a point count paid for matplotlib, scipy, folium and pyproj. Here the
+module itself only imports the standard library; each command imports what it needs
+inside its handler (info on a built store reads meta.json and never loads NumPy).
+Cold `--help` and `info` stay well under 100 ms, so the CLI can sit in batch loops.
+
+Usage:
+    python survey.py info ./csv/RIH-all.csv                       # samples / sessions (meta only)
+    python survey.py info ./csv/RIH-all.csv --stats               # + RSSI range and extent
+    python survey.py convert captures/*.cap --out-dir csv         # captures -> corrected CSV
+    python survey.py convert ./csv/a.csv ./csv/b.csv --store ./csv/RIH-all.survey
+    python survey.py bin ./csv/RIH-all.csv --cell 5 10 --out cells-{cell}m.csv
+    python survey.py bin captures/walk.tcap --cell 5 --collapse-dwell 0.3   # one sample per stop
+    python survey.py krige --csv ./csv/RIH-all.csv --grid 5 --mode local   # heatmap_gstools.py options
+    python survey.py slice ./csv/RIH-all.csv --heading 180 --tolerance 2 --out slice.csv
+    python survey.py slice ./csv/RIH-all.csv --path 53.2683,-0.5298 53.2650,-0.5301 --half-width 3
+    python survey.py plot distance ./csv/RIH-all.csv --save distance.png
+    python survey.py plot compass ./csv/RIH-all.csv --step 5 --smooth median --window 10
+    python survey.py map ./csv/RIH-all.csv --kind scatter --out gps_signal_map.html
+    python survey.py map ./csv/RIH-all.csv --kind cells --cell 5 --render tiles
+
+Inputs are anything load_survey() accepts: a .csv, a raw or timed capture (.cap/.tcap)
+or a .survey store. bin and map take --collapse-dwell to merge runs of samples at one
+position (the rover standing still) into one before binning (dwell.py), after the
+outlier filter (sample_filters.py; thresholds via --max-radius, --max-step, --despike,
+off with --no-filter).
+--timings (before the command) prints startup, run time and which heavy modules the
+command pulled in to stderr.
+
+Dependencies, imported per command: numpy (all but plain info), pandas (converting
+CSV sources), scipy (plot compass --smooth savgol), matplotlib (plot, slice --plot), folium + pyproj
+(map), gstools (krige)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import filter_args
+
+T_START = time.perf_counter()
+
+BASE_LAT = 53.268339893585555
+BASE_LON = -0.5298533178776605
+
+# reported by --timings when a command imported them
+HEAVY_MODULES = ("numpy", "pandas", "scipy", "matplotlib", "folium", "pyproj", "gstools")
+
+
+# ---------------------------------------------------------
+# HELPERS
+# ---------------------------------------------------------
+
+def _store_meta(path):
+    """meta.json of a store, or of a .csv/.cap's sidecar store if it is up to date; else None."""
+    meta_path = os.path.join(path if os.path.isdir(path) else path + ".survey", "meta.json")
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.isdir(path):
+        # same freshness test as survey_store._is_fresh, without importing NumPy
+        st = os.stat(path)
+        stamp = {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        if len(meta.get("sessions", [])) != 1 or meta["sessions"][0]["source"] != stamp:
+            return None
+    return meta
+
+
+def _latlon(path, collapse_dwell=None, filter_options=None):
+    """
+    (store, lat, lon, rssi) as float64 arrays straight from the store columns (no pandas).
+    filter_options (SampleFilter keywords) drops outliers first (sample_filters.py), then
+    collapse_dwell (a tolerance in metres, 0 for exact repeats) merges stationary runs (dwell.py).
+    """
+    import numpy as np
+    from survey_store import open_survey
+
+    store = open_survey(path)
+    lat, lon, rssi = store.lat, store.lon, store.column("rssi").astype(np.float64)
+    keep = None
+    if filter_options is not None:
+        from sample_filters import filter_store, format_stats
+
+        keep, stats = filter_store(store, **filter_options)
+        print(f"Outlier filter: {format_stats(stats)}", file=sys.stderr)
+        lat, lon, rssi = lat[keep], lon[keep], rssi[keep]
+    if collapse_dwell is not None:
+        from dwell import collapse, timestamps
+
+        t, itow, session = store.column("t"), store.column("itow"), store.column("session")
+        if keep is not None:
+            t, itow, session = t[keep], itow[keep], session[keep]
+        runs = collapse(lat, lon, rssi, t=timestamps(t, itow), tolerance_m=collapse_dwell, session=session)
+        print(f"Collapsed {len(lat)} samples into {len(runs['weight'])} dwell runs", file=sys.stderr)
+        lat, lon, rssi = runs["lat"], runs["lon"], runs["rssi"]
+    return store, lat, lon, rssi
+
+
+def _parse_point(text):
+    lat, lon = (float(v) for v in text.split(","))
+    return lat, lon
+
+
+def _show_or_save(fig, save):
+    import matplotlib.pyplot as plt
+
+    if save:
+        fig.savefig(save, dpi=150)
+        print(f"Saved plot to {save}")
+    else:
+        plt.show()
+
+
+def _pyplot(save):
+    import matplotlib
+
+    if save:
+        # no display needed when only writing a file
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+# ---------------------------------------------------------
+# COMMANDS
+# ---------------------------------------------------------
+
+def cmd_info(args):
+    meta = _store_meta(args.survey)
+    if meta is None:
+        from survey_store import open_survey
+
+        meta = open_survey(args.survey).meta
+    print(f"{args.survey}: {meta['n']} samples in {len(meta['sessions'])} session(s)")
+    for i, s in enumerate(meta["sessions"]):
+        print(f"  [{i}] {s['name']}: {s['n']} samples")
+    if args.stats and meta["n"]:
+        import numpy as np
+        from geodesy import haversine
+
+        _, lat, lon, rssi = _latlon(args.survey)
+        print(f"  rssi {rssi.min():.0f} .. {rssi.max():.0f} dBm (mean {rssi.mean():.1f})")
+        print(f"  lat {lat.min():.7f} .. {lat.max():.7f}, lon {lon.min():.7f} .. {lon.max():.7f}")
+        print(f"  max distance from base {np.max(haversine(BASE_LAT, BASE_LON, lat, lon)):.1f} m")
+
+
+def cmd_convert(args):
+    if args.store:
+        from survey_store import write_store
+
+        store = write_store(args.store, args.inputs)
+        print(f"{store.path}: {len(store)} samples in {len(store.sessions)} session(s)")
+        return
+    from capture_io import convert_capture
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+    for path in args.inputs:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        out = os.path.join(args.out_dir if args.out_dir else os.path.dirname(path), stem + ".csv")
+        t0 = time.perf_counter()
+        n = convert_capture(path, out)
+        print(f"{path}: {n} records -> {out} ({time.perf_counter() - t0:.2f}s)")
+
+
+def cmd_bin(args):
+    import numpy as np
+    from grid_bins import bin_levels, level_table
+    from projection import project, unproject
+
+    if args.cells:
+        from cell_store import CellStore
+
+        store = CellStore(args.cells)
+        levels = store.levels(args.cell)
+        projection = "mercator"
+    else:
+        _, lat, lon, rssi = _latlon(args.survey, args.collapse_dwell, filter_args.options_from_args(args))
+        projection = args.projection
+        x, y = project(lat, lon, projection)
+        levels = bin_levels(x, y, rssi, args.cell)
+
+    header = "lat,lon,count,mean,var,min,max"
+    for cell in args.cell:
+        cells = level_table(levels[cell], min_count=args.min_count)
+        clat, clon = unproject(cells["x"], cells["y"], projection)
+        print(f"{cell:g} m: {len(cells['count'])} cells with >= {args.min_count} samples")
+        if args.out:
+            out = args.out.format(cell=f"{cell:g}".replace(".", "-"))
+            table = np.column_stack((clat, clon, cells["count"], cells["mean"], cells["var"], cells["min"], cells["max"]))
+            np.savetxt(out, table, delimiter=",", header=header, comments="",
+                       fmt=["%.7f", "%.7f", "%d", "%.2f", "%.2f", "%.0f", "%.0f"])
+            print(f"  -> {out}")
+
+
+def cmd_krige(args):
+    from heatmap_gstools import main as krige_main
+
+    krige_main(args.rest, prog="survey.py krige")
+
+
+def _slice(args):
+    """(x, rssi, x column, x_label, title) of the radial or corridor slice the arguments ask for."""
+    import numpy as np
+    from geodesy import angle_diff, bearing, haversine
+
+    _, lat, lon, rssi = _latlon(args.survey)
+    if not args.path:
+        dist = haversine(BASE_LAT, BASE_LON, lat, lon)
+        keep = angle_diff(bearing(BASE_LAT, BASE_LON, lat, lon), args.heading) <= args.tolerance
+        order = np.argsort(dist[keep], kind="stable")
+        return (dist[keep][order], rssi[keep][order], "distance_m", "Distance from base (m)",
+                f"RSSI vs Distance Along {args.heading:g}° ± {args.tolerance:g}°")
+
+    from spatial_index import SpatialIndex
+
+    index = SpatialIndex.from_latlon(lat, lon)
+    path_lat, path_lon = np.array([_parse_point(p) for p in args.path]).T
+    idx, along, _ = index.corridor(*index.project(path_lat, path_lon), args.half_width)
+    return (along, rssi[idx], "along_m", "Distance along path (m)",
+            f"RSSI Along {len(args.path)}-Point Path ± {args.half_width:g} m")
+
+
+def cmd_slice(args):
+    import numpy as np
+
+    x, rssi, x_col, x_label, title = _slice(args)
+    print(f"Points in slice: {len(x)}")
+    if args.out:
+        np.savetxt(args.out, np.column_stack((x, rssi)), delimiter=",", fmt=["%.3f", "%.0f"],
+                   header=f"{x_col},rssi", comments="")
+        print(f"Saved slice to {args.out}")
+    if args.plot or args.save:
+        plt = _pyplot(args.save)
+        fig = plt.figure(figsize=(10, 6))
+        plt.scatter(x, rssi, s=15)
+        plt.xlabel(x_label)
+        plt.ylabel("Signal Strength (RSSI)")
+        plt.title(title)
+        plt.grid(True)
+        _show_or_save(fig, args.save)
+
+
+def cmd_plot(args):
+    from geodesy import haversine
+
+    plt = _pyplot(args.save)
+    _, lat, lon, rssi = _latlon(args.survey)
+    dist = haversine(BASE_LAT, BASE_LON, lat, lon)
+
+    if args.kind == "distance":
+        fig = plt.figure(figsize=(10, 6))
+        plt.scatter(dist, rssi, s=12)
+        plt.xlabel("Distance from base station (meters)")
+        plt.ylabel("Signal Strength (RSSI)")
+        plt.title("RSSI vs Distance from Base Station")
+        plt.grid(True)
+        _show_or_save(fig, args.save)
+        return
+
+    # compass: (bearing x distance) matrix of smoothed radial profiles (as signal-over-compass.py)
+    import numpy as np
+    from geodesy import bearing
+    from radial_profiles import polar_heatmap, radial_profiles, smooth
+
+    prof = radial_profiles(bearing(BASE_LAT, BASE_LON, lat, lon), dist, rssi, args.step, args.half_width,
+                           bin_m=args.bin)
+    grid = smooth(prof, args.smooth, args.window)
+    if args.out:
+        mids = (prof["edges"][:-1] + prof["edges"][1:]) / 2
+        np.savetxt(args.out, np.column_stack((prof["centers"], grid)), delimiter=",", fmt="%.2f", comments="",
+                   header="bearing_deg," + ",".join(f"{d:g}" for d in mids))
+        print(f"Saved {grid.shape[0]} x {grid.shape[1]} RSSI matrix to {args.out}")
+    fig = plt.figure(figsize=(10, 10))
+    ax = fig.add_subplot(111, projection="polar")
+    mesh = polar_heatmap(ax, prof, grid)
+    fig.colorbar(mesh, ax=ax, label="RSSI (dBm)", shrink=0.8)
+    ax.set_title(f"Radial RSSI Profiles (Every {args.step:g}°, {args.bin:g} m bins, {args.smooth})")
+    plt.tight_layout()
+    _show_or_save(fig, args.save)
+
+
+def cmd_map(args):
+    import folium
+
+    _, lat, lon, rssi = _latlon(args.survey, args.collapse_dwell, filter_args.options_from_args(args))
+    if args.kind == "scatter":
+        from scatter_layer import RED_GREEN, ScatterLayer, palette_index
+
+        m = folium.Map(location=[float(lat.mean()), float(lon.mean())], zoom_start=17)
+        ScatterLayer(lat, lon, palette_index(rssi), RED_GREEN, popup={"RSSI": (rssi, "", 0)},
+                     name="Samples").add_to(m)
+        m.save(args.out)
+        print(f"Saved {len(lat)} samples to {args.out}")
+        return
+
+    from grid_bins import bin_levels, level_table
+    from projection import from_mercator, to_mercator
+
+    x, y = to_mercator(lat, lon)
+    origin = (float(x.min()), float(y.min()))
+    cells = level_table(bin_levels(x, y, rssi, [args.cell], origin=origin)[args.cell], min_count=args.min_count)
+    center = (BASE_LAT, BASE_LON)
+    if args.render != "heatmap":
+        from raster_tiles import cells_to_grid, save_raster_map
+
+        save_raster_map(*cells_to_grid(cells, origin), args.out, mode=args.render, vmin=-100, vmax=-30,
+                        center=center, name=f"Mean RSSI ({args.cell:g} m cells)")
+    else:
+        from heatmap_payload import ArrayHeatMap
+
+        clat, clon = from_mercator(cells["x"], cells["y"])
+        m = folium.Map(location=list(center), zoom_start=15)
+        ArrayHeatMap(clat, clon, cells["mean"] + 100, radius=25, blur=20, max_zoom=20, min_opacity=0.4).add_to(m)
+        m.save(args.out)
+    print(f"Saved {len(cells['count'])} cells at {args.cell:g} m to {args.out}")
+
+
+# ---------------------------------------------------------
+# ARGUMENTS
+# ---------------------------------------------------------
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="survey.py", description="ESP-NOW RSSI survey tools")
+    parser.add_argument("--timings", action="store_true", help="print startup / run times and heavy imports to stderr")
+    sub = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    p = sub.add_parser("info", help="sample and session counts of a survey")
+    p.add_argument("survey")
+    p.add_argument("--stats", action="store_true", help="also RSSI range and extent (loads the columns)")
+    p.set_defaults(func=cmd_info)
+
+    p = sub.add_parser("convert", help="captures -> corrected CSV, or sources -> one .survey store")
+    p.add_argument("inputs", nargs="+", help=".cap files (or .cap/.csv with --store)")
+    p.add_argument("--out-dir", "-o", default=None, help="CSV output directory (default: next to each input)")
+    p.add_argument("--store", default=None, help="write one multi-session .survey store instead, one session per input")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("bin", help="mean / variance / count of RSSI per grid cell")
+    p.add_argument("survey", nargs="?", help="survey to bin (omit with --cells)")
+    p.add_argument("--cell", nargs="+", type=float, default=[5.0], help="cell sizes in metres (default: 5)")
+    p.add_argument("--cells", default=None, help="read a cell store (cell_store.py) instead of binning samples")
+    p.add_argument("--projection", choices=["mercator", "local"], default="mercator",
+                   help="grid in Web Mercator or true local metres (default: mercator)")
+    p.add_argument("--min-count", type=int, default=1, help="drop cells with fewer samples (default: 1)")
+    p.add_argument("--out", default=None, help="CSV per cell size; {cell} is replaced by the size, e.g. cells-{cell}m.csv")
+    p.add_argument("--collapse-dwell", type=float, nargs="?", const=0.0, default=None, metavar="METRES",
+                   help="merge runs of samples at one position (within METRES per step, default 0) first")
+    filter_args.add_arguments(p)
+    p.set_defaults(func=cmd_bin)
+
+    # every option after `krige` goes to heatmap_gstools.py's own parser (including --help)
+    p = sub.add_parser("krige", help="kriged heatmap (heatmap_gstools.py; see `krige --help`)", add_help=False)
+    p.set_defaults(func=cmd_krige)
+
+    p = sub.add_parser("slice", help="samples along a heading from the base, or in a corridor around a path")
+    p.add_argument("survey")
+    p.add_argument("--heading", type=float, default=180.0, help="radial slice direction, degrees (default: 180)")
+    p.add_argument("--tolerance", type=float, default=2.0, help="degrees each side of --heading (default: 2)")
+    p.add_argument("--path", nargs="+", default=None, metavar="LAT,LON",
+                   help="corridor slice along these waypoints instead of a radial one")
+    p.add_argument("--half-width", type=float, default=3.0, help="corridor metres each side of --path (default: 3)")
+    p.add_argument("--out", default=None, help="write distance_m (or along_m),rssi CSV")
+    p.add_argument("--plot", action="store_true", help="show RSSI against distance")
+    p.add_argument("--save", default=None, help="save the plot to this image instead of showing it")
+    p.set_defaults(func=cmd_slice)
+
+    p = sub.add_parser("plot", help="RSSI against distance, or a polar heatmap of radial profiles by heading")
+    p.add_argument("kind", choices=["distance", "compass"])
+    p.add_argument("survey")
+    p.add_argument("--step", type=float, default=5.0, help="compass: sector spacing, degrees (default: 5)")
+    p.add_argument("--half-width", type=float, default=None, help="compass: degrees each side (default: step / 2)")
+    p.add_argument("--bin", type=float, default=2.0, help="compass: distance bin, metres (default: 2)")
+    p.add_argument("--smooth", choices=["savgol", "mean", "median", "none"], default="savgol",
+                   help="compass: smoothing along distance (default: savgol)")
+    p.add_argument("--window", type=float, default=20.0, help="compass: smoothing window, metres (default: 20)")
+    p.add_argument("--out", default=None, help="compass: write the bearing x distance RSSI matrix as CSV")
+    p.add_argument("--save", default=None, help="save to this image instead of showing it")
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser("map", help="folium map of every sample, or of per-cell mean RSSI")
+    p.add_argument("survey")
+    p.add_argument("--kind", choices=["scatter", "cells"], default="scatter")
+    p.add_argument("--cell", type=float, default=5.0, help="cells: cell size in metres (default: 5)")
+    p.add_argument("--min-count", type=int, default=2, help="cells: drop cells with fewer samples (default: 2)")
+    p.add_argument("--render", choices=["heatmap", "overlay", "tiles"], default="heatmap",
+                   help="cells: folium HeatMap, one PNG overlay or XYZ tiles (default: heatmap)")
+    p.add_argument("--out", "-o", default="gps_map.html")
+    p.add_argument("--collapse-dwell", type=float, nargs="?", const=0.0, default=None, metavar="METRES",
+                   help="merge runs of samples at one position (within METRES per step, default 0) first")
+    filter_args.add_arguments(p)
+    p.set_defaults(func=cmd_map)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    if args.command == "krige":
+        args.rest = rest
+    elif rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    if args.command == "bin" and not (args.survey or args.cells):
+        parser.error("bin: give a survey or --cells")
+    if args.command == "bin" and args.cells and filter_args.changed_options(args):
+        # stored cells are already aggregated: cell_store.py add filters the samples going in
+        parser.error(f"bin --cells: {', '.join(filter_args.changed_options(args))} cannot apply to stored cells "
+                     "(filter when adding the sessions: cell_store.py add)")
+
+    t_ready = time.perf_counter()
+    preloaded = set(sys.modules)
+    args.func(args)
+    if args.timings:
+        t_done = time.perf_counter()
+        loaded = [m for m in HEAVY_MODULES if m in sys.modules and m not in preloaded]
+        print(f"[timings] startup {(t_ready - T_START) * 1e3:.1f} ms, {args.command} {(t_done - t_ready) * 1e3:.1f} ms, "
+              f"imported: {', '.join(loaded) or 'none'}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Compact binary columnar store for survey samples, shared by all the analysis scripts
+
+A store is a directory (by convention `<name>.survey/`) holding one raw little-endian
+file per column plus `meta.json`:
+
+    rssi.bin      int8     dBm
+    lat.bin       int32    degrees * 1e-7 (as sent by the rover)
+    lon.bin       int32    degrees * 1e-7
+    alt.bin       float32  metres
+    heading.bin   float32  degrees
+    session.bin   uint16   index into meta["sessions"]
+    sample.bin    uint32   sample index within its session
+    t.bin         float64  host arrival time, monotonic seconds (NaN if not recorded)
+    itow.bin      uint32   GNSS time of week in ms (capture_io.ITOW_NONE if not sent)
+
+Columns are opened with np.memmap, so reading is zero-copy and only the columns a
+script touches are paged in. Only timed captures (.tcap, ingest_serial.py --timed-log)
+carry t / itow; version 1 stores (no time columns) still open, reading them as unknown.
+
+Usage:
+    # build (or rebuild) a merged multi-session store from captures / corrected CSVs
+    python survey_store.py ./csv/RIH-all.survey ./csv/20251113_fixed.csv ./csv/20251113-2_fixed.csv
+
+    # in a script: .csv/.cap paths are converted once to a sidecar `<file>.survey/`
+    # and reused until the source file changes
+    from survey_store import load_survey
+    df = load_survey("./csv/RIH-all.csv")   # columns rssi, lat, lon, alt, heading, session, sample
+    df = load_survey("./captures/walk.tcap", columns=("rssi", "lat", "lon", "t", "itow"))
+
+Dependencies: numpy, pandas (CSV sources and to_dataframe() only, imported on use)
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+from capture_io import ITOW_NONE, iter_capture_chunks, parse_records, parse_timed_records
+
+STORE_VERSION = 2
+READABLE_VERSIONS = (1, 2)
+STORE_SUFFIX = ".survey"
+
+COLUMNS = {
+    "rssi": "<i1",
+    "lat": "<i4",
+    "lon": "<i4",
+    "alt": "<f4",
+    "heading": "<f4",
+    "session": "<u2",
+    "sample": "<u4",
+    "t": "<f8",
+    "itow": "<u4",
+}
+
+# what a column a store predates reads as
+MISSING = {"t": np.nan, "itow": ITOW_NONE}
+
+CSV_NAMES = ["rssi", "lat", "lon", "alt", "heading"]
+CSV_CHUNK_ROWS = 1_000_000
+
+
+class SurveyStore:
+    """Read-only, memory-mapped view of a store directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") not in READABLE_VERSIONS:
+            raise ValueError(f"{path}: unsupported store version {self.meta.get('version')}")
+        self.n = int(self.meta["n"])
+        self.sessions = self.meta["sessions"]
+        self._cols = {}
+
+    def __len__(self):
+        return self.n
+
+    def column(self, name):
+        """Raw on-disk column as a read-only memmap (no copy)."""
+        if name not in self._cols:
+            if name not in self.meta["columns"] and name in MISSING:
+                self._cols[name] = np.full(self.n, MISSING[name], dtype=COLUMNS[name])
+                return self._cols[name]
+            dtype = np.dtype(self.meta["columns"][name])
+            if self.n == 0:
+                self._cols[name] = np.empty(0, dtype=dtype)
+            else:
+                self._cols[name] = np.memmap(os.path.join(self.path, name + ".bin"), dtype=dtype, mode="r", shape=(self.n,))
+        return self._cols[name]
+
+    __getitem__ = column
+
+    @property
+    def lat(self):
+        return self.column("lat") * 1e-7
+
+    @property
+    def lon(self):
+        return self.column("lon") * 1e-7
+
+    def to_dataframe(self, columns=("rssi", "lat", "lon", "alt", "heading", "session", "sample")):
+        """DataFrame in the float units the scripts have always used (rssi dBm, lat/lon degrees, alt m)."""
+        import pandas as pd
+
+        data = {}
+        for name in columns:
+            if name in ("lat", "lon"):
+                data[name] = getattr(self, name)
+            elif name in ("rssi", "alt", "heading", "t"):
+                data[name] = self.column(name).astype(np.float64)
+            else:
+                data[name] = np.asarray(self.column(name))
+        return pd.DataFrame(data)
+
+
+# ---------------------------------------------------------
+# WRITING
+# ---------------------------------------------------------
+
+def _iter_source_columns(path):
+    """
+    Yield dicts of typed column chunks (rssi, lat, lon, alt, heading, and t / itow from
+    a timed capture) from a .cap, .tcap or corrected .csv.
+    """
+    lower = path.lower()
+    if lower.endswith((".cap", ".tcap")):
+        timed = lower.endswith(".tcap")
+        for rec in iter_capture_chunks(path, parse=parse_timed_records if timed else parse_records):
+            chunk = {
+                "rssi": rec["rssi"],
+                "lat": rec["latitude"],
+                "lon": rec["longitude"],
+                "alt": rec["altitude"] * np.float32(1e-3),
+                "heading": rec["heading"],
+            }
+            if timed:
+                chunk["t"] = rec["t"]
+                chunk["itow"] = rec["itow"]
+            yield chunk
+        return
+
+    import pandas as pd
+
+    for chunk in pd.read_csv(path, header=None, chunksize=CSV_CHUNK_ROWS):
+        if chunk.shape[1] < 3:
+            raise ValueError(f"{path}: CSV must contain at least three columns: rssi, lat, lon")
+        chunk = chunk.iloc[:, :5]
+        chunk.columns = CSV_NAMES[: chunk.shape[1]]
+        chunk = chunk.dropna(subset=["rssi", "lat", "lon"])
+        n = len(chunk)
+        lat = chunk["lat"].to_numpy(np.float64)
+        lon = chunk["lon"].to_numpy(np.float64)
+        alt = chunk["alt"].to_numpy(np.float64) if "alt" in chunk else np.full(n, np.nan)
+        if n and np.abs(lat).max() > 180:
+            # uncorrected capture saved as .csv (degrees * 1e-7, mm)
+            lat, lon, alt = lat * 1e-7, lon * 1e-7, alt * 1e-3
+        yield {
+            "rssi": np.rint(chunk["rssi"].to_numpy(np.float64)),
+            "lat": np.rint(lat * 1e7),
+            "lon": np.rint(lon * 1e7),
+            "alt": alt,
+            "heading": chunk["heading"].to_numpy(np.float64) if "heading" in chunk else np.full(n, np.nan),
+        }
+
+
+def source_stamp(path):
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def write_store(out_path, sources):
+    """Convert one or more .cap/.tcap/.csv files into a store; each source becomes one session."""
+    tmp_path = out_path.rstrip("/\\") + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    files = {name: open(os.path.join(tmp_path, name + ".bin"), "wb") for name in COLUMNS}
+    sessions = []
+    n = 0
+    try:
+        for session_id, src in enumerate(sources):
+            n_session = 0
+            for chunk in _iter_source_columns(src):
+                m = len(chunk["rssi"])
+                chunk["session"] = np.full(m, session_id)
+                chunk["sample"] = np.arange(n_session, n_session + m)
+                for name, value in MISSING.items():
+                    chunk.setdefault(name, np.full(m, value))
+                for name, dtype in COLUMNS.items():
+                    files[name].write(np.ascontiguousarray(chunk[name], dtype=dtype).tobytes())
+                n_session += m
+            sessions.append({"name": os.path.splitext(os.path.basename(src))[0], "n": n_session, "source": source_stamp(src)})
+            n += n_session
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {"version": STORE_VERSION, "n": n, "columns": COLUMNS, "sessions": sessions}
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=1)
+
+    # swap in atomically-ish so a crashed conversion never leaves a half-written store
+    if os.path.exists(out_path):
+        shutil.rmtree(out_path)
+    os.rename(tmp_path, out_path)
+    return SurveyStore(out_path)
+
+
+# ---------------------------------------------------------
+# LOADING
+# ---------------------------------------------------------
+
+def _is_fresh(store_path, source):
+    try:
+        with open(os.path.join(store_path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if meta.get("version") != STORE_VERSION or len(meta.get("sessions", [])) != 1:
+        return False
+    stamp = source_stamp(source)
+    return meta["sessions"][0]["source"] == stamp
+
+
+def open_survey(path):
+    """Open a store directly, or the (re)built sidecar store of a .csv/.cap/.tcap file."""
+    if os.path.isdir(path):
+        return SurveyStore(path)
+    store_path = path + STORE_SUFFIX
+    if not _is_fresh(store_path, path):
+        print(f"Converting {path} -> {store_path}")
+        return write_store(store_path, [path])
+    return SurveyStore(store_path)
+
+
+def load_survey(path, columns=("rssi", "lat", "lon", "alt", "heading", "session", "sample")):
+    """Load a survey (.survey store, .csv, .cap or .tcap) as a DataFrame in float units."""
+    return open_survey(path).to_dataframe(columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a binary survey store from captures / corrected CSVs")
+    parser.add_argument("out", help="output store directory (e.g. ./csv/RIH-all.survey)")
+    parser.add_argument("sources", nargs="*", help=".cap, .tcap or corrected .csv files, one session each")
+    args = parser.parse_args()
+
+    if args.sources:
+        store = write_store(args.out, args.sources)
+    else:
+        store = open_survey(args.out)
+    print(f"{store.path}: {len(store)} samples in {len(store.sessions)} session(s)")
+    for i, s in enumerate(store.sessions):
+        print(f"  [{i}] {s['name']}: {s['n']} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+Parameter sweep: every averaged and kriged heatmap variant from one load, on a process pool
+
+The maps in this folder (nine averaging resolutions, 30 m spherical / linear and
+10 m / 5 m gaussian kriging) each came from editing constants in a generator script
+and rerunning it from scratch. A sweep takes a parameter matrix instead - cell size x
+variogram model x grid resolution - and:
+
+- loads, filters (sample_filters.py, as heatmap_gstools.py) and projects the survey
+  once, and bins every cell size in one pass (grid_bins.bin_levels);
+- fits each (cell size, model) variogram once, through the variogram cache shared with
+  heatmap_gstools.py, and reuses it for every grid resolution;
+- hands the data and fitted models to each pool worker once (not per job), then runs
+  the kriging + rendering jobs in parallel, largest grids first;
+- skips jobs whose output exists and whose parameters and input are unchanged since
+  the last run (recorded in the manifest), unless --force;
+- writes `<out-dir>/sweep-manifest.json` with the shared stages' and every job's timings
+  (jobs from earlier sweeps into the same directory are kept).
+
+Cell size 0 kriges the raw samples; a cell size > 0 kriges the per-cell means (cell
+centroids), which is much cheaper on long walks. Model "none" is the plain averaged
+map of heatmap_generator-2.py at that cell size (grids do not apply; cell size 0 x "none"
+makes no map and is reported and skipped, the rest of the block still runs). Kriging runs
+through local_kriging.krige_tiled (--mode global: all samples, solved once per job;
+local: --neighbours nearest per cell).
+
+Usage:
+    python sweep.py --csv ./csv/RIH-all.csv                       # the variants above (DEFAULT_MATRIX)
+    python sweep.py --cells 2 3 5 --models none                   # averaged maps only
+    python sweep.py --cells 0 5 --models spherical gaussian --grids 30 10 -j 4
+    python sweep.py --matrix sweep.json --render tiles            # [{"cells": [...], "models": [...], "grids": [...]}, ...]
+
+Outputs are named like the hand-made ones: gps_heatmap-5m-averaged.html,
+gps_heatmap_30m_spherical_kriging.html and gps_heatmap_10m_gaussian_kriging-5m-cells.html.
+
+Dependencies: numpy, scipy, gstools, folium, pyproj (mercator), pandas (CSV sources)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import filter_args
+from grid_bins import bin_levels, level_table
+from heatmap_gstools import MODEL_FAMILIES, build_grid, create_folium_map, fit_variogram, grid_to_heatmap_data
+from local_kriging import DEFAULT_NEIGHBOURS, DEFAULT_TILE, krige_tiled
+from projection import project, unproject
+from sample_filters import filter_store, format_stats
+from survey_store import open_survey, source_stamp
+from variogram_cache import DEFAULT_CACHE_DIR, VariogramCache
+
+# The hand-produced variants in this folder
+DEFAULT_MATRIX = [
+    {"cells": [2, 3, 4, 5, 6, 7, 10, 15, 20], "models": ["none"]},
+    {"cells": [0], "models": ["spherical", "linear"], "grids": [30]},
+    {"cells": [0], "models": ["gaussian"], "grids": [10, 5]},
+]
+DEFAULT_GRID = 30.0
+MANIFEST = "sweep-manifest.json"
+AVERAGE_MIN_COUNT = 2     # as heatmap_generator-2.py
+VARIO_BINS = 20           # as heatmap_gstools.py, so both share cached fits
+MAP_CENTER = (53.26831, -0.52984)
+
+
+def _tag(value):
+    return f"{value:g}".replace(".", "-")
+
+
+# ---------------------------------------------------------
+# JOBS
+# ---------------------------------------------------------
+
+def expand(matrix):
+    """
+    (jobs, skipped) of a matrix (a list of cross-product blocks): the jobs in order,
+    without duplicates, and the (cell, model) combinations that make no job, with why.
+    """
+    jobs, seen, skipped = [], set(), []
+    for block in matrix:
+        for cell in block.get("cells", [0]):
+            for model in block.get("models", ["auto"]):
+                if model != "none" and model != "auto" and model not in MODEL_FAMILIES:
+                    raise ValueError(f"unknown variogram model {model!r}")
+                if model == "none" and not cell:
+                    # an averaged map needs cells; the block's other combinations still run
+                    reason = "model 'none' (averaged map) needs a cell size > 0"
+                    if (float(cell), model, reason) not in skipped:
+                        skipped.append((float(cell), model, reason))
+                    continue
+                for grid in [None] if model == "none" else block.get("grids", [DEFAULT_GRID]):
+                    job = {"kind": "average" if model == "none" else "krige", "cell": float(cell), "model": model,
+                           "grid": None if grid is None else float(grid)}
+                    ident = (job["cell"], model, job["grid"])
+                    if ident not in seen:
+                        seen.add(ident)
+                        jobs.append(job)
+    return jobs, skipped
+
+
+def output_name(prefix, job):
+    if job["kind"] == "average":
+        return f"{prefix}-{_tag(job['cell'])}m-averaged.html"
+    name = f"{prefix}_{_tag(job['grid'])}m_{job['model']}_kriging"
+    return name + (f"-{_tag(job['cell'])}m-cells.html" if job["cell"] else ".html")
+
+
+def job_key(job, settings, source):
+    """Hash of everything an output depends on; an unchanged key means the output is up to date."""
+    text = json.dumps({"job": job, "settings": settings, "source": source}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _source(path):
+    if os.path.isdir(path):
+        # a store changes when it is rebuilt: its sessions carry the source stamps
+        with open(os.path.join(path, "meta.json")) as f:
+            return {"path": os.path.abspath(path), "sessions": json.load(f)["sessions"]}
+    return source_stamp(path)
+
+
+# ---------------------------------------------------------
+# WORKERS (the shared state arrives once per process)
+# ---------------------------------------------------------
+
+_state = {}
+
+
+def _init_worker(state):
+    _state.clear()
+    _state.update(state)
+
+
+def _render_average(job, out):
+    s = _state
+    table = s["averages"][job["cell"]]
+    if s["render"] != "heatmap":
+        from raster_tiles import cells_to_grid, save_raster_map
+
+        save_raster_map(*cells_to_grid(table, s["origin"]), out, mode=s["render"], vmin=s["vmin"], vmax=s["vmax"],
+                        center=s["center"], name=f"Mean RSSI ({job['cell']:g} m cells)", projection=s["projection"])
+        return
+    import folium
+    from heatmap_payload import ArrayHeatMap
+
+    lat, lon = unproject(table["x"], table["y"], s["projection"])
+    m = folium.Map(location=list(s["center"]), zoom_start=15)
+    ArrayHeatMap(lat, lon, table["mean"] + 100, radius=25, blur=20, max_zoom=20, min_opacity=0.4).add_to(m)
+    m.save(out)
+
+
+def _render_field(job, out, gx, gy, gridx, gridy, field):
+    s = _state
+    if s["render"] != "heatmap":
+        from raster_tiles import save_raster_map
+
+        save_raster_map(gx, gy, field, out, mode=s["render"], vmin=s["vmin"], vmax=s["vmax"], smooth=True,
+                        center=s["center"], name=f"Kriged RSSI ({job['model']}, {job['grid']:g} m)",
+                        projection=s["projection"])
+        return
+    lats, lons = unproject(gridx.ravel(), gridy.ravel(), s["projection"])
+    _, _, weights = grid_to_heatmap_data(field, gridx, gridy)
+    keep = weights > 0
+    create_folium_map(*s["center"], lats[keep], lons[keep], weights[keep], out, radius=20)
+
+
+def run_job(job):
+    """Run one job in the current process (state from _init_worker); returns its timings."""
+    s = _state
+    out = os.path.join(s["out_dir"], job["out"])
+    t0, c0 = time.perf_counter(), time.process_time()
+    result = {"krige_s": 0.0}
+    if job["kind"] == "average":
+        result["points"] = len(s["averages"][job["cell"]]["count"])
+        _render_average(job, out)
+    else:
+        x, y, vals = s["datasets"][job["cell"]]
+        gx, gy, gridx, gridy = build_grid(*s["extent"], grid_res_m=job["grid"])
+        field = krige_tiled(s["models"][(job["cell"], job["model"])], x, y, vals, gx, gy, mode=s["mode"],
+                            neighbours=s["neighbours"], tile=s["tile"], workers=1)
+        result["krige_s"] = time.perf_counter() - t0
+        result["points"] = len(vals)
+        result["grid_cells"] = int(gridx.size)
+        _render_field(job, out, gx, gy, gridx, gridy, field)
+    result["seconds"] = time.perf_counter() - t0
+    result["cpu_s"] = time.process_time() - c0
+    result["render_s"] = result["seconds"] - result["krige_s"]
+    return result
+
+
+def _cost(job, extent):
+    # rough ordering only: grid cells for kriging jobs, averaged maps last
+    if job["kind"] == "average":
+        return 0.0
+    (x0, x1), (y0, y1) = extent
+    return (x1 - x0) * (y1 - y0) / job["grid"] ** 2
+
+
+# ---------------------------------------------------------
+# SWEEP
+# ---------------------------------------------------------
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def run_sweep(path, jobs, out_dir, prefix="gps_heatmap", workers=1, force=False, mode="global",
+              neighbours=DEFAULT_NEIGHBOURS, tile=DEFAULT_TILE, render="heatmap", vmin=-100.0, vmax=-30.0,
+              projection="mercator", cache=None, refit=False, filter_options=None):
+    """
+    Run (or skip) every job; returns the manifest dict, also written to <out_dir>/sweep-manifest.json.
+    filter_options (SampleFilter keywords, None = unfiltered) drops outliers before binning and kriging.
+    """
+    t_start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    settings = {"mode": mode, "neighbours": neighbours, "tile": tile, "render": render, "vmin": vmin, "vmax": vmax,
+                "projection": projection, "min_count": AVERAGE_MIN_COUNT, "vario_bins": VARIO_BINS,
+                "filter": filter_options}
+    source = _source(path)
+    previous = {j["out"]: j for j in load_manifest(out_dir).get("jobs", [])}
+
+    todo, records = [], []
+    for job in jobs:
+        job = dict(job, out=output_name(prefix, job))
+        job["key"] = job_key({k: job[k] for k in ("kind", "cell", "model", "grid")}, settings, source)
+        prev = previous.get(job["out"])
+        fresh = (prev is not None and prev.get("key") == job["key"] and prev.get("status") in ("done", "skipped")
+                 and os.path.exists(os.path.join(out_dir, job["out"])))
+        if fresh and not force:
+            # keep the timings of the run that produced it
+            records.append(dict(prev, **job, status="skipped"))
+        else:
+            todo.append(job)
+    stages = {}
+    print(f"{len(jobs)} jobs: {len(todo)} to run, {len(jobs) - len(todo)} up to date")
+
+    if todo:
+        t0 = time.perf_counter()
+        survey = open_survey(path)
+        lat, lon = survey.lat, survey.lon
+        rssi = survey.column("rssi").astype(np.float64)
+        stages["load_s"] = time.perf_counter() - t0
+
+        if filter_options is not None:
+            t0 = time.perf_counter()
+            keep, stats = filter_store(survey, **filter_options)
+            lat, lon, rssi = lat[keep], lon[keep], rssi[keep]
+            stages["filter_s"] = time.perf_counter() - t0
+            print(f"Outlier filter: {format_stats(stats)}")
+
+        t0 = time.perf_counter()
+        x, y = project(lat, lon, projection)
+        stages["project_s"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        origin = (float(x.min()), float(y.min()))
+        cell_sizes = sorted({j["cell"] for j in todo if j["cell"]})
+        levels = bin_levels(x, y, rssi, cell_sizes, origin=origin) if cell_sizes else {}
+        datasets, averages = {0.0: (x, y, rssi)}, {}
+        for cell in cell_sizes:
+            table = level_table(levels[cell])
+            datasets[cell] = (table["x"], table["y"], table["mean"])
+            averages[cell] = level_table(levels[cell], min_count=AVERAGE_MIN_COUNT)
+        stages["bin_s"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        models = {}
+        for job in todo:
+            ident = (job["cell"], job["model"])
+            if job["kind"] == "krige" and ident not in models:
+                on = f"{job['cell']:g} m cells" if job["cell"] else "raw samples"
+                print(f"Variogram: {job['model']} on {on}")
+                models[ident] = fit_variogram(*datasets[job["cell"]], bin_num=VARIO_BINS, cache=cache, refit=refit,
+                                              family=None if job["model"] == "auto" else job["model"])
+        stages["fit_s"] = time.perf_counter() - t0
+
+        extent = (np.array([x.min(), x.max()]), np.array([y.min(), y.max()]))
+        state = {"datasets": {c: datasets[c] for c in {j["cell"] for j in todo if j["kind"] == "krige"}},
+                 "averages": averages, "models": models, "extent": extent, "origin": origin,
+                 "center": MAP_CENTER, "out_dir": out_dir, **settings}
+        todo.sort(key=lambda j: -_cost(j, extent))
+
+        t0 = time.perf_counter()
+        done = 0
+
+        def finish(job, result=None, error=None):
+            nonlocal done
+            done += 1
+            if error is None:
+                records.append(dict(job, status="done", **result))
+                print(f"[{done}/{len(todo)}] {job['out']}: {result['seconds']:.2f}s")
+            else:
+                records.append(dict(job, status="failed", error=f"{type(error).__name__}: {error}"))
+                print(f"[{done}/{len(todo)}] {job['out']}: FAILED {error}")
+
+        if workers <= 1:
+            _init_worker(state)
+            for job in todo:
+                try:
+                    finish(job, run_job(job))
+                except Exception as e:
+                    finish(job, error=e)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(state,)) as pool:
+                futures = {pool.submit(run_job, job): job for job in todo}
+                for fut in as_completed(futures):
+                    try:
+                        finish(futures[fut], fut.result())
+                    except Exception as e:
+                        finish(futures[fut], error=e)
+        stages["jobs_s"] = time.perf_counter() - t0
+
+    order = {output_name(prefix, job): i for i, job in enumerate(jobs)}
+    records.sort(key=lambda r: order[r["out"]])
+    # outputs of earlier sweeps into the same directory stay listed (and skippable)
+    records += [prev for out, prev in previous.items() if out not in order]
+    manifest = {"source": source, "settings": settings, "workers": workers, "stages": stages,
+                "total_s": time.perf_counter() - t_start, "jobs": records}
+    write_manifest(out_dir, manifest)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep cell size x variogram model x grid resolution in one parallel job")
+    parser.add_argument("--csv", "-c", default="./csv/RIH-all.csv", help="input csv/cap file or .survey store")
+    parser.add_argument("--matrix", default=None, help='JSON file: list of {"cells", "models", "grids"} blocks')
+    parser.add_argument("--cells", nargs="+", type=float, default=None,
+                        help="cell sizes in metres; 0 = krige the raw samples (default: 0)")
+    parser.add_argument("--models", nargs="+", default=None, choices=["none", "auto"] + list(MODEL_FAMILIES),
+                        help="variogram model families; none = averaged map (default: auto)")
+    parser.add_argument("--grids", nargs="+", type=float, default=None,
+                        help=f"kriging grid spacings in metres (default: {DEFAULT_GRID:g})")
+    parser.add_argument("--out-dir", "-o", default="sweep", help="output directory (default: sweep)")
+    parser.add_argument("--prefix", default="gps_heatmap", help="output file name prefix (default: gps_heatmap)")
+    parser.add_argument("--workers", "-j", default=os.cpu_count() or 1, type=int,
+                        help="processes running jobs (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="rerun jobs whose outputs are up to date")
+    parser.add_argument("--mode", choices=["global", "local"], default="global",
+                        help="krige from all samples or from --neighbours nearest per cell (default: global)")
+    parser.add_argument("--neighbours", "-k", default=DEFAULT_NEIGHBOURS, type=int,
+                        help=f"local mode: conditioning points per grid cell (default: {DEFAULT_NEIGHBOURS})")
+    parser.add_argument("--tile", default=DEFAULT_TILE, type=int, help=f"grid tile edge in cells (default: {DEFAULT_TILE})")
+    parser.add_argument("--render", choices=["heatmap", "overlay", "tiles"], default="heatmap",
+                        help="folium HeatMap, one PNG overlay or XYZ tiles per output (default: heatmap)")
+    parser.add_argument("--vmin", default=-100.0, type=float, help="overlay/tiles: RSSI at the bottom of the colour scale")
+    parser.add_argument("--vmax", default=-30.0, type=float, help="overlay/tiles: RSSI at the top of the colour scale")
+    parser.add_argument("--projection", choices=["mercator", "local"], default="mercator",
+                        help="Web Mercator or true local metres for cells and grids (default: mercator)")
+    parser.add_argument("--vario-cache", default=DEFAULT_CACHE_DIR, help=f"variogram cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-vario-cache", action="store_true", help="fit every variogram afresh, without the cache")
+    parser.add_argument("--refit", action="store_true", help="refit variograms, replacing cached fits")
+    filter_args.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.matrix:
+        with open(args.matrix) as f:
+            matrix = json.load(f)
+    elif args.cells is None and args.models is None and args.grids is None:
+        matrix = DEFAULT_MATRIX
+    else:
+        block = {"cells": args.cells or [0], "models": args.models or ["auto"]}
+        if args.grids:
+            block["grids"] = args.grids
+        matrix = [block]
+    try:
+        jobs, skipped = expand(matrix)
+    except ValueError as e:
+        parser.error(str(e))
+    for cell, model, reason in skipped:
+        print(f"Skipping cell {cell:g} m x model {model}: {reason}")
+    if not jobs:
+        parser.error("no valid cell size / model combinations in the matrix")
+
+    cache = None if args.no_vario_cache else VariogramCache(args.vario_cache)
+    manifest = run_sweep(args.csv, jobs, args.out_dir, prefix=args.prefix, workers=args.workers, force=args.force,
+                         mode=args.mode, neighbours=args.neighbours, tile=args.tile, render=args.render,
+                         vmin=args.vmin, vmax=args.vmax, projection=args.projection, cache=cache, refit=args.refit,
+                         filter_options=filter_args.options_from_args(args))
+    failed = [j["out"] for j in manifest["jobs"] if j["status"] == "failed"]
+    print(f"Sweep finished in {manifest['total_s']:.1f}s; manifest {os.path.join(args.out_dir, MANIFEST)}"
+          + (f"; {len(failed)} failed: {', '.join(failed)}" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
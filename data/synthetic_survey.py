@@ -0,0 +1,125 @@
+"""
+Synthetic surveys: random walks around the base station with log-distance path-loss RSSI
+
+For benchmarks and for checking the pipeline on sizes no real walk has reached yet.
+Walkers do correlated random walks (persistent heading with small random turns,
+turning back towards the base past `radius`) at one sample per `step` metres, and
+each sample's RSSI follows the log-distance path-loss model
+
+    rssi = rssi0 - 10 * exponent * log10(d / d0) + shadowing
+
+where the shadowing is Gaussian in dB and correlated along each walk (AR(1) with
+coefficient `shadow_corr` per sample), rounded to whole dBm like the radio reports it.
+Records use the firmware / capture_io layout (RECORD_DTYPE), so they can be written
+as a corrected CSV (rssi,lat,lon,alt,heading, identical to fix-csv.py output) or as a
+raw .cap capture. Everything is deterministic for a given seed.
+
+Usage:
+    python synthetic_survey.py synthetic-100k.csv --n 100000
+    python synthetic_survey.py synthetic-1m.cap --n 1000000 --seed 3
+
+    from synthetic_survey import random_walks
+    records = random_walks(10_000, seed=1)
+
+Dependencies: numpy
+"""
+
+import argparse
+
+import numpy as np
+
+from capture_io import RECORD_DTYPE, format_fixed_csv
+from projection import BASE_LAT, BASE_LON, from_local
+
+DEFAULT_RADIUS = 200.0      # metres (about the reach of the real walks)
+DEFAULT_STEP = 1.0          # metres between samples (~ walking pace at 1-2 Hz)
+SAMPLES_PER_WALKER = 2000
+
+# log-distance path loss, roughly fitted to the RIH walks (-90 dBm at ~200 m)
+RSSI0 = -40.0               # dBm at d0
+D0 = 1.0
+EXPONENT = 2.2
+SHADOW_DB = 4.0
+SHADOW_CORR = 0.95
+RSSI_RANGE = (-100, -20)
+
+
+def path_loss(d, rssi0=RSSI0, exponent=EXPONENT, d0=D0):
+    """Mean RSSI in dBm at distance d (metres) under the log-distance model."""
+    return rssi0 - 10.0 * exponent * np.log10(np.maximum(d, d0) / d0)
+
+
+def random_walks(n, walkers=None, radius=DEFAULT_RADIUS, step=DEFAULT_STEP, turn_deg=15.0,
+                 shadow_db=SHADOW_DB, shadow_corr=SHADOW_CORR, seed=0, lat0=BASE_LAT, lon0=BASE_LON):
+    """
+    n samples (RECORD_DTYPE) from `walkers` walks (default one per SAMPLES_PER_WALKER
+    samples), concatenated walk by walk in sampling order.
+    """
+    rng = np.random.default_rng(seed)
+    walkers = walkers or max(1, -(-n // SAMPLES_PER_WALKER))
+    length = -(-n // walkers)
+
+    # all walkers advance together, one vectorized step at a time
+    r = radius * np.sqrt(rng.uniform(0, 0.25, walkers))
+    a = rng.uniform(0, 2 * np.pi, walkers)
+    x, y = r * np.sin(a), r * np.cos(a)
+    heading = rng.uniform(0, 2 * np.pi, walkers)
+    shadow = rng.normal(0, shadow_db, walkers)
+    innovation = shadow_db * np.sqrt(1 - shadow_corr ** 2)
+
+    xs = np.empty((length, walkers))
+    ys = np.empty((length, walkers))
+    hs = np.empty((length, walkers))
+    ss = np.empty((length, walkers))
+    for i in range(length):
+        xs[i], ys[i], hs[i], ss[i] = x, y, heading, shadow
+        heading = heading + np.radians(turn_deg) * rng.standard_normal(walkers)
+        outside = np.hypot(x, y) > radius
+        # past the radius, head back towards the base (with some spread)
+        heading[outside] = np.arctan2(-x[outside], -y[outside]) + rng.normal(0, 0.5, int(outside.sum()))
+        x = x + step * np.sin(heading)
+        y = y + step * np.cos(heading)
+        shadow = shadow_corr * shadow + innovation * rng.standard_normal(walkers)
+
+    # walk-major order, trimmed to n
+    xs, ys, hs, ss = (arr.T.ravel()[:n] for arr in (xs, ys, hs, ss))
+    lat, lon = from_local(xs, ys, lat0, lon0)
+    rssi = np.clip(np.rint(path_loss(np.hypot(xs, ys)) + ss), *RSSI_RANGE)
+
+    out = np.empty(n, dtype=RECORD_DTYPE)
+    out["rssi"] = rssi
+    out["latitude"] = np.rint(lat * 1e7)
+    out["longitude"] = np.rint(lon * 1e7)
+    out["altitude"] = np.rint((25.0 + rng.normal(0, 0.5, n)) * 1e3)
+    out["heading"] = np.round(np.degrees(hs) % 360, 2)
+    return out
+
+
+def write_survey(path, records):
+    """Write records as a corrected CSV (.csv) or a raw base-station capture (.cap)."""
+    if not path.lower().endswith(".cap"):
+        with open(path, "wb") as f:
+            f.write(format_fixed_csv(records))
+        return
+    cols = np.column_stack((records["rssi"], records["latitude"], records["longitude"], records["altitude"]))
+    with open(path, "w") as f:
+        for row, heading in zip(cols.tolist(), records["heading"].tolist()):
+            f.write(f"{row[0]}, {row[1]}, {row[2]}, {row[3]}, {heading:.2f}\r\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic random-walk survey (.csv or .cap)")
+    parser.add_argument("out", help="output file; .cap writes a raw capture, anything else a corrected CSV")
+    parser.add_argument("--n", type=int, default=10_000, help="samples (default: 10000)")
+    parser.add_argument("--walkers", type=int, default=None, help=f"walks (default: one per {SAMPLES_PER_WALKER} samples)")
+    parser.add_argument("--radius", type=float, default=DEFAULT_RADIUS, help=f"metres (default: {DEFAULT_RADIUS:g})")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    records = random_walks(args.n, walkers=args.walkers, radius=args.radius, seed=args.seed)
+    write_survey(args.out, records)
+    print(f"Wrote {len(records)} samples to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
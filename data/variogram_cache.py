@@ -0,0 +1,137 @@
+"""
+On-disk cache of empirical variograms and fitted covariance models
+
+Estimating the empirical variogram is an O(N^2) pair computation, and it only depends
+on the samples and the binning - not on the grid spacing, kriging mode or map styling.
+Entries are keyed by a SHA-256 of the projected sample coordinates and values plus
+(max_dist, bin_num) - and the model family for fits of a fixed family such as
+"spherical" - and hold the empirical bins together with the fitted model's parameters,
+so re-rendering the same data at another resolution skips straight to interpolation.
+
+A cache is a directory of `<key>.npz` files. A hit refreshes the file's mtime and
+put() evicts the least recently used entries once the directory holds more than
+max_entries files or max_bytes bytes.
+
+Usage:
+    from variogram_cache import VariogramCache
+    cache = VariogramCache(".vario-cache")
+    key = cache.key(x, y, vals, max_dist, bin_num)
+    entry = cache.get(key)          # None, or dict(bins, vario, model)
+    cache.put(key, bins, vario, model)
+
+Dependencies: numpy, gstools
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = ".vario-cache"
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def model_params(model):
+    """JSON-able description of a gstools CovModel (class name plus its parameters)."""
+    return {
+        "name": type(model).__name__,
+        "dim": int(model.dim),
+        "var": float(model.var),
+        "len_scale": float(model.len_scale),
+        "nugget": float(model.nugget),
+        "anis": np.atleast_1d(model.anis).tolist(),
+        "angles": np.atleast_1d(model.angles).tolist(),
+        "opt_arg": {name: float(getattr(model, name)) for name in model.opt_arg},
+    }
+
+
+def model_from_params(params):
+    """Rebuild the CovModel described by model_params()."""
+    import gstools as gs
+
+    cls = getattr(gs, params["name"])
+    return cls(dim=params["dim"], var=params["var"], len_scale=params["len_scale"], nugget=params["nugget"],
+               anis=params["anis"], angles=params["angles"], **params["opt_arg"])
+
+
+class VariogramCache:
+    """Size-bounded LRU directory of variogram estimates and fits."""
+
+    def __init__(self, path=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(x, y, vals, max_dist, bin_num, model=None):
+        """Entry key; model names a fixed model family (e.g. "spherical"), None = automatic fit."""
+        h = hashlib.sha256()
+        h.update(f"v{CACHE_VERSION} n={len(vals)} max_dist={float(max_dist)!r} bin_num={int(bin_num)}".encode())
+        if model is not None:
+            h.update(f" model={model}".encode())
+        for arr in (x, y, vals):
+            h.update(np.ascontiguousarray(arr, dtype="<f8").tobytes())
+        return h.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".npz")
+
+    def get(self, key):
+        """dict(bins, vario, model) for a cached fit, or None. bins/vario are None if estimation had failed."""
+        path = self._file(key)
+        try:
+            with np.load(path) as npz:
+                meta = json.loads(str(npz["meta"]))
+                bins = npz["bins"] if meta["has_bins"] else None
+                vario = npz["vario"] if meta["has_bins"] else None
+            model = model_from_params(meta["model"])
+        except (OSError, KeyError, ValueError, AttributeError, TypeError):
+            return None
+        os.utime(path)
+        return {"bins": bins, "vario": vario, "model": model}
+
+    def put(self, key, bins, vario, model):
+        os.makedirs(self.path, exist_ok=True)
+        has_bins = bins is not None and vario is not None
+        meta = {"version": CACHE_VERSION, "has_bins": has_bins, "model": model_params(model)}
+        tmp = self._file(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, meta=json.dumps(meta),
+                     bins=np.asarray(bins if has_bins else [], dtype=np.float64),
+                     vario=np.asarray(vario if has_bins else [], dtype=np.float64))
+        os.replace(tmp, self._file(key))
+        self.evict()
+
+    def entries(self):
+        """(mtime_ns, size, path) of every entry, least recently used first."""
+        out = []
+        if not os.path.isdir(self.path):
+            return out
+        for name in os.listdir(self.path):
+            if name.endswith(".npz"):
+                path = os.path.join(self.path, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                out.append((st.st_mtime_ns, st.st_size, path))
+        out.sort()
+        return out
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)